@@ -1,90 +1,16 @@
-import requests
 import csv
-import json
-from datetime import datetime
 from typing import List, Dict, Optional
 
-# API Configuration
-API_BASE_URL = "http://10.23.8.215:5000/api/v1/sql-portal"
+from portal_client import SerialHistoryClient
+from api_timestamps import normalize_records, format_api_time
+from export_all_station_timestamps import get_all_station_timestamps
 
-class WebAllStationTimestampsExporter:
-    def __init__(self, api_base_url: str = API_BASE_URL):
-        self.api_base_url = api_base_url
-        self.session = requests.Session()
-    
-    def get_serial_history(self, serial_numbers: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict:
-        """
-        Get production history for serial numbers from the API
-        """
-        url = f"{self.api_base_url}/serial-history"
-        
-        payload = {
-            "serialNumbers": serial_numbers
-        }
-        
-        if start_date and end_date:
-            payload["startDate"] = start_date
-            payload["endDate"] = end_date
-        
-        try:
-            response = self.session.post(url, json=payload)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"API request failed: {e}")
-            return {"success": False, "error": str(e)}
-    
+class WebAllStationTimestampsExporter(SerialHistoryClient):
     def process_all_station_timestamps(self, serial_number: str, history_data: List[Dict]) -> Dict:
         """
-        Process all station timestamps for a serial number (same logic as original script)
+        Process all station timestamps for a serial number (same logic as export_all_station_timestamps.py)
         """
-        if not history_data:
-            return {
-                'serial_number': serial_number,
-                'stations': {}
-            }
-        
-        # Filter only workstation data (we need workstation_name, history_station_start_time, history_station_end_time)
-        workstation_data = [
-            record for record in history_data 
-            if record.get('source') == 'workstation' and record.get('workstation_name')
-        ]
-        
-        if not workstation_data:
-            return {
-                'serial_number': serial_number,
-                'stations': {}
-            }
-        
-        # Build dictionary of stations (with lists for multiple visits)
-        stations = {}
-        for record in workstation_data:
-            station = record['workstation_name']
-            start_time = record.get('history_station_start_time')
-            end_time = record.get('history_station_end_time')
-            
-            if station not in stations:
-                stations[station] = []
-            stations[station].append({
-                'start': start_time,
-                'end': end_time
-            })
-        
-        # Use MOST RECENT visit for each station
-        result = {
-            'serial_number': serial_number,
-            'stations': {}
-        }
-        
-        for station_name, visits in stations.items():
-            # Get the last (most recent) visit
-            last_visit = visits[-1]
-            result['stations'][station_name] = {
-                'start': last_visit['start'],
-                'end': last_visit['end']
-            }
-        
-        return result
+        return get_all_station_timestamps(serial_number, normalize_records(history_data))
     
     def export_all_station_timestamps(self, serial_numbers: List[str], output_file: str = "all_station_timestamps.csv", start_date: Optional[str] = None, end_date: Optional[str] = None):
         """
@@ -94,32 +20,24 @@ class WebAllStationTimestampsExporter:
         
         results = []
         
-        # Process serial numbers in batches to avoid overwhelming the API
-        batch_size = 10
-        for i in range(0, len(serial_numbers), batch_size):
-            batch = serial_numbers[i:i + batch_size]
-            print(f"Processing batch {i//batch_size + 1}/{(len(serial_numbers) + batch_size - 1)//batch_size}...")
-            
-            # Get history data for this batch
-            api_response = self.get_serial_history(batch, start_date, end_date)
+        # Process serial numbers in batches to avoid overwhelming the API;
+        # up to max_in_flight batches are requested at once, results arrive in order.
+        # Batch size adapts to how fast the API answers
+        batches = self.fetch_history_batches(serial_numbers, start_date=start_date, end_date=end_date)
+        i = 0
+        for batch_number, (batch, api_response) in enumerate(batches, 1):
+            print(f"Processing batch {batch_number} ({len(batch)} serial numbers, {i}/{len(serial_numbers)} done)...")
+            i += len(batch)
             
             if not api_response.get('success'):
                 print(f"API error for batch: {api_response.get('error', 'Unknown error')}")
                 continue
             
-            # Group history data by serial number
-            history_by_sn = {}
-            for record in api_response.get('history', []):
-                sn = record['sn']
-                if sn not in history_by_sn:
-                    history_by_sn[sn] = []
-                history_by_sn[sn].append(record)
+            # History data grouped by serial number (workstation records only)
+            history_by_sn = api_response['history_by_sn']
             
             # Process each serial number in the batch
             for sn in batch:
-                if i % 100 == 0 and i > 0:
-                    print(f"Processed {i}/{len(serial_numbers)}...")
-                
                 history_data = history_by_sn.get(sn, [])
                 result = self.process_all_station_timestamps(sn, history_data)
                 results.append(result)
@@ -156,8 +74,8 @@ class WebAllStationTimestampsExporter:
                     if station in stations:
                         start = stations[station]['start']
                         end = stations[station]['end']
-                        row.append(start if start else '')
-                        row.append(end if end else '')
+                        row.append(format_api_time(start))
+                        row.append(format_api_time(end))
                     else:
                         row.append('')  # No start time
                         row.append('')  # No end time
@@ -165,6 +83,8 @@ class WebAllStationTimestampsExporter:
                 writer.writerow(row)
         
         print(f"\n✓ All station timestamps exported to {output_file}")
+        self.print_fetch_summary()
+        self.save_dead_letters(output_file)
         
         # Show a sample
         if results:
@@ -174,7 +94,7 @@ class WebAllStationTimestampsExporter:
             sample = results[0]
             print(f"Serial: {sample['serial_number']}")
             for station, times in sorted(sample['stations'].items()):
-                print(f"  {station:20} Start: {times['start']}  |  End: {times['end']}")
+                print(f"  {station:20} Start: {format_api_time(times['start'])}  |  End: {format_api_time(times['end'])}")
         
         return results
 
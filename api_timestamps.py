@@ -0,0 +1,93 @@
+"""
+Timestamp normalization for records from the SQL portal API
+
+The portal sends times as strings, Flask-style RFC 1123
+('Wed, 19 Mar 2025 16:28:00 GMT') or ISO. Comparing those strings is wrong
+(weekday names sort before dates), so API records are turned into the
+(workstation_name, start_time, end_time) rows with naive datetimes that
+load_station_history() returns, and every calculation runs on those.
+
+Parsing is done once per distinct string: the fixed RFC 1123 layout is read
+by slicing, and results are memoized, since the end of one visit is usually
+the start of the next and batches repeat the same minutes many times.
+"""
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+# How the portal formats times (Flask's jsonify)
+API_TIME_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+# Distinct timestamp strings remembered by parse_api_time
+PARSE_CACHE_SIZE = 1 << 16
+
+MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12
+}
+
+
+def to_naive_utc(moment):
+    """Aware datetime -> naive UTC; naive datetimes are already portal time"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_api_time(value):
+    """
+    API timestamp (RFC 1123 or ISO) -> naive UTC datetime, None if missing or
+    unreadable; datetimes (e.g. from the cache) pass through
+    """
+    if isinstance(value, datetime):
+        return to_naive_utc(value)
+    if not isinstance(value, str) or not value:
+        return None
+
+    # Fast path: 'Wed, 19 Mar 2025 16:28:00 GMT' is always 29 characters
+    if len(value) == 29 and value[3] == ',' and value.endswith(' GMT'):
+        try:
+            return datetime(
+                int(value[12:16]), MONTHS[value[8:11]], int(value[5:7]),
+                int(value[17:19]), int(value[20:22]), int(value[23:25])
+            )
+        except (KeyError, ValueError):
+            pass
+
+    try:
+        return to_naive_utc(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+    try:
+        return to_naive_utc(parsedate_to_datetime(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def format_api_time(moment):
+    """datetime -> the portal's own format, '' for None"""
+    return moment.strftime(API_TIME_FORMAT) if moment else ''
+
+
+def visit_order(row):
+    """Sort key matching ORDER BY history_station_start_time (NULLs last)"""
+    return (row[1] is None, row[1] or datetime.min)
+
+
+def normalize_records(records):
+    """
+    Workstation records from the API -> [(station, start, end), ...] with
+    datetimes, in start-time order (ties keep the API's order)
+    """
+    rows = [
+        (
+            record['workstation_name'],
+            parse_api_time(record.get('history_station_start_time')),
+            parse_api_time(record.get('history_station_end_time'))
+        )
+        for record in records
+        if record.get('source') == 'workstation' and record.get('workstation_name')
+    ]
+    rows.sort(key=visit_order)
+    return rows
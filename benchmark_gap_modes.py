@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark: Python vs push-down (SQL) vs vectorized (pandas) time gap calculation
+
+Builds synthetic station history in a scratch schema, then times
+1. Python mode     - load_station_history() + calculate_time_gaps() per serial
+2. Push-down mode  - calculate_time_gaps_pushdown() (gaps computed in PostgreSQL)
+3. Vectorized mode - calculate_time_gaps_vectorized() (merge_asof over one DataFrame)
+and checks that every mode gives results identical to Python mode.
+
+The scratch schema is dropped at the end; workstation_master_log itself is
+never touched.
+
+Usage: python benchmark_gap_modes.py [serial counts...]
+       python benchmark_gap_modes.py 10000 100000 1000000   (default)
+"""
+
+import sys
+import time
+
+from config import DATABASE
+
+BENCH_SCHEMA = 'gap_benchmark'
+
+# Point every pooled connection at the scratch schema. This has to happen
+# before db.py creates the pool.
+DATABASE['options'] = f'-c search_path={BENCH_SCHEMA}'
+
+from db import get_connection, close_pool
+from station_history import load_station_history
+from calculate_times import calculate_time_gaps
+from calculate_times_pushdown import calculate_time_gaps_pushdown
+from calculate_times_vectorized import calculate_time_gaps_vectorized
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+
+# Typical flow; BBD/FLA rows get swapped for their alternates at random
+FLOW = ['VI1', 'Disassembly', 'UPGRADE', 'BBD', 'FLA', 'FCT', 'FI', 'PACKING', 'SHIPPING']
+
+def build_history(serial_count):
+    """Create a fresh scratch workstation_master_log with synthetic visits"""
+    flow_values = ', '.join(f"({i}, '{name}')" for i, name in enumerate(FLOW))
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+        cur.execute(f"CREATE SCHEMA {BENCH_SCHEMA};")
+        cur.execute("""
+            CREATE TABLE workstation_master_log (
+                id bigserial PRIMARY KEY,
+                sn text,
+                workstation_name text,
+                history_station_start_time timestamp,
+                history_station_end_time timestamp
+            );
+        """)
+        # Every unit walks the flow; ~10% of stations are skipped, ~15% get a
+        # rework pass, starts are truncated to the hour so ties happen, and a
+        # few timestamps are NULL like in the real table
+        cur.execute(f"""
+            INSERT INTO workstation_master_log
+                (sn, workstation_name, history_station_start_time, history_station_end_time)
+            SELECT
+                'BENCH' || lpad(s::text, 9, '0'),
+                CASE
+                    WHEN f.name = 'BBD' THEN (ARRAY['BBD', 'ASSY1', 'Assembley'])[1 + floor(random() * 3)::int]
+                    WHEN f.name = 'FLA' THEN (ARRAY['FLA', 'CHIFLASH'])[1 + floor(random() * 2)::int]
+                    ELSE f.name
+                END,
+                CASE WHEN random() < 0.01 THEN NULL ELSE t.start_time END,
+                CASE WHEN random() < 0.02 THEN NULL ELSE t.start_time + random() * interval '4 hours' END
+            FROM generate_series(1, %s) s
+            CROSS JOIN (VALUES {flow_values}) f(ord, name)
+            CROSS JOIN LATERAL generate_series(1, CASE WHEN random() < 0.15 THEN 2 ELSE 1 END) pass
+            CROSS JOIN LATERAL (
+                SELECT date_trunc('hour', timestamp '2025-01-01' + s * interval '1 minute'
+                                  + (f.ord * 6 + pass * 2) * interval '1 hour'
+                                  + random() * interval '5 hours') AS start_time
+            ) t
+            WHERE random() > 0.1;
+        """, (serial_count,))
+        cur.execute("CREATE INDEX ON workstation_master_log (sn, history_station_start_time);")
+        cur.execute("ANALYZE workstation_master_log;")
+        cur.execute("SELECT COUNT(*) FROM workstation_master_log;")
+        row_count = cur.fetchone()[0]
+        cur.close()
+    return row_count
+
+def drop_history():
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE;")
+        cur.close()
+
+def run_python_mode(serial_numbers):
+    history = load_station_history(serial_numbers)
+    return [calculate_time_gaps(sn, history.get(sn, [])) for sn in serial_numbers]
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+
+    print("=" * 70)
+    print("TIME GAP BENCHMARK: Python vs push-down vs vectorized")
+    print("=" * 70)
+
+    rows = []
+    try:
+        for size in sizes:
+            print(f"\nBuilding synthetic history for {size:,} serial numbers...")
+            start = time.perf_counter()
+            row_count = build_history(size)
+            print(f"  {row_count:,} rows in {time.perf_counter() - start:.1f}s")
+
+            serial_numbers = [f'BENCH{i:09d}' for i in range(1, size + 1)]
+
+            start = time.perf_counter()
+            python_results = run_python_mode(serial_numbers)
+            python_seconds = time.perf_counter() - start
+            print(f"  Python mode:    {python_seconds:8.2f}s")
+
+            start = time.perf_counter()
+            pushdown_results = calculate_time_gaps_pushdown(serial_numbers)
+            pushdown_seconds = time.perf_counter() - start
+            print(f"  Push-down mode: {pushdown_seconds:8.2f}s")
+
+            start = time.perf_counter()
+            vectorized_results = calculate_time_gaps_vectorized(serial_numbers)
+            vectorized_seconds = time.perf_counter() - start
+            print(f"  Vectorized mode:{vectorized_seconds:8.2f}s")
+
+            mismatches = sum(
+                1 for a, b, c in zip(python_results, pushdown_results, vectorized_results)
+                if not a == b == c
+            )
+            if mismatches:
+                print(f"  ✗ {mismatches:,} serial numbers differ between modes")
+            else:
+                print("  ✓ Results identical")
+
+            rows.append((size, row_count, python_seconds, pushdown_seconds, vectorized_seconds, mismatches))
+    finally:
+        drop_history()
+        close_pool()
+
+    print("\n" + "=" * 70)
+    print(f"{'Serials':>10} {'Rows':>12} {'Python (s)':>12} {'Push-down (s)':>14} {'Vectorized (s)':>15} {'Diffs':>6}")
+    for size, row_count, python_seconds, pushdown_seconds, vectorized_seconds, mismatches in rows:
+        print(f"{size:>10,} {row_count:>12,} {python_seconds:>12.2f} {pushdown_seconds:>14.2f} {vectorized_seconds:>15.2f} {mismatches:>6}")
+    print("=" * 70)
+
+    if any(r[-1] for r in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,18 @@
-import psycopg2
 import csv
 import json
+from station_history import load_station_history
+from station_timeline import StationTimeline
+from quantile_sketch import SketchSet, save_percentiles
 
-# Database settings
-DATABASE = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'fox_db',
-    'user': 'gpu_user',
-    'password': ''
-}
-
-def calculate_process_times(serial_number):
+def calculate_process_times(serial_number, rows=None):
     """
     Calculate how long each station took (process time)
     Uses the MOST RECENT visit for each station
     """
     try:
-        conn = psycopg2.connect(**DATABASE)
-        cur = conn.cursor()
-        
-        # Get all station times for this serial number
-        cur.execute("""
-            SELECT workstation_name, history_station_start_time, history_station_end_time
-            FROM workstation_master_log 
-            WHERE sn = %s
-            ORDER BY history_station_start_time;
-        """, (serial_number,))
-        
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        # Only query on our own if the caller did not bulk load the history
+        if rows is None:
+            rows = load_station_history([serial_number]).get(serial_number, [])
         
         if not rows:
             return {
@@ -39,29 +21,22 @@ def calculate_process_times(serial_number):
                 'process_times': {}
             }
         
-        # Build dictionary of stations (with lists for multiple visits)
-        stations = {}
-        for station, start_time, end_time in rows:
-            if station not in stations:
-                stations[station] = []
-            stations[station].append({
-                'start': start_time,
-                'end': end_time
-            })
+        # Index the station visits (with lists for multiple visits)
+        stations = StationTimeline(rows)
         
         # Calculate process time for each station (using MOST RECENT visit)
         process_times = {}
         
-        for station_name, visits in stations.items():
+        for station_name in stations.stations:
             # Get MOST RECENT visit
-            last_visit = visits[-1]
+            start, end = stations.last(station_name)
             
-            if last_visit['start'] and last_visit['end']:
+            if start and end:
                 # Calculate how long the work took
-                process_time = last_visit['end'] - last_visit['start']
+                process_time = end - start
                 process_times[station_name] = {
-                    'start': last_visit['start'].isoformat(),
-                    'end': last_visit['end'].isoformat(),
+                    'start': start.isoformat(),
+                    'end': end.isoformat(),
                     'duration_seconds': process_time.total_seconds(),
                     'duration_hours': round(process_time.total_seconds() / 3600, 2),
                     'duration_formatted': str(process_time)
@@ -79,26 +54,19 @@ def calculate_process_times(serial_number):
             'process_times': {}
         }
 
-def main():
-    # Read serial numbers from CSV
-    serial_numbers = []
-    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if row:
-                serial_numbers.append(row[0].strip())
-    
-    print(f"Processing {len(serial_numbers)} serial numbers...")
-    
-    results = []
-    
-    for i, sn in enumerate(serial_numbers, 1):
-        if i % 100 == 0:
-            print(f"Processed {i}/{len(serial_numbers)}...")
-        
-        result = calculate_process_times(sn)
-        results.append(result)
-    
+def update_process_time_sketches(sketches, result):
+    """
+    Add one serial number's process times to the per-station quantile sketches
+    """
+    for station, process_time in result.get('process_times', {}).items():
+        if station is not None:
+            sketches.add(station, process_time['duration_seconds'])
+
+def save_process_times(results):
+    """
+    Write process_times_results.json, process_times_summary.csv and
+    process_time_percentiles.csv
+    """
     # Save detailed JSON
     with open('process_times_results.json', 'w') as f:
         json.dump(results, f, indent=2)
@@ -139,6 +107,37 @@ def main():
     
     print(f"✓ Summary saved to process_times_summary.csv")
     
+    # p50/p90/p99 per station
+    sketches = SketchSet()
+    for result in results:
+        update_process_time_sketches(sketches, result)
+    save_percentiles(sketches, 'process_time_percentiles.csv', 'process_time_sketches.json', 'Station')
+
+def main():
+    # Read serial numbers from CSV
+    serial_numbers = []
+    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row:
+                serial_numbers.append(row[0].strip())
+    
+    print(f"Processing {len(serial_numbers)} serial numbers...")
+    
+    # Fetch the history for every serial number up front in a few queries
+    history = load_station_history(serial_numbers)
+    
+    results = []
+    
+    for i, sn in enumerate(serial_numbers, 1):
+        if i % 100 == 0:
+            print(f"Processed {i}/{len(serial_numbers)}...")
+        
+        result = calculate_process_times(sn, history.get(sn, []))
+        results.append(result)
+    
+    save_process_times(results)
+    
     # Print sample result
     if results:
         print("\n" + "="*80)
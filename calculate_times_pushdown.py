@@ -0,0 +1,256 @@
+"""
+Push-down mode for calculate_times.py
+
+Computes the same four station transitions as calculate_time_gaps(), but
+inside PostgreSQL: the most recent visit of each station is picked with an
+ordered aggregate per unit, and every "first start after the last end"
+lookup is a DISTINCT ON over a join against that per-unit summary. Only one summary row
+per serial number comes back over the wire; Python just formats it into the
+exact same result dictionaries.
+
+Usage: python calculate_times.py --pushdown
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+
+from config import DB_POOL_MAX_CONNECTIONS
+from db import get_connection
+from station_history import CHUNK_SIZE
+
+TIME_GAPS_QUERY = """
+    WITH visits AS (
+        SELECT
+            sn,
+            workstation_name AS station,
+            history_station_start_time AS start_time,
+            history_station_end_time AS end_time,
+            ROW_NUMBER() OVER (PARTITION BY sn ORDER BY history_station_start_time, id) AS pos
+        FROM workstation_master_log
+        WHERE sn = ANY(%s)
+    ),
+    units AS (
+        -- One row per unit with the end of the MOST RECENT visit of each
+        -- station we care about, i.e. stations[name][-1]['end']
+        SELECT
+            sn,
+            bool_or(station = 'VI1') AS has_vi1,
+            (array_agg(end_time ORDER BY pos DESC) FILTER (WHERE station = 'VI1'))[1] AS vi1_end,
+            bool_or(station = 'UPGRADE') AS has_upgrade,
+            (array_agg(end_time ORDER BY pos DESC) FILTER (WHERE station = 'UPGRADE'))[1] AS upgrade_end,
+            CASE
+                WHEN bool_or(station = 'BBD') THEN 'BBD'
+                WHEN bool_or(station = 'ASSY1') THEN 'ASSY1'
+                WHEN bool_or(station = 'Assembley') THEN 'Assembley'
+            END AS bbd_station,
+            CASE
+                WHEN bool_or(station = 'BBD') THEN (array_agg(end_time ORDER BY pos DESC) FILTER (WHERE station = 'BBD'))[1]
+                WHEN bool_or(station = 'ASSY1') THEN (array_agg(end_time ORDER BY pos DESC) FILTER (WHERE station = 'ASSY1'))[1]
+                ELSE (array_agg(end_time ORDER BY pos DESC) FILTER (WHERE station = 'Assembley'))[1]
+            END AS bbd_end,
+            bool_or(station = 'PACKING') AS has_packing,
+            (array_agg(end_time ORDER BY pos DESC) FILTER (WHERE station = 'PACKING'))[1] AS packing_end,
+            bool_or(station = 'SHIPPING') AS has_shipping,
+            MIN(pos) FILTER (WHERE station IS NULL) AS null_station_pos
+        FROM visits
+        GROUP BY sn
+    ),
+    first_seen AS (
+        -- Order in which stations were first seen (Python dict order), used
+        -- to break ties in the "whatever comes next" lookup
+        -- (a NULL station name uses units.null_station_pos instead)
+        SELECT sn, station, MIN(pos) AS first_pos
+        FROM visits
+        WHERE station IS NOT NULL
+        GROUP BY sn, station
+    ),
+    vi1_next_start AS (
+        -- Disassembly after the last VI1, otherwise whatever station starts next
+        SELECT
+            v.sn,
+            COALESCE(
+                MIN(v.start_time) FILTER (WHERE v.station = 'Disassembly'),
+                MIN(v.start_time)
+            ) AS start_time,
+            bool_or(v.station = 'Disassembly') AS is_disassembly
+        FROM visits v
+        JOIN units u ON u.sn = v.sn
+        WHERE v.station IS DISTINCT FROM 'VI1' AND v.start_time > u.vi1_end
+        GROUP BY v.sn
+    ),
+    vi1_next AS (
+        -- Several stations can start at that same moment: the one seen first wins
+        SELECT DISTINCT ON (v.sn) v.sn, v.station, v.start_time
+        FROM visits v
+        JOIN vi1_next_start n ON n.sn = v.sn AND n.start_time = v.start_time
+        JOIN units u ON u.sn = v.sn
+        LEFT JOIN first_seen f ON f.sn = v.sn AND f.station = v.station
+        WHERE v.station IS DISTINCT FROM 'VI1'
+          AND (NOT n.is_disassembly OR v.station = 'Disassembly')
+        ORDER BY v.sn, COALESCE(f.first_pos, u.null_station_pos), v.pos
+    ),
+    bbd_next AS (
+        SELECT DISTINCT ON (v.sn) v.sn, v.start_time
+        FROM visits v
+        JOIN units u ON u.sn = v.sn AND v.station = u.bbd_station
+        WHERE u.has_upgrade AND v.start_time > u.upgrade_end
+        ORDER BY v.sn, v.start_time, v.pos
+    ),
+    fla_next AS (
+        -- Earliest FLA or CHIFLASH after the last BBD/ASSY1 (FLA wins a tie)
+        SELECT DISTINCT ON (v.sn) v.sn, v.station, v.start_time
+        FROM visits v
+        JOIN units u ON u.sn = v.sn
+        WHERE v.station IN ('FLA', 'CHIFLASH') AND v.start_time > u.bbd_end
+        ORDER BY v.sn, v.start_time, (v.station <> 'FLA'), v.pos
+    ),
+    shipping_next AS (
+        SELECT DISTINCT ON (v.sn) v.sn, v.start_time
+        FROM visits v
+        JOIN units u ON u.sn = v.sn
+        WHERE v.station = 'SHIPPING' AND v.start_time > u.packing_end
+        ORDER BY v.sn, v.start_time, v.pos
+    )
+    SELECT
+        u.sn,
+        u.has_vi1, u.vi1_end, vn.station, vn.start_time,
+        u.has_upgrade, u.upgrade_end, u.bbd_station, bn.start_time,
+        u.bbd_end, fn.station, fn.start_time,
+        u.has_packing, u.has_shipping, u.packing_end, sn_next.start_time
+    FROM units u
+    LEFT JOIN vi1_next vn ON vn.sn = u.sn
+    LEFT JOIN bbd_next bn ON bn.sn = u.sn
+    LEFT JOIN fla_next fn ON fn.sn = u.sn
+    LEFT JOIN shipping_next sn_next ON sn_next.sn = u.sn
+"""
+
+
+def _gap(end, start):
+    gap = start - end
+    return {
+        'gap_seconds': gap.total_seconds(),
+        'gap_hours': round(gap.total_seconds() / 3600, 2),
+        'gap_formatted': str(gap)
+    }
+
+
+def empty_time_gap_result(serial_number, error):
+    return {
+        'serial_number': serial_number,
+        'error': error,
+        'vi1_to_next': None,
+        'upgrade_to_bbd_or_assy1': None,
+        'bbd_or_assy1_to_fla_or_chiflash': None,
+        'packing_to_shipping': None
+    }
+
+
+def build_time_gap_result(summary):
+    """
+    Turn one summary row from TIME_GAPS_QUERY into the same dictionary
+    calculate_time_gaps() returns
+    """
+    (serial_number,
+     has_vi1, vi1_end, vi1_next_station, vi1_next_start,
+     has_upgrade, upgrade_end, bbd_station, bbd_start,
+     bbd_end, fla_station, fla_start,
+     has_packing, has_shipping, packing_end, shipping_start) = summary
+
+    result = {
+        'serial_number': serial_number,
+        'vi1_to_next': None,
+        'upgrade_to_bbd_or_assy1': None,
+        'bbd_or_assy1_to_fla_or_chiflash': None,
+        'packing_to_shipping': None,
+        'missing_stations': []
+    }
+
+    # 1. VI1 end time → Disassembly start time (or next station if no Disassembly)
+    if has_vi1:
+        if vi1_end and vi1_next_start:
+            result['vi1_to_next'] = {
+                'vi1_end': vi1_end.isoformat(),
+                'next_station': vi1_next_station,
+                'next_station_start': vi1_next_start.isoformat(),
+                **_gap(vi1_end, vi1_next_start)
+            }
+    else:
+        result['missing_stations'].append('VI1')
+
+    # 2. Upgrade end time → BBD/ASSY1 start time
+    if has_upgrade and bbd_station:
+        if upgrade_end and bbd_start:
+            result['upgrade_to_bbd_or_assy1'] = {
+                'upgrade_end': upgrade_end.isoformat(),
+                'next_station': bbd_station,
+                'next_station_start': bbd_start.isoformat(),
+                **_gap(upgrade_end, bbd_start)
+            }
+    elif not has_upgrade:
+        result['missing_stations'].append('UPGRADE')
+    elif not bbd_station:
+        result['missing_stations'].append('BBD/ASSY1')
+
+    # 3. BBD/ASSY1 end time → FLA/CHIFLASH start time
+    if bbd_station:
+        if bbd_end and fla_start:
+            result['bbd_or_assy1_to_fla_or_chiflash'] = {
+                'prev_station': bbd_station,
+                'prev_station_end': bbd_end.isoformat(),
+                'next_station': fla_station,
+                'next_station_start': fla_start.isoformat(),
+                **_gap(bbd_end, fla_start)
+            }
+        else:
+            result['missing_stations'].append('FLA/CHIFLASH')
+
+    # 4. Packing end time → Shipping start time
+    if has_packing and has_shipping:
+        if packing_end and shipping_start:
+            result['packing_to_shipping'] = {
+                'packing_end': packing_end.isoformat(),
+                'shipping_start': shipping_start.isoformat(),
+                **_gap(packing_end, shipping_start)
+            }
+    else:
+        if not has_packing:
+            result['missing_stations'].append('PACKING')
+        if not has_shipping:
+            result['missing_stations'].append('SHIPPING')
+
+    return result
+
+
+def _run_chunk(chunk):
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(TIME_GAPS_QUERY, (chunk,))
+            summaries = cur.fetchall()
+            cur.close()
+        return {summary[0]: build_time_gap_result(summary) for summary in summaries}
+    except psycopg2.Error as e:
+        return {sn: empty_time_gap_result(sn, f'Database error: {str(e)}') for sn in chunk}
+
+
+def calculate_time_gaps_pushdown(serial_numbers, chunk_size=CHUNK_SIZE, workers=DB_POOL_MAX_CONNECTIONS):
+    """
+    Calculate time gaps for many serial numbers inside the database
+
+    Chunks run in parallel on up to `workers` pooled connections, since the
+    heavy lifting happens on the server. Returns one result per input serial
+    number, in input order, identical to calling calculate_time_gaps() on
+    each of them.
+    """
+    unique_serials = list(dict.fromkeys(serial_numbers))
+    chunks = [unique_serials[i:i + chunk_size] for i in range(0, len(unique_serials), chunk_size)]
+    by_serial = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for chunk_results in executor.map(_run_chunk, chunks):
+            by_serial.update(chunk_results)
+
+    return [
+        by_serial.get(sn) or empty_time_gap_result(sn, 'No data found')
+        for sn in serial_numbers
+    ]
@@ -0,0 +1,211 @@
+"""
+Vectorized mode for calculate_times.py
+
+Computes the same four station transitions as calculate_time_gaps() for a
+whole population of serial numbers at once. Every visit goes into one pandas
+DataFrame, and each "first start after the last end" lookup is a single
+merge_asof(direction='forward', by='sn') join instead of a Python loop per
+serial number. Results are formatted by the same code as push-down mode, so
+they match time_gaps_summary.csv and time_gaps_results.json exactly.
+
+Usage: python calculate_times.py --vectorized
+"""
+import csv
+import io
+
+import numpy as np
+import pandas as pd
+
+from db import get_connection
+from station_history import CHUNK_SIZE, HISTORY_QUERY
+from calculate_times_pushdown import build_time_gap_result, empty_time_gap_result
+
+# Stations whose MOST RECENT visit the transitions need
+LAST_VISIT_STATIONS = ['VI1', 'UPGRADE', 'BBD', 'ASSY1', 'Assembley', 'PACKING', 'SHIPPING']
+
+
+def load_visits_frame(serial_numbers, chunk_size=CHUNK_SIZE):
+    """
+    Get the station visits for many serial numbers as one DataFrame
+
+    Columns are sn, station, start and end, in database order (by serial
+    number, then start time with missing start times last). Rows are streamed
+    with COPY and parsed by read_csv instead of building a Python tuple per row.
+    """
+    unique_serials = list(dict.fromkeys(serial_numbers))
+    buffer = io.StringIO()
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for i in range(0, len(unique_serials), chunk_size):
+            query = cur.mogrify(HISTORY_QUERY.format(param='%s'), (unique_serials[i:i + chunk_size],))
+            cur.copy_expert(f"COPY ({query.decode()}) TO STDOUT", buffer)
+        cur.close()
+
+    buffer.seek(0)
+    visits = pd.read_csv(
+        buffer,
+        sep='\t',
+        names=['sn', 'station', 'start', 'end'],
+        dtype={'sn': str, 'station': str},
+        na_values=['\\N'],
+        keep_default_na=False,
+        quoting=csv.QUOTE_NONE
+    )
+    visits['start'] = pd.to_datetime(visits['start'], format='ISO8601')
+    visits['end'] = pd.to_datetime(visits['end'], format='ISO8601')
+    return visits
+
+
+def _first_start_after(left, left_on, right, by=('unit',)):
+    """
+    For every row of `left`, find the first row of `right` (same `by` keys)
+    that starts strictly after left[left_on]
+
+    `right` needs a rank column: when several rows start at the same moment
+    the lowest rank wins. Returns the matched right rows indexed by unit, with
+    rows that found nothing (or had no time to compare with) left out.
+    """
+    by = list(by)
+    left = left[left[left_on].notna()].sort_values(left_on)
+    right = (right[right['start'].notna()]
+             .sort_values(by + ['start', 'rank'])
+             .drop_duplicates(by + ['start'])
+             .sort_values('start', kind='stable'))
+
+    matched = pd.merge_asof(
+        left[by + [left_on]],
+        right[by + ['start'] + [c for c in ['station'] if c not in by]],
+        left_on=left_on,
+        right_on='start',
+        by=by,
+        direction='forward',
+        allow_exact_matches=False
+    )
+    return matched[matched['start'].notna()].set_index('unit')
+
+
+def _python_values(series):
+    """Column values as plain Python objects, with None for anything missing"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = pd.Series(series.dt.to_pydatetime(), index=series.index, dtype=object)
+    else:
+        values = series.astype(object)
+    return values.where(series.notna(), None)
+
+
+def summarize_time_gaps(visits):
+    """
+    Compute the per-unit summary rows that build_time_gap_result() formats,
+    for every serial number in `visits` at once
+    """
+    # Work on integer codes - joining and sorting on strings is what makes
+    # pandas slow. A NULL station name gets code -1, which still groups.
+    unit_codes, serials = pd.factorize(visits['sn'])
+    station_codes, station_names = pd.factorize(visits['station'])
+    code = {name: i for i, name in enumerate(station_names)}
+    frame = pd.DataFrame({
+        'unit': unit_codes,
+        'station': station_codes,
+        'start': visits['start'].to_numpy(),
+        'end': visits['end'].to_numpy(),
+        'pos': np.arange(len(visits))
+    })
+
+    def station_is(*names):
+        return frame['station'].isin([code[name] for name in names if name in code])
+
+    # MOST RECENT visit of each station = last row in database order
+    last = frame[station_is(*LAST_VISIT_STATIONS)].drop_duplicates(['unit', 'station'], keep='last')
+    summary = pd.DataFrame(index=pd.RangeIndex(len(serials), name='unit'))
+    present = {}
+    last_end = {}
+    for name in LAST_VISIT_STATIONS:
+        rows = last[last['station'] == code.get(name)]
+        present[name] = np.zeros(len(serials), dtype=bool)
+        present[name][rows['unit'].to_numpy()] = True
+        last_end[name] = pd.Series(rows['end'].to_numpy(), index=rows['unit'].to_numpy()).reindex(summary.index)
+
+    summary['has_vi1'] = present['VI1']
+    summary['vi1_end'] = last_end['VI1']
+    summary['has_upgrade'] = present['UPGRADE']
+    summary['upgrade_end'] = last_end['UPGRADE']
+
+    # BBD, then ASSY1, then Assembley - whichever the unit has at all
+    summary['bbd_station'] = -1
+    summary['bbd_end'] = last_end['Assembley']
+    for name in ['Assembley', 'ASSY1', 'BBD']:
+        summary.loc[present[name], 'bbd_station'] = code.get(name)
+        summary['bbd_end'] = last_end[name].where(present[name], summary['bbd_end'])
+    has_bbd = present['BBD'] | present['ASSY1'] | present['Assembley']
+
+    summary['has_packing'] = present['PACKING']
+    summary['has_shipping'] = present['SHIPPING']
+    summary['packing_end'] = last_end['PACKING']
+    left = summary.reset_index()
+
+    # 1. First Disassembly after the last VI1, otherwise whatever station
+    # starts next (ties go to the station seen first, like the dict scan)
+    frame['first_pos'] = frame.groupby(['unit', 'station'], sort=False)['pos'].transform('min')
+    disassembly = _first_start_after(left, 'vi1_end', frame[station_is('Disassembly')].assign(rank=0))
+    any_next = _first_start_after(left, 'vi1_end', frame[~station_is('VI1')].rename(columns={'first_pos': 'rank'}))
+    summary['vi1_next_station'] = any_next['station'].reindex(summary.index, fill_value=-1).astype('int64')
+    summary['vi1_next_start'] = any_next['start']
+    summary.loc[disassembly.index, 'vi1_next_station'] = code.get('Disassembly')
+    summary.loc[disassembly.index, 'vi1_next_start'] = disassembly['start']
+    vi1_found = summary['vi1_next_start'].notna()
+
+    # 2. First BBD/ASSY1 after the last UPGRADE
+    bbd_left = left[left['has_upgrade'] & has_bbd].rename(columns={'bbd_station': 'station'})
+    bbd_next = _first_start_after(
+        bbd_left, 'upgrade_end', frame[station_is('BBD', 'ASSY1', 'Assembley')].assign(rank=0),
+        by=('unit', 'station'))
+    summary['bbd_start'] = bbd_next['start']
+
+    # 3. Earliest FLA or CHIFLASH after the last BBD/ASSY1 (FLA wins a tie)
+    fla_visits = frame[station_is('FLA', 'CHIFLASH')]
+    fla_next = _first_start_after(
+        left, 'bbd_end', fla_visits.assign(rank=fla_visits['station'] != code.get('FLA')))
+    summary['fla_station'] = fla_next['station'].reindex(summary.index, fill_value=-1).astype('int64')
+    summary['fla_start'] = fla_next['start']
+
+    # 4. First SHIPPING after the last PACKING
+    shipping_next = _first_start_after(left, 'packing_end', frame[station_is('SHIPPING')].assign(rank=0))
+    summary['shipping_start'] = shipping_next['start']
+
+    # Back from codes to names (code -1 is a NULL station or no station)
+    names = np.append(np.asarray(station_names, dtype=object), None)
+    summary['sn'] = np.asarray(serials, dtype=object)
+    summary['vi1_next_station'] = np.where(vi1_found, names[summary['vi1_next_station'].to_numpy()], None)
+    summary['bbd_station'] = np.where(has_bbd, names[summary['bbd_station'].to_numpy()], None)
+    summary['fla_station'] = names[summary['fla_station'].to_numpy()]
+
+    # Same column order as a push-down summary row
+    return summary[[
+        'sn',
+        'has_vi1', 'vi1_end', 'vi1_next_station', 'vi1_next_start',
+        'has_upgrade', 'upgrade_end', 'bbd_station', 'bbd_start',
+        'bbd_end', 'fla_station', 'fla_start',
+        'has_packing', 'has_shipping', 'packing_end', 'shipping_start'
+    ]]
+
+
+def calculate_time_gaps_vectorized(serial_numbers, visits=None):
+    """
+    Calculate time gaps for many serial numbers with DataFrame joins
+
+    Pass a frame from load_visits_frame() to reuse already loaded visits.
+    Returns one result per input serial number, in input order, identical to
+    calling calculate_time_gaps() on each of them.
+    """
+    if visits is None:
+        visits = load_visits_frame(serial_numbers)
+
+    summary = summarize_time_gaps(visits)
+    columns = [_python_values(summary[name]) for name in summary.columns]
+    by_serial = {row[0]: build_time_gap_result(row) for row in zip(*columns)}
+
+    return [
+        by_serial.get(sn) or empty_time_gap_result(sn, 'No data found')
+        for sn in serial_numbers
+    ]
@@ -0,0 +1,310 @@
+"""
+Configurable station transitions
+
+Station transitions are data instead of code: every rule in
+transition_rules.json says which station(s) a unit comes FROM and which
+station(s) it goes TO, and is measured as
+
+    end of the MOST RECENT visit of the FROM station
+    -> start of the first TO visit that starts after it
+
+Adding a transition like FCT -> BIT is a new entry in the JSON file, no code.
+calculate_times.py reports its four transitions from the same rules, and
+export_raw_timestamps.py the visit times behind them from
+raw_timestamp_rules.json.
+
+Rule fields:
+    name        - column / key name for the transition (unique)
+    from        - FROM stations; the first one the unit has visited is used
+                  (e.g. ["BBD", "ASSY1", "Assembley"])
+    from_rule   - instead of from: name of an earlier rule whose matched TO
+                  visit is the FROM visit (its end, not the station's most
+                  recent visit); its TO stations are the FROM stations
+    to          - TO stations
+    to_select   - "earliest" (default): whichever TO station starts first
+                  after the FROM end, ties going to the one listed first
+                  "first_present": only the first TO station the unit has
+                  visited at all is considered
+    fallback    - "any": if no TO station follows, use whatever station
+                  (other than the FROM stations) starts next
+    from_label, to_label
+                - names used in missing_stations (default: the stations
+                  joined with "/")
+    missing_from - false: do not report a missing FROM station (default true)
+    missing_to  - when to report the TO stations as missing:
+                  "absent" (default): the unit never visited any of them
+                  "unmatched": none of them follows the FROM end
+                  "never"
+    missing_both - true: check the TO stations even if the FROM station is
+                  missing, so both can be reported (default: only the FROM)
+    description - free text, ignored
+
+Each serial number's visits are indexed once (StationTimeline); every rule
+is then a couple of bisect lookups on that index, so adding rules does not
+add passes over the visits.
+
+Usage: python calculate_transitions.py [rules.json]
+"""
+import sys
+import csv
+import json
+
+from station_history import load_station_history
+from station_timeline import StationTimeline
+
+DEFAULT_RULES_FILE = 'transition_rules.json'
+
+TO_SELECT_MODES = ('earliest', 'first_present')
+FALLBACK_MODES = (None, 'any')
+MISSING_TO_MODES = ('absent', 'unmatched', 'never')
+
+# Visit times match_rules() finds for each rule
+MATCH_FIELDS = ('from_station', 'from_start', 'from_end', 'to_station', 'to_start', 'to_end')
+
+
+def load_rules(path=DEFAULT_RULES_FILE):
+    """
+    Read and check the transition rules in a JSON config file
+
+    Returns the rules compiled into dictionaries ready for evaluate_rules().
+    Raises ValueError if a rule is malformed.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    rules = []
+    names = set()
+    for i, rule in enumerate(config.get('rules', []), 1):
+        name = rule.get('name')
+        if not name:
+            raise ValueError(f"Rule #{i} has no name")
+        if name in names:
+            raise ValueError(f"Rule '{name}' is defined more than once")
+        names.add(name)
+
+        from_stations = rule.get('from')
+        to_stations = rule.get('to')
+        from_rule = rule.get('from_rule')
+        if from_rule is not None:
+            earlier = next((r for r in rules if r['name'] == from_rule), None)
+            if earlier is None:
+                raise ValueError(f"Rule '{name}': from_rule must name an earlier rule")
+            if from_stations is not None:
+                raise ValueError(f"Rule '{name}' has both 'from' and 'from_rule'")
+            from_stations = list(earlier['to'])
+            default_from_label = earlier['to_label']
+        elif not from_stations or not isinstance(from_stations, list):
+            raise ValueError(f"Rule '{name}' needs a list of 'from' stations")
+        else:
+            default_from_label = '/'.join(from_stations)
+        if not to_stations or not isinstance(to_stations, list):
+            raise ValueError(f"Rule '{name}' needs a list of 'to' stations")
+
+        to_select = rule.get('to_select', 'earliest')
+        if to_select not in TO_SELECT_MODES:
+            raise ValueError(f"Rule '{name}': to_select must be one of {TO_SELECT_MODES}")
+        fallback = rule.get('fallback')
+        if fallback not in FALLBACK_MODES:
+            raise ValueError(f"Rule '{name}': fallback must be 'any' or left out")
+        missing_to = rule.get('missing_to', 'absent')
+        if missing_to not in MISSING_TO_MODES:
+            raise ValueError(f"Rule '{name}': missing_to must be one of {MISSING_TO_MODES}")
+
+        rules.append({
+            'name': name,
+            'from': tuple(from_stations),
+            'from_rule': from_rule,
+            'to': tuple(to_stations),
+            'to_select': to_select,
+            'fallback': fallback,
+            'from_label': rule.get('from_label', default_from_label),
+            'to_label': rule.get('to_label', '/'.join(to_stations)),
+            'missing_from': bool(rule.get('missing_from', True)),
+            'missing_to': missing_to,
+            'missing_both': bool(rule.get('missing_both', False))
+        })
+
+    if not rules:
+        raise ValueError(f"No rules found in {path}")
+    return rules
+
+
+def match_rules(rules, timeline):
+    """
+    Find the FROM and TO visit of every rule on one serial number's
+    StationTimeline
+
+    Returns ({rule name: match}, [missing station labels]); a match has
+    from_station, from_start, from_end, to_station, to_start and to_end,
+    the FROM ones None if the unit has no FROM visit and the TO ones None if
+    no TO visit follows it
+    """
+    matches = {}
+    missing_stations = []
+
+    def report(label):
+        if label not in missing_stations:
+            missing_stations.append(label)
+
+    for rule in rules:
+        match = dict.fromkeys(MATCH_FIELDS)
+        matches[rule['name']] = match
+        to_present = [s for s in rule['to'] if s in timeline]
+
+        if rule['from_rule']:
+            # FROM: the TO visit the earlier rule matched (none if that rule
+            # is not among the rules being evaluated)
+            earlier = matches.get(rule['from_rule'], match)
+            from_station = earlier['to_station']
+            from_visit = (earlier['to_start'], earlier['to_end'])
+        else:
+            # FROM: first listed station the unit has visited, MOST RECENT visit
+            from_station = next((s for s in rule['from'] if s in timeline), None)
+            from_visit = timeline.last(from_station)
+        if from_station is None:
+            if rule['missing_from']:
+                report(rule['from_label'])
+            if rule['missing_both'] and rule['missing_to'] != 'never' and not to_present:
+                report(rule['to_label'])
+            continue
+        match['from_station'] = from_station
+        match['from_start'], match['from_end'] = from_visit
+
+        # TO: first visit that starts after the FROM end
+        candidates = to_present[:1] if rule['to_select'] == 'first_present' else to_present
+        found = timeline.first_after_any(candidates, match['from_end'])
+        if not found and rule['fallback'] == 'any':
+            found = timeline.next_after(match['from_end'], exclude=rule['from'])
+
+        if not found:
+            if rule['missing_to'] == 'unmatched' or (rule['missing_to'] == 'absent' and not to_present):
+                report(rule['to_label'])
+            continue
+        match['to_station'], (match['to_start'], match['to_end']) = found
+
+    return matches, missing_stations
+
+
+def evaluate_rules(rules, timeline):
+    """
+    Measure every rule on one serial number's StationTimeline
+
+    Returns ({rule name: transition or None}, [missing station labels])
+    """
+    matches, missing_stations = match_rules(rules, timeline)
+
+    transitions = {}
+    for name, match in matches.items():
+        if match['to_station'] is None:
+            transitions[name] = None
+            continue
+        gap = match['to_start'] - match['from_end']
+        transitions[name] = {
+            'from_station': match['from_station'],
+            'from_end': match['from_end'].isoformat(),
+            'to_station': match['to_station'],
+            'to_start': match['to_start'].isoformat(),
+            'gap_seconds': gap.total_seconds(),
+            'gap_hours': round(gap.total_seconds() / 3600, 2),
+            'gap_formatted': str(gap)
+        }
+
+    return transitions, missing_stations
+
+
+def calculate_transitions(serial_number, rules, rows=None):
+    """
+    Calculate every configured transition for a serial number
+    """
+    try:
+        # Only query on our own if the caller did not bulk load the history
+        if rows is None:
+            rows = load_station_history([serial_number]).get(serial_number, [])
+
+        if not rows:
+            return {
+                'serial_number': serial_number,
+                'error': 'No data found',
+                'transitions': {rule['name']: None for rule in rules}
+            }
+
+        transitions, missing_stations = evaluate_rules(rules, StationTimeline(rows))
+        return {
+            'serial_number': serial_number,
+            'transitions': transitions,
+            'missing_stations': missing_stations
+        }
+
+    except Exception as e:
+        return {
+            'serial_number': serial_number,
+            'error': f'Error: {str(e)}',
+            'transitions': {rule['name']: None for rule in rules}
+        }
+
+
+def save_transitions(results, rules):
+    """
+    Write transition_gaps_results.json and transition_gaps_summary.csv
+    """
+    with open('transition_gaps_results.json', 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n✓ Results saved to transition_gaps_results.json")
+
+    with open('transition_gaps_summary.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+
+        header = ['Serial Number']
+        for rule in rules:
+            header.append(f"{rule['name']} Next Station")
+            header.append(f"{rule['name']} (hours)")
+        header.append('Missing Stations')
+        writer.writerow(header)
+
+        for result in results:
+            row = [result['serial_number']]
+            for rule in rules:
+                transition = result['transitions'].get(rule['name'])
+                row.append(transition['to_station'] if transition else 'N/A')
+                row.append(transition['gap_hours'] if transition else 'N/A')
+            row.append(', '.join(result.get('missing_stations', [])))
+            writer.writerow(row)
+
+    print(f"✓ Summary saved to transition_gaps_summary.csv")
+
+
+def main():
+    rules_file = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_RULES_FILE
+    try:
+        rules = load_rules(rules_file)
+    except (OSError, ValueError) as e:
+        print(f"✗ Could not load transition rules from {rules_file}: {e}")
+        sys.exit(1)
+
+    print(f"Loaded {len(rules)} transition rules from {rules_file}")
+
+    # Read serial numbers from CSV (handle UTF-8 BOM)
+    serial_numbers = []
+    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row:
+                serial_numbers.append(row[0].strip())
+
+    print(f"Processing {len(serial_numbers)} serial numbers...")
+
+    # Fetch the history for every serial number up front in a few queries
+    history = load_station_history(serial_numbers)
+
+    results = []
+    for i, sn in enumerate(serial_numbers, 1):
+        if i % 100 == 0:
+            print(f"Processed {i}/{len(serial_numbers)}...")
+
+        results.append(calculate_transitions(sn, rules, history.get(sn, [])))
+
+    save_transitions(results, rules)
+
+if __name__ == "__main__":
+    main()
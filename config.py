@@ -0,0 +1,84 @@
+"""
+Shared settings for the analysis and import scripts
+"""
+import os
+
+# Database settings
+DATABASE = {
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'fox_db',
+    'user': 'gpu_user',
+    'password': ''
+}
+
+# Connection pool size (see db.py)
+DB_POOL_MIN_CONNECTIONS = 1
+DB_POOL_MAX_CONNECTIONS = 8
+
+# Re-check a pooled connection with SELECT 1 if it sat idle longer than this
+DB_HEALTH_CHECK_SECONDS = 60
+
+# Rows read, cleaned and committed at a time by import_workstation_file_fixed.py
+IMPORT_CHUNK_ROWS = 50000
+
+# ingest_daemon.py: exports dropped in INGEST_DROP_DIR are imported by up to
+# INGEST_WORKERS processes at once, then moved to INGEST_DONE_DIR or
+# INGEST_FAILED_DIR; the folder is checked every INGEST_POLL_SECONDS
+INGEST_DROP_DIR = "ingest/incoming"
+INGEST_DONE_DIR = "ingest/done"
+INGEST_FAILED_DIR = "ingest/failed"
+INGEST_STATUS_FILE = "ingest/status.json"
+INGEST_WORKERS = 4
+INGEST_POLL_SECONDS = 5
+
+# Files in flight when a worker process dies stay in INGEST_DROP_DIR and are
+# retried (alone) up to this many times before going to INGEST_FAILED_DIR
+INGEST_MAX_RETRIES = 2
+
+# SQL portal API used by QUE_raw_timestamps.py and all_stations_time.py
+# (set SQL_PORTAL_URL to use another portal, e.g. testing-api/mock_portal.py)
+API_BASE_URL = os.environ.get("SQL_PORTAL_URL", "http://10.23.8.215:5000/api/v1/sql-portal")
+
+# How many /serial-history requests may be in flight at once (1 = one after another)
+API_MAX_IN_FLIGHT = 4
+
+# Seconds to wait for each /serial-history request
+API_TIMEOUT_SECONDS = 60
+
+# Seconds to wait for the portal to accept a connection; once a batch cannot
+# connect even after its retries, the remaining batches are dead-lettered
+# straight away instead of each waiting out its own retries
+API_CONNECT_TIMEOUT_SECONDS = 10
+
+# /serial-history batch size: starts at API_BATCH_SIZE, then grows while
+# throughput improves and shrinks on timeouts / 5xx, within MIN..MAX
+API_BATCH_SIZE = 10
+API_BATCH_SIZE_MIN = 1
+API_BATCH_SIZE_MAX = 200
+
+# Stop growing batches once a response gets bigger than this
+API_MAX_RESPONSE_BYTES = 20 * 1024 * 1024
+
+# Failed /serial-history requests (timeouts, connection errors, 429/5xx) are
+# retried with exponential backoff and jitter: a random wait of up to
+# API_RETRY_BASE_SECONDS * 2**attempt, capped at API_RETRY_MAX_SECONDS
+API_MAX_RETRIES = 3
+API_RETRY_BASE_SECONDS = 1.0
+API_RETRY_MAX_SECONDS = 30.0
+
+# On-disk cache of /serial-history responses (None = always ask the API).
+# Entries expire after API_CACHE_TTL_SECONDS, except units already at
+# SHIPPING, which never change; least recently used entries go first once
+# the cache holds more than API_CACHE_MAX_ENTRIES serial numbers
+API_CACHE_PATH = "serial_history_cache.sqlite3"
+API_CACHE_TTL_SECONDS = 6 * 3600
+API_CACHE_MAX_ENTRIES = 500000
+
+# Parse /serial-history responses incrementally with ijson (if installed)
+# instead of loading each whole body first
+API_STREAM_JSON = True
+
+# Date ranges longer than this many days are fetched as parallel shards of
+# this size and merged (None = always one request for the whole range)
+API_SHARD_DAYS = 14
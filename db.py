@@ -0,0 +1,132 @@
+"""
+Shared PostgreSQL connection pool
+
+All scripts borrow connections from one bounded pool instead of calling
+psycopg2.connect() (a full TCP + auth handshake) for every serial number.
+
+Usage:
+    from db import get_connection
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(...)
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import pool
+
+from config import DATABASE, DB_POOL_MIN_CONNECTIONS, DB_POOL_MAX_CONNECTIONS, DB_HEALTH_CHECK_SECONDS
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# id(conn) -> time the connection was last handed back to the pool
+_last_used = {}
+
+# id(conn) -> names of statements already PREPAREd on that session
+_prepared = {}
+
+
+def get_pool():
+    """
+    Get the shared pool, creating it on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = pool.ThreadedConnectionPool(
+                DB_POOL_MIN_CONNECTIONS,
+                DB_POOL_MAX_CONNECTIONS,
+                **DATABASE
+            )
+        return _pool
+
+
+def close_pool():
+    """
+    Close every pooled connection (call at the end of a long-running process)
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _last_used.clear()
+        _prepared.clear()
+
+
+def is_healthy(conn):
+    """
+    Check that a connection is still usable with a cheap SELECT 1
+    """
+    if conn.closed:
+        return False
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1;")
+        cur.fetchone()
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _discard(db_pool, conn):
+    _last_used.pop(id(conn), None)
+    _prepared.pop(id(conn), None)
+    db_pool.putconn(conn, close=True)
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrow a connection from the pool
+
+    The transaction is committed if the block finishes and rolled back if it
+    raises. Connections that sat idle longer than DB_HEALTH_CHECK_SECONDS are
+    checked first and replaced if the server dropped them.
+    """
+    db_pool = get_pool()
+    conn = db_pool.getconn()
+
+    idle_since = _last_used.get(id(conn))
+    if conn.closed or (idle_since is not None and time.monotonic() - idle_since > DB_HEALTH_CHECK_SECONDS):
+        if not is_healthy(conn):
+            _discard(db_pool, conn)
+            conn = db_pool.getconn()
+
+    try:
+        yield conn
+        if not conn.closed:
+            conn.commit()
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        if conn.closed:
+            _discard(db_pool, conn)
+        else:
+            _last_used[id(conn)] = time.monotonic()
+            db_pool.putconn(conn)
+
+
+def execute_prepared(cur, name, query, params):
+    """
+    Run a query as a server-side prepared statement
+
+    `query` uses $1, $2, ... placeholders. It is PREPAREd once per pooled
+    connection and every later call only sends EXECUTE with the parameters,
+    so the server skips parsing and planning.
+    """
+    prepared = _prepared.setdefault(id(cur.connection), set())
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {query}")
+        prepared.add(name)
+
+    placeholders = ', '.join(['%s'] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Gap and process-time percentiles over the whole history
+
+Walks every unit in workstation_master_log (or the serial numbers in a CSV
+file) in chunks, runs calculate_time_gaps() and calculate_process_times() on
+each serial number and feeds the durations straight into quantile sketches.
+Per-serial results are thrown away as soon as they are counted, so memory
+stays flat however many units there are.
+
+With --workers N the chunks are spread over N processes; each builds its own
+sketches and they are merged at the end.
+
+Output: time_gap_percentiles.csv / time_gap_sketches.json
+        process_time_percentiles.csv / process_time_sketches.json
+
+Usage: python duration_percentiles.py [numbers.csv] [--workers N]
+"""
+import sys
+import csv
+from concurrent.futures import ProcessPoolExecutor
+
+from db import get_connection, close_pool
+from station_history import CHUNK_SIZE, load_station_history
+from calculate_times import calculate_time_gaps, update_time_gap_sketches
+from calculate_process_times import calculate_process_times, update_process_time_sketches
+from quantile_sketch import SketchSet, save_percentiles
+
+
+def read_all_serial_numbers():
+    """Every distinct serial number in workstation_master_log"""
+    with get_connection() as conn:
+        cur = conn.cursor(name='duration_percentiles_serials')
+        cur.itersize = 10000
+        cur.execute("SELECT DISTINCT sn FROM workstation_master_log ORDER BY sn")
+        serial_numbers = [row[0] for row in cur]
+        cur.close()
+    return serial_numbers
+
+
+def sketch_chunk(serial_numbers):
+    """
+    Sketch the gaps and process times of one chunk of serial numbers
+    Returns (gap_sketches, process_time_sketches)
+    """
+    gap_sketches = SketchSet()
+    process_time_sketches = SketchSet()
+    history = load_station_history(serial_numbers)
+
+    for sn in serial_numbers:
+        rows = history.get(sn, [])
+        update_time_gap_sketches(gap_sketches, calculate_time_gaps(sn, rows))
+        update_process_time_sketches(process_time_sketches, calculate_process_times(sn, rows))
+
+    return gap_sketches, process_time_sketches
+
+
+def main():
+    args = sys.argv[1:]
+    workers = 1
+    if '--workers' in args:
+        i = args.index('--workers')
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+
+    if args:
+        # Read serial numbers from CSV (handle UTF-8 BOM)
+        serial_numbers = []
+        with open(args[0], 'r', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            for row in reader:
+                if row:
+                    serial_numbers.append(row[0].strip())
+        serial_numbers = list(dict.fromkeys(serial_numbers))
+    else:
+        serial_numbers = read_all_serial_numbers()
+
+    chunks = [serial_numbers[i:i + CHUNK_SIZE] for i in range(0, len(serial_numbers), CHUNK_SIZE)]
+    print(f"Sketching {len(serial_numbers):,} serial numbers in {len(chunks)} chunks ({workers} worker(s))...")
+
+    gap_sketches = SketchSet()
+    process_time_sketches = SketchSet()
+
+    if workers > 1:
+        # Worker processes must open their own connections
+        close_pool()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = executor.map(sketch_chunk, chunks)
+            for i, (chunk_gaps, chunk_process_times) in enumerate(chunk_results, 1):
+                gap_sketches.merge(chunk_gaps)
+                process_time_sketches.merge(chunk_process_times)
+                print(f"Processed chunk {i}/{len(chunks)}...")
+    else:
+        for i, chunk in enumerate(chunks, 1):
+            chunk_gaps, chunk_process_times = sketch_chunk(chunk)
+            gap_sketches.merge(chunk_gaps)
+            process_time_sketches.merge(chunk_process_times)
+            print(f"Processed chunk {i}/{len(chunks)}...")
+
+    save_percentiles(gap_sketches, 'time_gap_percentiles.csv', 'time_gap_sketches.json', 'Transition')
+    save_percentiles(process_time_sketches, 'process_time_percentiles.csv', 'process_time_sketches.json', 'Station')
+
+if __name__ == "__main__":
+    main()
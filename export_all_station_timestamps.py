@@ -1,36 +1,17 @@
-import psycopg2
 import csv
 from datetime import datetime
+from station_history import load_station_history
+from station_timeline import StationTimeline
 
-# Database settings
-DATABASE = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'fox_db',
-    'user': 'gpu_user',
-    'password': ''
-}
-
-def get_all_station_timestamps(serial_number):
+def get_all_station_timestamps(serial_number, rows=None):
     """
     Get all station start and end times for a serial number
     Uses the MOST RECENT visit if a station appears multiple times
     """
     try:
-        conn = psycopg2.connect(**DATABASE)
-        cur = conn.cursor()
-        
-        # Get all station times for this serial number
-        cur.execute("""
-            SELECT workstation_name, history_station_start_time, history_station_end_time
-            FROM workstation_master_log 
-            WHERE sn = %s
-            ORDER BY history_station_start_time;
-        """, (serial_number,))
-        
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        # Only query on our own if the caller did not bulk load the history
+        if rows is None:
+            rows = load_station_history([serial_number]).get(serial_number, [])
         
         if not rows:
             return {
@@ -38,15 +19,8 @@ def get_all_station_timestamps(serial_number):
                 'stations': {}
             }
         
-        # Build dictionary of stations (with lists for multiple visits)
-        stations = {}
-        for station, start_time, end_time in rows:
-            if station not in stations:
-                stations[station] = []
-            stations[station].append({
-                'start': start_time,
-                'end': end_time
-            })
+        # Index the station visits (with lists for multiple visits)
+        stations = StationTimeline(rows)
         
         # Use MOST RECENT visit for each station
         result = {
@@ -54,12 +28,12 @@ def get_all_station_timestamps(serial_number):
             'stations': {}
         }
         
-        for station_name, visits in stations.items():
+        for station_name in stations.stations:
             # Get the last (most recent) visit
-            last_visit = visits[-1]
+            start, end = stations.last(station_name)
             result['stations'][station_name] = {
-                'start': last_visit['start'],
-                'end': last_visit['end']
+                'start': start,
+                'end': end
             }
         
         return result
@@ -71,26 +45,10 @@ def get_all_station_timestamps(serial_number):
             'stations': {}
         }
 
-def main():
-    # Read serial numbers from CSV
-    serial_numbers = []
-    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if row:
-                serial_numbers.append(row[0].strip())
-    
-    print(f"Processing {len(serial_numbers)} serial numbers...")
-    
-    results = []
-    
-    for i, sn in enumerate(serial_numbers, 1):
-        if i % 100 == 0:
-            print(f"Processed {i}/{len(serial_numbers)}...")
-        
-        result = get_all_station_timestamps(sn)
-        results.append(result)
-    
+def save_all_station_timestamps(results):
+    """
+    Write all_station_timestamps.csv with start/end columns for every station
+    """
     # Get ALL unique stations from all results
     all_stations = set()
     for result in results:
@@ -132,6 +90,31 @@ def main():
             writer.writerow(row)
     
     print(f"\n✓ All station timestamps exported to all_station_timestamps.csv")
+
+def main():
+    # Read serial numbers from CSV
+    serial_numbers = []
+    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row:
+                serial_numbers.append(row[0].strip())
+    
+    print(f"Processing {len(serial_numbers)} serial numbers...")
+    
+    # Fetch the history for every serial number up front in a few queries
+    history = load_station_history(serial_numbers)
+    
+    results = []
+    
+    for i, sn in enumerate(serial_numbers, 1):
+        if i % 100 == 0:
+            print(f"Processed {i}/{len(serial_numbers)}...")
+        
+        result = get_all_station_timestamps(sn, history.get(sn, []))
+        results.append(result)
+    
+    save_all_station_timestamps(results)
     
     # Show a sample
     if results:
@@ -1,218 +1,91 @@
-import psycopg2
 import csv
 from datetime import datetime
+from station_history import load_station_history
+from station_timeline import StationTimeline
+from calculate_transitions import load_rules, match_rules
 
-# Database settings
-DATABASE = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'fox_db',
-    'user': 'gpu_user',
-    'password': ''
+RAW_TIMESTAMP_RULES_FILE = 'raw_timestamp_rules.json'
+
+# Rules from raw_timestamp_rules.json reported here, and the result key of
+# each visit time match_rules() finds for them
+RAW_TIMESTAMP_FIELDS = {
+    'vi1_to_next': {
+        'from_end': 'vi1_end',
+        'to_station': 'vi1_next_station',
+        'to_start': 'vi1_next_start'
+    },
+    'upgrade_to_bbd_or_assy1': {
+        'from_end': 'upgrade_end',
+        'to_station': 'bbd_assy_station',
+        'to_start': 'bbd_assy_start',
+        'to_end': 'bbd_assy_end'
+    },
+    'bbd_or_assy1_to_fla_or_chiflash': {
+        'to_station': 'fla_chiflash_station',
+        'to_start': 'fla_chiflash_start'
+    },
+    'packing_to_shipping': {
+        'from_end': 'packing_end',
+        'to_start': 'shipping_start'
+    }
 }
 
-def get_raw_timestamps(serial_number):
+_raw_timestamp_rules = None
+
+def get_raw_timestamp_rules():
     """
-    Get the raw timestamps used in calculations for a serial number
+    The RAW_TIMESTAMP_FIELDS rules from raw_timestamp_rules.json (read once)
+    """
+    global _raw_timestamp_rules
+    if _raw_timestamp_rules is None:
+        rules = load_rules(RAW_TIMESTAMP_RULES_FILE)
+        missing = [name for name in RAW_TIMESTAMP_FIELDS if name not in {rule['name'] for rule in rules}]
+        if missing:
+            raise ValueError(f"{RAW_TIMESTAMP_RULES_FILE} has no rule for {', '.join(missing)}")
+        _raw_timestamp_rules = rules
+    return _raw_timestamp_rules
+
+def empty_raw_timestamps(serial_number):
+    result = {'serial_number': serial_number}
+    for fields in RAW_TIMESTAMP_FIELDS.values():
+        result.update(dict.fromkeys(fields.values()))
+    return result
+
+def get_raw_timestamps(serial_number, rows=None):
+    """
+    Get the raw timestamps used in calculations for a serial number:
+    1. VI1 end time and the Disassembly/UPGRADE start after it
+    2. Upgrade end time and the BBD/ASSY1 visit after it
+    3. The FLA/CHIFLASH start after that BBD/ASSY1 visit ends
+    4. Packing end time and the Shipping start after it
+
+    The timestamps are the visits matched by the rules in
+    raw_timestamp_rules.json (calculate_transitions.match_rules())
     """
     try:
-        conn = psycopg2.connect(**DATABASE)
-        cur = conn.cursor()
-        
-        # Get all station times for this serial number
-        cur.execute("""
-            SELECT workstation_name, history_station_start_time, history_station_end_time
-            FROM workstation_master_log 
-            WHERE sn = %s
-            ORDER BY history_station_start_time;
-        """, (serial_number,))
-        
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        # Only query on our own if the caller did not bulk load the history
+        if rows is None:
+            rows = load_station_history([serial_number]).get(serial_number, [])
         
+        result = empty_raw_timestamps(serial_number)
         if not rows:
-            return {
-                'serial_number': serial_number,
-                'vi1_end': None,
-                'vi1_next_station': None,
-                'vi1_next_start': None,
-                'upgrade_end': None,
-                'bbd_assy_station': None,
-                'bbd_assy_start': None,
-                'bbd_assy_end': None,
-                'fla_chiflash_station': None,
-                'fla_chiflash_start': None,
-                'packing_end': None,
-                'shipping_start': None
-            }
-        
-        # Build a dictionary of station times (with lists for multiple occurrences)
-        stations = {}
-        for station, start_time, end_time in rows:
-            if station not in stations:
-                stations[station] = []
-            stations[station].append({
-                'start': start_time,
-                'end': end_time
-            })
-        
-        result = {
-            'serial_number': serial_number,
-            'vi1_end': None,
-            'vi1_next_station': None,
-            'vi1_next_start': None,
-            'upgrade_end': None,
-            'bbd_assy_station': None,
-            'bbd_assy_start': None,
-            'bbd_assy_end': None,
-            'fla_chiflash_station': None,
-            'fla_chiflash_start': None,
-            'packing_end': None,
-            'shipping_start': None
-        }
-        
-        # 1. VI1 end time and next station start time
-        if 'VI1' in stations:
-            vi1_end = stations['VI1'][-1]['end']  # MOST RECENT occurrence
-            result['vi1_end'] = vi1_end
-            
-            # Find the next station after VI1's MOST RECENT occurrence
-            next_station_name = None
-            next_station_start = None
-            
-            # Look for Disassembly or UPGRADE only
-            candidates = []
-            
-            if 'Disassembly' in stations:
-                for disassembly_time in stations['Disassembly']:
-                    if disassembly_time['start'] and vi1_end and disassembly_time['start'] > vi1_end:
-                        candidates.append(('Disassembly', disassembly_time['start']))
-                        break
-            
-            if 'UPGRADE' in stations:
-                for upgrade_time in stations['UPGRADE']:
-                    if upgrade_time['start'] and vi1_end and upgrade_time['start'] > vi1_end:
-                        candidates.append(('UPGRADE', upgrade_time['start']))
-                        break
-            
-            # Pick whichever comes first
-            if candidates:
-                candidates.sort(key=lambda x: x[1])
-                next_station_name = candidates[0][0]
-                next_station_start = candidates[0][1]
-            
-            result['vi1_next_station'] = next_station_name
-            result['vi1_next_start'] = next_station_start
-        
-        # 2. Upgrade end time and BBD/ASSY1 start time
-        if 'UPGRADE' in stations:
-            upgrade_end = stations['UPGRADE'][-1]['end']  # MOST RECENT occurrence
-            result['upgrade_end'] = upgrade_end
-            
-            # Look for BBD OR ASSY1 after UPGRADE, whichever comes first
-            candidates = []
-            
-            if 'BBD' in stations:
-                for bbd_time in stations['BBD']:
-                    if bbd_time['start'] and upgrade_end and bbd_time['start'] > upgrade_end:
-                        candidates.append(('BBD', bbd_time['start'], bbd_time['end']))
-                        break
-            
-            if 'ASSY1' in stations:
-                for assy1_time in stations['ASSY1']:
-                    if assy1_time['start'] and upgrade_end and assy1_time['start'] > upgrade_end:
-                        candidates.append(('ASSY1', assy1_time['start'], assy1_time['end']))
-                        break
-            
-            if 'Assembley' in stations:
-                for assembley_time in stations['Assembley']:
-                    if assembley_time['start'] and upgrade_end and assembley_time['start'] > upgrade_end:
-                        candidates.append(('Assembley', assembley_time['start'], assembley_time['end']))
-                        break
-            
-            # Pick whichever comes first chronologically
-            if candidates:
-                candidates.sort(key=lambda x: x[1])  # Sort by start time
-                result['bbd_assy_station'] = candidates[0][0]
-                result['bbd_assy_start'] = candidates[0][1]
-                result['bbd_assy_end'] = candidates[0][2]
-        
-        # 3. BBD/ASSY1 end time and FLA/CHIFLASH start time
-        if result['bbd_assy_station'] and result['bbd_assy_end']:
-            prev_end = result['bbd_assy_end']
-            
-            # Find the earliest FLA or CHIFLASH that comes AFTER the last BBD/ASSY1
-            candidates = []
-            
-            if 'FLA' in stations:
-                for fla_time in stations['FLA']:
-                    if fla_time['start'] and prev_end and fla_time['start'] > prev_end:
-                        candidates.append(('FLA', fla_time['start']))
-                        break
-            
-            if 'CHIFLASH' in stations:
-                for chiflash_time in stations['CHIFLASH']:
-                    if chiflash_time['start'] and prev_end and chiflash_time['start'] > prev_end:
-                        candidates.append(('CHIFLASH', chiflash_time['start']))
-                        break
-            
-            if candidates:
-                candidates.sort(key=lambda x: x[1])
-                result['fla_chiflash_station'] = candidates[0][0]
-                result['fla_chiflash_start'] = candidates[0][1]
+            return result
         
-        # 4. Packing end time and Shipping start time
-        if 'PACKING' in stations:
-            packing_end = stations['PACKING'][-1]['end']  # MOST RECENT occurrence
-            result['packing_end'] = packing_end
-            
-            if 'SHIPPING' in stations:
-                # Find first SHIPPING after the most recent PACKING
-                for shipping_time in stations['SHIPPING']:
-                    if shipping_time['start'] and packing_end and shipping_time['start'] > packing_end:
-                        result['shipping_start'] = shipping_time['start']
-                        break
+        matches, _ = match_rules(get_raw_timestamp_rules(), StationTimeline(rows))
+        for name, fields in RAW_TIMESTAMP_FIELDS.items():
+            for key, field in fields.items():
+                result[field] = matches[name][key]
         
         return result
         
     except Exception as e:
         print(f"Error processing {serial_number}: {e}")
-        return {
-            'serial_number': serial_number,
-            'vi1_end': None,
-            'vi1_next_station': None,
-            'vi1_next_start': None,
-            'upgrade_end': None,
-            'bbd_assy_station': None,
-            'bbd_assy_start': None,
-            'bbd_assy_end': None,
-            'fla_chiflash_station': None,
-            'fla_chiflash_start': None,
-            'packing_end': None,
-            'shipping_start': None
-        }
+        return empty_raw_timestamps(serial_number)
 
-def main():
-    # Read serial numbers from CSV
-    serial_numbers = []
-    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            if row:
-                serial_numbers.append(row[0].strip())
-    
-    print(f"Processing {len(serial_numbers)} serial numbers...")
-    
-    results = []
-    
-    for i, sn in enumerate(serial_numbers, 1):
-        if i % 100 == 0:
-            print(f"Processed {i}/{len(serial_numbers)}...")
-        
-        result = get_raw_timestamps(sn)
-        results.append(result)
-    
+def save_raw_timestamps(results):
+    """
+    Write raw_timestamps.csv
+    """
     # Create CSV with raw timestamps
     with open('raw_timestamps.csv', 'w', newline='') as f:
         writer = csv.writer(f)
@@ -248,6 +121,31 @@ def main():
             ])
     
     print(f"\n✓ Raw timestamps exported to raw_timestamps.csv")
+
+def main():
+    # Read serial numbers from CSV
+    serial_numbers = []
+    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row:
+                serial_numbers.append(row[0].strip())
+    
+    print(f"Processing {len(serial_numbers)} serial numbers...")
+    
+    # Fetch the history for every serial number up front in a few queries
+    history = load_station_history(serial_numbers)
+    
+    results = []
+    
+    for i, sn in enumerate(serial_numbers, 1):
+        if i % 100 == 0:
+            print(f"Processed {i}/{len(serial_numbers)}...")
+        
+        result = get_raw_timestamps(sn, history.get(sn, []))
+        results.append(result)
+    
+    save_raw_timestamps(results)
     
     # Show a sample
     if results:
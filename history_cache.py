@@ -0,0 +1,170 @@
+"""
+On-disk cache for /serial-history responses
+
+Records are kept per serial number and date range in a SQLite file,
+zlib-compressed JSON. Entries expire after a TTL, except for units whose last
+station is SHIPPING: their history will not change, so they are kept until
+LRU eviction pushes them out once the cache holds more than max_entries.
+
+Usage: python history_cache.py            (show what is in the cache)
+       python history_cache.py clear      (empty it)
+"""
+import sys
+import json
+import sqlite3
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from config import API_CACHE_PATH, API_CACHE_TTL_SECONDS, API_CACHE_MAX_ENTRIES
+from api_timestamps import parse_api_time
+
+# Station after which a unit's history is final
+FINAL_STATION = 'SHIPPING'
+
+# Serial numbers per IN (...) lookup, well under SQLite's variable limit
+LOOKUP_CHUNK_SIZE = 500
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS serial_history (
+        sn TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        records BLOB NOT NULL,
+        immutable INTEGER NOT NULL,
+        fetched_at REAL NOT NULL,
+        last_used REAL NOT NULL,
+        PRIMARY KEY (sn, start_date, end_date)
+    );
+    CREATE INDEX IF NOT EXISTS serial_history_last_used ON serial_history (last_used);
+"""
+
+
+def is_final(records: List[Dict]) -> bool:
+    """
+    True if the unit's latest station visit is SHIPPING
+    """
+    latest_time, latest_station = None, None
+    for record in records:
+        start = parse_api_time(record.get('history_station_start_time'))
+        if start and (latest_time is None or start >= latest_time):
+            latest_time, latest_station = start, record.get('workstation_name')
+    return bool(latest_station) and latest_station.upper() == FINAL_STATION
+
+
+class HistoryCache:
+    def __init__(self, path: str = API_CACHE_PATH, ttl_seconds: float = API_CACHE_TTL_SECONDS,
+                 max_entries: int = API_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    @staticmethod
+    def _key_dates(start_date: Optional[str], end_date: Optional[str]):
+        # The client only sends a date range when it has both ends
+        if start_date and end_date:
+            return start_date, end_date
+        return '', ''
+
+    def get_many(self, serial_numbers: List[str], start_date: Optional[str] = None,
+                 end_date: Optional[str] = None) -> Dict[str, List[Dict]]:
+        """
+        {serial_number: records} for every serial number with a usable entry
+        """
+        start_key, end_key = self._key_dates(start_date, end_date)
+        now = time.time()
+        unique_serials = list(dict.fromkeys(serial_numbers))
+        found = {}
+
+        for i in range(0, len(unique_serials), LOOKUP_CHUNK_SIZE):
+            chunk = unique_serials[i:i + LOOKUP_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"""
+                SELECT sn, records FROM serial_history
+                WHERE start_date = ? AND end_date = ? AND sn IN ({placeholders})
+                  AND (immutable = 1 OR fetched_at >= ?)
+                """,
+                (start_key, end_key, *chunk, now - self.ttl_seconds)
+            ).fetchall()
+            for sn, records in rows:
+                found[sn] = json.loads(zlib.decompress(records))
+
+        if found:
+            self.conn.executemany(
+                "UPDATE serial_history SET last_used = ? WHERE sn = ? AND start_date = ? AND end_date = ?",
+                [(now, sn, start_key, end_key) for sn in found]
+            )
+            self.conn.commit()
+        return found
+
+    def put_many(self, records_by_sn: Dict[str, List[Dict]], start_date: Optional[str] = None,
+                 end_date: Optional[str] = None):
+        """
+        Store freshly fetched records (an empty list is cached too)
+        """
+        if not records_by_sn:
+            return
+        start_key, end_key = self._key_dates(start_date, end_date)
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO serial_history VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (sn, start_key, end_key, zlib.compress(json.dumps(records).encode()),
+                 int(is_final(records)), now, now)
+                for sn, records in records_by_sn.items()
+            ]
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries, then the least recently used ones beyond max_entries
+        """
+        self.conn.execute(
+            "DELETE FROM serial_history WHERE immutable = 0 AND fetched_at < ?",
+            (time.time() - self.ttl_seconds,)
+        )
+        excess = self.conn.execute("SELECT COUNT(*) FROM serial_history").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                """
+                DELETE FROM serial_history WHERE rowid IN (
+                    SELECT rowid FROM serial_history ORDER BY last_used LIMIT ?
+                )
+                """,
+                (excess,)
+            )
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM serial_history")
+        self.conn.commit()
+
+    def stats(self) -> Dict:
+        entries, immutable, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(immutable), 0), COALESCE(SUM(LENGTH(records)), 0) FROM serial_history"
+        ).fetchone()
+        return {'entries': entries, 'immutable': immutable, 'compressed_bytes': size}
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    cache = HistoryCache()
+    if len(sys.argv) > 1 and sys.argv[1] == 'clear':
+        cache.clear()
+        print(f"✓ Cleared {cache.path}")
+    else:
+        stats = cache.stats()
+        print(f"{cache.path}: {stats['entries']:,} entries "
+              f"({stats['immutable']:,} shipped, kept past the TTL), "
+              f"{stats['compressed_bytes'] / 1024 / 1024:.1f} MB compressed")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Pluggable sources of station history
+
+Every source turns a list of serial numbers into the same normalized
+timelines - {serial_number: [(workstation_name, start_time, end_time), ...]}
+with datetimes, ordered by start time (missing start times last) - the shape
+load_station_history() returns. The calculation functions
+(calculate_time_gaps, get_raw_timestamps, get_all_station_timestamps) run on
+top of any of them, so the DB and API paths share one computation core.
+
+Sources:
+- postgres  workstation_master_log (chunked ANY(...) queries)
+- portal    the SQL portal /serial-history endpoint (portal_client.py),
+            always asked directly, without the response cache
+- cache     the on-disk /serial-history cache only, no network (history_cache.py)
+- parquet   a Parquet snapshot of the visits (needs pyarrow or fastparquet;
+            write one with the `snapshot` command)
+
+Usage: python history_sources.py gaps|raw|all [numbers.csv] [--source NAME|auto]
+       python history_sources.py benchmark [numbers.csv] [--sample N]
+       python history_sources.py snapshot visits.parquet [numbers.csv]
+
+--source auto times every available source on a sample of the serial numbers
+and runs with the fastest one that finds as much data as the others.
+"""
+import os
+import sys
+import csv
+import time
+from abc import ABC, abstractmethod
+from importlib.util import find_spec
+from itertools import groupby
+
+import pandas as pd
+
+from config import API_CACHE_PATH
+from api_timestamps import normalize_records
+from station_history import CHUNK_SIZE, load_station_history
+from portal_client import SerialHistoryClient
+from history_cache import HistoryCache
+from calculate_times import calculate_time_gaps, save_time_gap_results
+from export_raw_timestamps import get_raw_timestamps, save_raw_timestamps
+from export_all_station_timestamps import get_all_station_timestamps, save_all_station_timestamps
+
+# Default Parquet snapshot written by `snapshot` and read by ParquetSource
+PARQUET_PATH = 'workstation_visits.parquet'
+
+# Serial numbers timed per source by `benchmark` and --source auto
+BENCHMARK_SAMPLE = 200
+
+PARQUET_COLUMNS = ['sn', 'workstation_name', 'history_station_start_time', 'history_station_end_time']
+
+
+class HistorySource(ABC):
+    """
+    Base class: subclasses implement load()
+    """
+    name = None
+
+    def available(self):
+        """(True, '') if the source can be used here, else (False, reason)"""
+        return True, ''
+
+    @abstractmethod
+    def load(self, serial_numbers):
+        """
+        {serial_number: [(station, start, end), ...]}; serial numbers with no
+        data are not in the dictionary
+        """
+
+    def iter_chunks(self, serial_numbers, chunk_size=CHUNK_SIZE):
+        """Yield (chunk of serial numbers, their history) so callers can stream"""
+        for i in range(0, len(serial_numbers), chunk_size):
+            chunk = serial_numbers[i:i + chunk_size]
+            yield chunk, self.load(chunk)
+
+
+class PostgresSource(HistorySource):
+    name = 'postgres'
+
+    def load(self, serial_numbers):
+        return load_station_history(serial_numbers)
+
+
+class PortalSource(HistorySource):
+    name = 'portal'
+
+    def __init__(self, client=None, start_date=None, end_date=None):
+        if client is None:
+            client = SerialHistoryClient(cache_path=None)
+        self.client = client
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def load(self, serial_numbers):
+        history = {}
+        batches = self.client.fetch_history_batches(
+            list(dict.fromkeys(serial_numbers)), start_date=self.start_date, end_date=self.end_date
+        )
+        for batch, api_response in batches:
+            for sn in batch:
+                records = api_response['history_by_sn'].get(sn)
+                if records:
+                    history[sn] = normalize_records(records)
+        return history
+
+
+class CacheSource(HistorySource):
+    name = 'cache'
+
+    def __init__(self, cache=None, start_date=None, end_date=None):
+        # Opened on first load(): opening creates the file if it is missing
+        self.cache = cache
+        self.path = cache.path if cache is not None else API_CACHE_PATH
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def available(self):
+        if not self.path or not os.path.exists(self.path):
+            return False, 'no cache file (run a web export first)'
+        return True, ''
+
+    def load(self, serial_numbers):
+        if self.cache is None:
+            self.cache = HistoryCache(self.path)
+        found = self.cache.get_many(serial_numbers, self.start_date, self.end_date)
+        history = {}
+        for sn, records in found.items():
+            # Older entries may still hold testboard records, normalize_records drops them
+            rows = normalize_records(records)
+            if rows:
+                history[sn] = rows
+        return history
+
+
+class ParquetSource(HistorySource):
+    name = 'parquet'
+
+    def __init__(self, path=PARQUET_PATH):
+        self.path = path
+
+    def available(self):
+        if find_spec('pyarrow') is None and find_spec('fastparquet') is None:
+            return False, 'needs pyarrow or fastparquet (pip install pyarrow)'
+        if not os.path.exists(self.path):
+            return False, f'no {self.path} (run the snapshot command first)'
+        return True, ''
+
+    def load(self, serial_numbers):
+        unique_serials = list(dict.fromkeys(serial_numbers))
+        visits = pd.read_parquet(self.path, columns=PARQUET_COLUMNS, filters=[('sn', 'in', unique_serials)])
+
+        def value(moment):
+            return None if pd.isna(moment) else moment.to_pydatetime()
+
+        # The snapshot is written in database order, so each serial's rows are
+        # already by start time
+        history = {}
+        rows = zip(*(visits[column].tolist() for column in PARQUET_COLUMNS))
+        for sn, group in groupby(rows, key=lambda row: row[0]):
+            history.setdefault(sn, []).extend(
+                (station if isinstance(station, str) else None, value(start), value(end))
+                for _, station, start, end in group
+            )
+        return history
+
+
+SOURCES = {source.name: source for source in (PostgresSource, PortalSource, CacheSource, ParquetSource)}
+
+
+def get_source(name, **kwargs):
+    if name not in SOURCES:
+        raise ValueError(f"Unknown history source '{name}' (choose from {', '.join(SOURCES)})")
+    source = SOURCES[name](**kwargs)
+    available, reason = source.available()
+    if not available:
+        raise ValueError(f"History source '{name}' is not available: {reason}")
+    return source
+
+
+def benchmark_sources(serial_numbers, names=None):
+    """
+    Time load() of every available source on serial_numbers
+    Returns [(name, seconds, serial numbers found, error)] in SOURCES order
+    """
+    results = []
+    for name in names or SOURCES:
+        source = SOURCES[name]()
+        available, reason = source.available()
+        if not available:
+            results.append((name, None, 0, reason))
+            continue
+        try:
+            started = time.perf_counter()
+            history = source.load(serial_numbers)
+            results.append((name, time.perf_counter() - started, len(history), None))
+        except Exception as e:
+            results.append((name, None, 0, str(e)))
+    return results
+
+
+def fastest_source(serial_numbers, sample_size=BENCHMARK_SAMPLE):
+    """
+    Name of the quickest source on a sample, among those that found as many
+    serial numbers as the best one (an empty cache is fast but useless)
+    """
+    results = benchmark_sources(serial_numbers[:sample_size])
+    timed = [(name, seconds, found) for name, seconds, found, error in results if seconds is not None]
+    if not timed:
+        raise ValueError("No history source is available")
+    most_found = max(found for _, _, found in timed)
+    return min((seconds, name) for name, seconds, found in timed if found == most_found)[1]
+
+
+def compute(kind, source, serial_numbers):
+    """
+    Run one of the calculations on history from `source`, chunk by chunk
+    Returns the per-serial results in input order
+    """
+    calculate = {
+        'gaps': calculate_time_gaps,
+        'raw': get_raw_timestamps,
+        'all': get_all_station_timestamps
+    }[kind]
+
+    results = []
+    for chunk, history in source.iter_chunks(serial_numbers):
+        for sn in chunk:
+            results.append(calculate(sn, history.get(sn, [])))
+        print(f"Processed {len(results)}/{len(serial_numbers)}...")
+    return results
+
+
+def save_snapshot(path, serial_numbers=None):
+    """
+    Write the visits of serial_numbers (default: every unit) from PostgreSQL
+    to a Parquet file for ParquetSource
+    """
+    if serial_numbers is None:
+        from duration_percentiles import read_all_serial_numbers
+        serial_numbers = read_all_serial_numbers()
+
+    rows = []
+    for chunk, history in PostgresSource().iter_chunks(serial_numbers):
+        for sn in chunk:
+            rows.extend((sn, *visit) for visit in history.get(sn, []))
+
+    visits = pd.DataFrame(rows, columns=PARQUET_COLUMNS)
+    visits.to_parquet(path, index=False)
+    print(f"✓ Saved {len(visits):,} visits of {len(serial_numbers):,} serial numbers to {path}")
+
+
+def read_serial_numbers(path):
+    # Read serial numbers from CSV (handle UTF-8 BOM)
+    serial_numbers = []
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row:
+                serial_numbers.append(row[0].strip())
+    return serial_numbers
+
+
+def main():
+    args = sys.argv[1:]
+    source_name = 'postgres'
+    sample_size = BENCHMARK_SAMPLE
+    if '--source' in args:
+        i = args.index('--source')
+        source_name = args[i + 1]
+        del args[i:i + 2]
+    if '--sample' in args:
+        i = args.index('--sample')
+        sample_size = int(args[i + 1])
+        del args[i:i + 2]
+
+    if not args or args[0] not in ('gaps', 'raw', 'all', 'benchmark', 'snapshot'):
+        print("Usage: python history_sources.py gaps|raw|all [numbers.csv] [--source NAME|auto]")
+        print("       python history_sources.py benchmark [numbers.csv] [--sample N]")
+        print("       python history_sources.py snapshot visits.parquet [numbers.csv]")
+        sys.exit(1)
+    command = args[0]
+
+    if command == 'snapshot':
+        if len(args) < 2:
+            print("Usage: python history_sources.py snapshot visits.parquet [numbers.csv]")
+            sys.exit(1)
+        save_snapshot(args[1], read_serial_numbers(args[2]) if len(args) > 2 else None)
+        return
+
+    serial_numbers = read_serial_numbers(args[1] if len(args) > 1 else 'numbers.csv')
+
+    if command == 'benchmark':
+        sample = serial_numbers[:sample_size]
+        print(f"Timing every history source on {len(sample)} serial numbers...")
+        print(f"{'Source':<10} {'Seconds':>8} {'Serials/s':>10} {'Found':>7}")
+        for name, seconds, found, error in benchmark_sources(sample):
+            if seconds is None:
+                print(f"{name:<10} {'-':>8} {'-':>10} {'-':>7}  ({error})")
+            else:
+                print(f"{name:<10} {seconds:>8.2f} {len(sample) / seconds:>10.0f} {found:>7}")
+        return
+
+    if source_name == 'auto':
+        source_name = fastest_source(serial_numbers, sample_size)
+        print(f"✓ Fastest source on a {min(sample_size, len(serial_numbers))}-serial sample: {source_name}")
+
+    try:
+        source = get_source(source_name)
+    except ValueError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+    print(f"Processing {len(serial_numbers)} serial numbers from {source_name}...")
+    results = compute(command, source, serial_numbers)
+
+    if command == 'gaps':
+        save_time_gap_results(results)
+    elif command == 'raw':
+        save_raw_timestamps(results)
+    else:
+        save_all_station_timestamps(results)
+
+if __name__ == "__main__":
+    main()
@@ -1,155 +1,520 @@
+"""
+Import an MES workstation export (.xlsx or .csv) into workstation_master_log
+
+The file is read IMPORT_CHUNK_ROWS rows at a time (XLSX in openpyxl's
+read-only mode, CSV with pandas chunks); each chunk is cleaned, COPYed and
+committed before the next one is read, so memory stays flat however big the
+export is. Progress is saved to <file>.progress after every commit: if an
+import stops part way, running it again carries on after the last committed
+chunk.
+
+Each imported file's SHA-256 is kept in imported_files, so dropping the same
+export again is rejected before it is read. Rows carry a row_fingerprint
+(md5 of every mapped column, indexed), so rows from overlapping exports are
+found with one index lookup each. Both are created once by --init-schema
+(the index CONCURRENTLY); imports only check that they exist, so they never
+lock the table. --backfill-fingerprints fills the fingerprint in for rows
+imported before it existed.
+
+Usage: python import_workstation_file_fixed.py /path/to/file.xlsx [--chunk-rows N]
+       python import_workstation_file_fixed.py --init-schema
+       python import_workstation_file_fixed.py --backfill-fingerprints
+"""
 import sys
 import os
+import io
+import json
+import hashlib
 import pandas as pd
-import psycopg2
-import math
 
 # Add the parent directory to the path to import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config import DATABASE
+from config import IMPORT_CHUNK_ROWS
+from db import get_connection
+
+# Columns loaded into workstation_master_log, in COPY order
+COLUMNS = [
+    'sn', 'pn', 'model', 'workstation_name',
+    'history_station_start_time', 'history_station_end_time', 'history_station_passing_status', 'operator', 'customer_pn',
+    'hours', 'service_flow', 'passing_station_method', 'first_station_start_time', 'data_source'
+]
+
+# Unique key of workstation_master_log (constraint unique_station_times, see DATABASE_CLEANUP_TODO.md)
+UNIQUE_KEY = ['sn', 'workstation_name', 'history_station_start_time', 'history_station_end_time']
+
+STAGING_TABLE = 'workstation_import_staging'
+
+# Hash of every mapped column (the dedup columns, after cleaning), so a row
+# seen before is found with one indexed lookup
+FINGERPRINT_COLUMN = 'row_fingerprint'
+TIME_COLUMNS = {'history_station_start_time', 'history_station_end_time', 'first_station_start_time'}
+
+# Rows per UPDATE when filling in fingerprints for rows imported before they existed
+BACKFILL_BATCH_ROWS = 100000
+
+FINGERPRINT_INDEX = f'workstation_master_log_{FINGERPRINT_COLUMN}'
 
-def connect_to_db():
-    return psycopg2.connect(**DATABASE)
+# One-off migration run by --init-schema, outside a transaction so the index
+# is built CONCURRENTLY (reads and writes carry on while it builds)
+SCHEMA_MIGRATION = [
+    """
+    CREATE TABLE IF NOT EXISTS imported_files (
+        sha256 TEXT PRIMARY KEY,
+        file_name TEXT NOT NULL,
+        rows INTEGER NOT NULL,
+        inserted INTEGER NOT NULL,
+        skipped INTEGER NOT NULL,
+        imported_at TIMESTAMP NOT NULL DEFAULT now()
+    )
+    """,
+    f"ALTER TABLE workstation_master_log ADD COLUMN IF NOT EXISTS {FINGERPRINT_COLUMN} TEXT",
+    f"""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS {FINGERPRINT_INDEX}
+        ON workstation_master_log ({FINGERPRINT_COLUMN})
+    """
+]
+
+# Wait at most this long for the brief ALTER TABLE lock in --init-schema,
+# instead of queueing every reader of the table behind it
+SCHEMA_LOCK_TIMEOUT = '10s'
+
+# Written for NULL in the COPY data, so empty strings stay empty strings
+COPY_NULL = '\\N'
+
+# Timestamp layout in MES exports; other layouts are still parsed, just slower
+EXPORT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 
 def clean_column_name(col_name):
     return col_name.lower().replace(' ', '_').replace('-', '_')
 
+def text_column(df, name, strip=False):
+    """
+    A column as text, each value written by str() on its own, with blanks
+    and empty strings as NULL
+    """
+    if name not in df:
+        return pd.Series(pd.NA, index=df.index, dtype='string')
+    # Value by value, so the text never depends on the rest of the chunk
+    # (a whole number is '1' as an int cell and '1.0' as a float cell, in
+    # every chunk, as the row-by-row import wrote them)
+    text = df[name].map(str, na_action='ignore').astype('string')
+    if strip:
+        text = text.str.strip()
+    return text.mask(text == '')
+
+def time_column(df, name):
+    """
+    A column as datetime64: EXPORT_TIME_FORMAT in one pass, anything else
+    that pandas can read value by value, NaT for blanks
+    """
+    if name not in df:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    column = df[name]
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column
+    parsed = pd.to_datetime(column, format=EXPORT_TIME_FORMAT, errors='coerce')
+    missed = parsed.isna() & column.notna() & (column.astype('string').str.strip() != '')
+    if missed.any():
+        parsed[missed] = pd.to_datetime(column[missed], format='mixed', errors='coerce')
+    return parsed
+
+def map_rows(df):
+    """
+    Cleaned export columns -> DataFrame with COLUMNS, converted a whole
+    column at a time
+    """
+    end_time = time_column(df, 'history_station_end_time')
+    mapped = pd.DataFrame({
+        'sn': text_column(df, 'sn'),
+        'pn': text_column(df, 'pn'),
+        'model': text_column(df, 'model'),
+        'workstation_name': text_column(df, 'workstation_name'),
+        # Rows with no start time start when they end
+        'history_station_start_time': time_column(df, 'history_station_start_time').fillna(end_time),
+        'history_station_end_time': end_time,
+        'history_station_passing_status': text_column(df, 'history_station_passing_status'),
+        'operator': text_column(df, 'operator'),
+        'customer_pn': text_column(df, 'customer_pn', strip=True),
+        'hours': text_column(df, 'hours'),
+        'service_flow': text_column(df, 'service_flow'),
+        'passing_station_method': text_column(df, 'passing_station_method'),
+        'first_station_start_time': time_column(df, 'first_station_start_time'),
+        'data_source': 'workstation'
+    }, index=df.index)
+    return mapped
+
+def fingerprint_sql(alias):
+    """
+    SQL for the row fingerprint of `alias`: md5 over every column, with times
+    in a fixed format and NULL told apart from an empty string
+    """
+    values = []
+    for column in COLUMNS:
+        value = f"{alias}.{column}"
+        if column in TIME_COLUMNS:
+            value = f"to_char({value}, 'YYYY-MM-DD HH24:MI:SS.US')"
+        values.append(f"coalesce({value}, E'\\\\N')")
+    return f"md5(concat_ws(E'\\x1f', {', '.join(values)}))"
+
+def init_schema(conn, log=print):
+    """
+    Create imported_files and the row_fingerprint column and index if missing
+    (the one-off migration behind --init-schema)
+    """
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SET lock_timeout = %s", (SCHEMA_LOCK_TIMEOUT,))
+        # A CONCURRENTLY build that was interrupted leaves an invalid index
+        # behind, which IF NOT EXISTS would keep
+        cursor.execute("""
+            SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)
+        """, (FINGERPRINT_INDEX,))
+        invalid = cursor.fetchone()
+        if invalid and invalid[0]:
+            log(f"Dropping invalid index {FINGERPRINT_INDEX} left by an interrupted build")
+            cursor.execute(f"DROP INDEX CONCURRENTLY {FINGERPRINT_INDEX}")
+        for statement in SCHEMA_MIGRATION:
+            cursor.execute(statement)
+    finally:
+        cursor.execute("RESET lock_timeout")
+        cursor.close()
+        conn.autocommit = False
+
+def check_schema(conn):
+    """
+    Raise RuntimeError if the --init-schema migration has not been run;
+    catalog lookups only, so no lock is taken on workstation_master_log
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT
+                to_regclass('imported_files') IS NOT NULL,
+                EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_name = 'workstation_master_log' AND column_name = %s
+                ),
+                (SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s))
+        """, (FINGERPRINT_COLUMN, FINGERPRINT_INDEX))
+        has_table, has_column, index_valid = cursor.fetchone()
+    finally:
+        cursor.close()
+    conn.rollback()
+
+    missing = []
+    if not has_table:
+        missing.append('table imported_files')
+    if not has_column:
+        missing.append(f'column workstation_master_log.{FINGERPRINT_COLUMN}')
+    if not index_valid:
+        missing.append(f'index {FINGERPRINT_INDEX}')
+    if missing:
+        raise RuntimeError(
+            f"Database is missing {', '.join(missing)}; "
+            f"run 'python import_workstation_file_fixed.py --init-schema' once first"
+        )
+
+def backfill_fingerprints(conn, log=print):
+    """
+    Fill in row_fingerprint for rows imported before it existed, one batch
+    of ids per transaction
+    Returns how many rows were updated
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT min(id), max(id) FROM workstation_master_log WHERE {FINGERPRINT_COLUMN} IS NULL")
+    first_id, last_id = cursor.fetchone()
+    updated = 0
+    if first_id is not None:
+        for batch_start in range(first_id, last_id + 1, BACKFILL_BATCH_ROWS):
+            cursor.execute(f"""
+                UPDATE workstation_master_log existing
+                SET {FINGERPRINT_COLUMN} = {fingerprint_sql('existing')}
+                WHERE id >= %s AND id < %s AND {FINGERPRINT_COLUMN} IS NULL
+            """, (batch_start, batch_start + BACKFILL_BATCH_ROWS))
+            updated += cursor.rowcount
+            conn.commit()
+            log(f"Fingerprinted {updated:,} rows (ids up to {min(batch_start + BACKFILL_BATCH_ROWS - 1, last_id):,})")
+    cursor.close()
+    return updated
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def find_imported_file(conn, file_hash):
+    """(file name, imported at) if a file with this content was imported before, else None"""
+    cursor = conn.cursor()
+    cursor.execute("SELECT file_name, imported_at FROM imported_files WHERE sha256 = %s", (file_hash,))
+    found = cursor.fetchone()
+    cursor.close()
+    return found
+
+def record_imported_file(conn, file_hash, file_path, progress):
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO imported_files (sha256, file_name, rows, inserted, skipped)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (sha256) DO NOTHING
+        """,
+        (file_hash, os.path.basename(file_path), progress['rows_done'], progress['inserted'], progress['skipped'])
+    )
+    conn.commit()
+    cursor.close()
+
+def create_staging_table(cursor):
+    """
+    Temporary table with the import columns of workstation_master_log,
+    dropped when the transaction commits
+    """
+    cursor.execute(f"""
+        CREATE TEMP TABLE {STAGING_TABLE} ON COMMIT DROP AS
+        SELECT {', '.join(COLUMNS)} FROM workstation_master_log WITH NO DATA
+    """)
+
+def copy_to_staging(cursor, mapped):
+    """
+    COPY the mapped rows (a DataFrame with COLUMNS, NA for NULL) into the
+    staging table, written column by column into one CSV buffer
+    Returns how many rows were staged
+    """
+    buffer = io.StringIO()
+    mapped.to_csv(buffer, columns=COLUMNS, header=False, index=False, na_rep=COPY_NULL)
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buffer
+    )
+    return len(mapped)
+
+def insert_new_rows(cursor):
+    """
+    Move staged rows into workstation_master_log, skipping any already there
+    (or earlier in the file)
+    Returns how many rows were inserted
+    """
+    # Rows seen before are found by fingerprint; ON CONFLICT covers rows whose
+    # unique key is taken with other values. A key with a NULL in it (a visit
+    # with no end time yet) never conflicts, so those are matched null-safely
+    null_safe_match = ' AND '.join(
+        f"existing.{column} IS NOT DISTINCT FROM staged.{column}" for column in UNIQUE_KEY[1:]
+    )
+    complete_key = ' AND '.join(f"staged.{column} IS NOT NULL" for column in UNIQUE_KEY[1:])
+    cursor.execute(f"ANALYZE {STAGING_TABLE}")
+    cursor.execute(f"""
+        WITH staged AS (
+            SELECT *, {fingerprint_sql(STAGING_TABLE)} AS {FINGERPRINT_COLUMN} FROM {STAGING_TABLE}
+        )
+        INSERT INTO workstation_master_log ({', '.join(COLUMNS)}, {FINGERPRINT_COLUMN})
+        SELECT DISTINCT ON ({', '.join(UNIQUE_KEY)}) {', '.join(COLUMNS)}, {FINGERPRINT_COLUMN}
+        FROM staged
+        WHERE NOT EXISTS (
+            SELECT 1 FROM workstation_master_log existing
+            WHERE existing.{FINGERPRINT_COLUMN} = staged.{FINGERPRINT_COLUMN}
+        )
+        AND ({complete_key} OR NOT EXISTS (
+            SELECT 1 FROM workstation_master_log existing
+            WHERE existing.sn = staged.sn AND {null_safe_match}
+        ))
+        ON CONFLICT ({', '.join(UNIQUE_KEY)}) DO NOTHING
+    """)
+    return cursor.rowcount
+
+def read_chunks(file_path, chunk_rows, skip_rows=0):
+    """
+    Yield DataFrames of up to chunk_rows data rows with cleaned column
+    names, after skipping the first skip_rows data rows
+    """
+    if file_path.lower().endswith('.csv'):
+        # Everything as text, so a column is typed the same way in every chunk
+        chunks = pd.read_csv(file_path, dtype=str, chunksize=chunk_rows, encoding='utf-8-sig')
+        for df in chunks:
+            # Skip parsed rows, not lines: blank lines and quoted line breaks
+            # are not rows, and rows_done never counted them
+            if skip_rows:
+                skipped = min(skip_rows, len(df))
+                skip_rows -= skipped
+                df = df.iloc[skipped:]
+                if df.empty:
+                    continue
+            df.columns = [clean_column_name(col) for col in df.columns]
+            yield df
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [clean_column_name(str(col)) for col in header]
+        # Cells keep the type openpyxl read them as; letting pandas infer
+        # would turn ints into floats in any chunk that has a blank cell
+        chunk = []
+        # Formatted but empty rows are not data
+        data_rows = (row for row in rows if any(value is not None for value in row))
+        for i, row in enumerate(data_rows):
+            if i < skip_rows:
+                continue
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=header, dtype=object)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, dtype=object)
+    finally:
+        workbook.close()
+
+def progress_path(file_path):
+    return file_path + '.progress'
+
+def load_progress(file_path, file_hash):
+    """
+    Rows already committed from this file by an earlier, interrupted run
+    (only if the file's content is the same)
+    """
+    try:
+        with open(progress_path(file_path), 'r') as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if progress.get('sha256') != file_hash:
+        return None
+    return progress
+
+def save_progress(file_path, progress):
+    temp_path = progress_path(file_path) + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(temp_path, progress_path(file_path))
+
+def import_chunk(conn, df):
+    """
+    Clean, stage and insert one chunk in its own transaction
+    Returns (duplicate rows dropped within the chunk, rows staged, rows inserted)
+    """
+    df['data_source'] = 'workstation'
+    
+    # Clean duplicates while ignoring 'day', 'tat', and 'outbound_version' columns
+    # These are metadata columns that shouldn't be used for duplicate detection
+    dedup_cols = [c for c in df.columns if c not in ['day', 'tat', 'outbound_version']]
+    original_count = len(df)
+    df = df.drop_duplicates(subset=dedup_cols)
+    mapped = map_rows(df)
+    
+    cursor = conn.cursor()
+    try:
+        # Stage the chunk with COPY, then let the unique key drop rows that are
+        # already in the table, all in one statement
+        create_staging_table(cursor)
+        staged_count = copy_to_staging(cursor, mapped)
+        inserted_count = insert_new_rows(cursor)
+        conn.commit()
+    finally:
+        cursor.close()
+    return original_count - len(df), staged_count, inserted_count
+
+def import_file(file_path, chunk_rows=IMPORT_CHUNK_ROWS, log=print):
+    """
+    Import one export, resuming after any chunks an earlier run committed
+    Returns {'rows', 'duplicates', 'inserted', 'skipped', 'already_imported'};
+    already_imported is (file name, time) when the same content was imported
+    before, in which case nothing is read. Raises if the import fails (chunks
+    committed so far stay, and a rerun resumes)
+    """
+    file_hash = file_sha256(file_path)
+    progress = load_progress(file_path, file_hash) or {
+        'sha256': file_hash, 'rows_done': 0, 'duplicates': 0, 'inserted': 0, 'skipped': 0
+    }
+    
+    with get_connection() as conn:
+        check_schema(conn)
+        already_imported = find_imported_file(conn, file_hash)
+        if already_imported:
+            return {'rows': 0, 'duplicates': 0, 'inserted': 0, 'skipped': 0, 'already_imported': already_imported}
+        
+        if progress['rows_done']:
+            log(f"Resuming after {progress['rows_done']:,} rows committed by an earlier run")
+        for df in read_chunks(file_path, chunk_rows, progress['rows_done']):
+            chunk_start = progress['rows_done']
+            duplicates, staged_count, inserted_count = import_chunk(conn, df)
+            
+            progress['rows_done'] += len(df)
+            progress['duplicates'] += duplicates
+            progress['inserted'] += inserted_count
+            progress['skipped'] += staged_count - inserted_count
+            save_progress(file_path, progress)
+            log(f"Rows {chunk_start + 1:,}-{progress['rows_done']:,}: inserted {inserted_count:,}, "
+                f"skipped {staged_count - inserted_count:,} already in workstation_master_log")
+        
+        record_imported_file(conn, file_hash, file_path, progress)
+    
+    if os.path.exists(progress_path(file_path)):
+        os.remove(progress_path(file_path))
+    return {
+        'rows': progress['rows_done'],
+        'duplicates': progress['duplicates'],
+        'inserted': progress['inserted'],
+        'skipped': progress['skipped'],
+        'already_imported': None
+    }
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python import_workstation_file.py /path/to/file.xlsx")
+    args = sys.argv[1:]
+    if args == ['--init-schema']:
+        with get_connection() as conn:
+            init_schema(conn)
+        print(f"✓ imported_files, {FINGERPRINT_COLUMN} and {FINGERPRINT_INDEX} are in place")
+        return
+    if args == ['--backfill-fingerprints']:
+        with get_connection() as conn:
+            check_schema(conn)
+            print(f"✓ Fingerprinted {backfill_fingerprints(conn):,} existing rows")
+        return
+    
+    chunk_rows = IMPORT_CHUNK_ROWS
+    if '--chunk-rows' in args:
+        i = args.index('--chunk-rows')
+        chunk_rows = int(args[i + 1])
+        del args[i:i + 2]
+    if len(args) != 1:
+        print("Usage: python import_workstation_file_fixed.py /path/to/file.xlsx [--chunk-rows N]")
+        print("       python import_workstation_file_fixed.py --init-schema")
+        print("       python import_workstation_file_fixed.py --backfill-fingerprints")
         sys.exit(1)
-    file_path = sys.argv[1]
+    file_path = args[0]
     if not os.path.isfile(file_path):
         print(f"File not found: {file_path}")
         sys.exit(1)
     print(f"Importing {file_path} into workstation_master_log...")
-    conn = connect_to_db()
+    
     try:
-        df = pd.read_excel(file_path)
-        df.columns = [clean_column_name(col) for col in df.columns]
-        df['data_source'] = 'workstation'
-        
-        # Clean duplicates while ignoring 'day', 'tat', and 'outbound_version' columns
-        # These are metadata columns that shouldn't be used for duplicate detection
-        dedup_cols = [c for c in df.columns if c not in ['day', 'tat', 'outbound_version']]
-        original_count = len(df)
-        df = df.drop_duplicates(subset=dedup_cols)
-        cleaned_count = len(df)
-        
-        if original_count != cleaned_count:
-            print(f"Cleaned {original_count - cleaned_count:,} duplicate rows (ignoring 'day' and 'tat' columns)")
-            print(f"Original rows: {original_count:,}, Cleaned rows: {cleaned_count:,}")
-        mapped_data = []
-        for _, row in df.iterrows():
-            mapped_row = {
-                'sn': str(row.get('sn', '')),
-                'pn': str(row.get('pn', '')),
-                'customer_pn': str(row.get('customer_pn', '')).strip() or None,
-                'workstation_name': str(row.get('workstation_name', '')),
-                'history_station_start_time': pd.to_datetime(row.get('history_station_end_time')).to_pydatetime() if pd.isna(row.get('history_station_start_time')) else pd.to_datetime(row.get('history_station_start_time')).to_pydatetime() if pd.notna(row.get('history_station_start_time')) else None,
-                'history_station_end_time': pd.to_datetime(row.get('history_station_end_time')).to_pydatetime() if pd.notna(row.get('history_station_end_time')) else None,
-                'hours': str(row.get('hours', '')),
-                'service_flow': str(row.get('service_flow', '')),
-                'model': str(row.get('model', '')),
-                'history_station_passing_status': str(row.get('history_station_passing_status', '')),
-                'passing_station_method': str(row.get('passing_station_method', '')),
-                'operator': str(row.get('operator', '')),
-                'first_station_start_time': pd.to_datetime(row.get('first_station_start_time')).to_pydatetime() if pd.notna(row.get('first_station_start_time')) else None,
-                'data_source': 'workstation'
-            }
-            mapped_data.append(mapped_row)
-        cursor = conn.cursor()
-        
-        print(f"Checking for existing records to prevent duplicates...")
-        existing_count = 0
-        new_records = []
-        
-        for row in mapped_data:
-            check_query = """
-            SELECT COUNT(*) FROM workstation_master_log 
-            WHERE sn = %s 
-            AND pn = %s 
-            AND customer_pn = %s 
-            AND workstation_name = %s 
-            AND history_station_start_time = %s 
-            AND history_station_end_time = %s 
-            AND hours = %s 
-            AND service_flow = %s 
-            AND model = %s 
-            AND history_station_passing_status = %s 
-            AND passing_station_method = %s 
-            AND operator = %s 
-            AND first_station_start_time = %s 
-            AND data_source = %s
-            """
-            
-            check_values = (
-                row['sn'], row['pn'], row['customer_pn'], 
-                row['workstation_name'], row['history_station_start_time'], row['history_station_end_time'], 
-                row['hours'], row['service_flow'], row['model'], row['history_station_passing_status'], 
-                row['passing_station_method'], row['operator'], row['first_station_start_time'], row['data_source']
-            )
-            
-            cursor.execute(check_query, check_values)
-            exists = cursor.fetchone()[0]
-            
-            if exists > 0:
-                existing_count += 1
-            else:
-                new_records.append(row)
-        
-        print(f"Found {existing_count:,} existing records, {len(new_records):,} new records to insert")
-        
-        if new_records:
-            # Add detailed logging before insert
-            print(f"About to insert {len(new_records)} records...")
-            for i, row in enumerate(new_records[:3]):  # Show first 3 records
-                print(f"Record {i+1}:")
-                for key, value in row.items():
-                    print(f"  {key}: {value} (type: {type(value)})")
-                print()
-            
-            insert_query = """
-            INSERT INTO workstation_master_log (
-                sn, pn, model, workstation_name,
-                history_station_start_time, history_station_end_time, history_station_passing_status, operator, customer_pn,
-                hours, service_flow, passing_station_method, first_station_start_time, data_source
-            ) VALUES %s
-            """
-            from psycopg2.extras import execute_values
-            values = [(
-                row['sn'], row['pn'], row['model'], row['workstation_name'],
-                row['history_station_start_time'], row['history_station_end_time'], row['history_station_passing_status'], row['operator'], row['customer_pn'],
-                row['hours'], row['service_flow'], row['passing_station_method'], row['first_station_start_time'], row['data_source']
-            ) for row in new_records]
-            
-            # Log the values tuple for first record
-            if values:
-                print(f"First record values tuple: {values[0]}")
-                print(f"Values tuple length: {len(values[0])}")
-                for i, val in enumerate(values[0]):
-                    print(f"  [{i}] {val} (type: {type(val)})")
-                print()
-            
-            execute_values(cursor, insert_query, values)
-            conn.commit()
-            print(f"Imported {len(new_records):,} new records from {os.path.basename(file_path)}")
-        else:
-            print(f"No new records to import (all {existing_count:,} records already exist)")
-        
-        cursor.close()
-        
-        try:
-            os.remove(file_path)
-            print(f"Deleted XLSX file: {os.path.basename(file_path)}")
-        except Exception as e:
-            print(f"Could not delete XLSX file: {e}")
-            
+        stats = import_file(file_path, chunk_rows)
     except Exception as e:
+        # Keep the file: committed chunks are recorded, so a rerun resumes
         print(f"Error importing {os.path.basename(file_path)}: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        print(f"Kept {os.path.basename(file_path)}; run again to resume")
+        sys.exit(1)
+    
+    if stats['already_imported']:
+        file_name, imported_at = stats['already_imported']
+        print(f"Skipped {os.path.basename(file_path)}: the same file was imported as {file_name} on {imported_at:%Y-%m-%d %H:%M}")
+    
+    if stats['duplicates']:
+        print(f"Cleaned {stats['duplicates']:,} duplicate rows (ignoring 'day' and 'tat' columns)")
+    print(f"Imported {stats['inserted']:,} new records from {os.path.basename(file_path)}, "
+          f"skipped {stats['skipped']:,} already in workstation_master_log")
+    
+    try:
+        os.remove(file_path)
+        print(f"Deleted {os.path.basename(file_path)}")
+    except Exception as e:
+        print(f"Could not delete {os.path.basename(file_path)}: {e}")
 
 if __name__ == "__main__":
     main()
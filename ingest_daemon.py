@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Ingest daemon: imports workstation exports dropped into a folder
+
+Watches INGEST_DROP_DIR for .xlsx / .csv exports and imports up to
+INGEST_WORKERS of them at once, each in its own process through
+import_workstation_file_fixed.import_file(). A file is picked up once its size
+and modification time have stopped changing between two checks, so exports
+still being copied in are left alone.
+
+A file is moved to INGEST_DONE_DIR only after its import has committed. If
+the import fails, the file goes to INGEST_FAILED_DIR with a
+<file>.error.txt next to it, plus its .progress file if some chunks were
+committed; dropping both back in resumes the import.
+
+If a worker process dies (e.g. out of memory), every import on the pool
+fails with BrokenProcessPool, not only the one that killed it. Those files
+stay in the drop folder and are retried one at a time, so only the file that
+keeps killing its worker ends up in INGEST_FAILED_DIR, after
+INGEST_MAX_RETRIES retries. The pool is replaced once per check.
+
+Queue depth and throughput are written to INGEST_STATUS_FILE after every
+check.
+
+Usage: python ingest_daemon.py [--workers N] [--once]
+       python ingest_daemon.py status
+--once imports whatever is in the drop folder now, then exits.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from config import (
+    INGEST_DROP_DIR, INGEST_DONE_DIR, INGEST_FAILED_DIR, INGEST_STATUS_FILE,
+    INGEST_WORKERS, INGEST_POLL_SECONDS, INGEST_MAX_RETRIES
+)
+from db import get_connection, close_pool
+from import_workstation_file_fixed import import_file, progress_path, check_schema
+
+IMPORT_EXTENSIONS = ('.xlsx', '.csv')
+
+# Throughput in the status file covers imports finished in this window
+THROUGHPUT_WINDOW_SECONDS = 15 * 60
+
+
+def list_drops(drop_dir):
+    """Exports waiting in the drop folder, oldest first"""
+    paths = []
+    for name in os.listdir(drop_dir):
+        path = os.path.join(drop_dir, name)
+        # Skip hidden files and the lock files Excel leaves next to open workbooks
+        if name.startswith(('.', '~$')) or not name.lower().endswith(IMPORT_EXTENSIONS):
+            continue
+        if os.path.isfile(path):
+            paths.append(path)
+    return sorted(paths, key=os.path.getmtime)
+
+
+def stop_on_sigterm(signum, frame):
+    # Stop the same way as Ctrl+C when a service manager asks
+    raise KeyboardInterrupt
+
+
+def ignore_interrupts():
+    # Workers finish their file on Ctrl+C; the daemon waits for them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def ingest_file(path):
+    """
+    Worker process: import one file
+    Returns its import stats plus 'seconds'; raises if the import failed
+    """
+    name = os.path.basename(path)
+    started = time.perf_counter()
+    stats = import_file(path, log=lambda message: print(f"[{name}] {message}", flush=True))
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def move_to(path, folder):
+    """Move a file into folder, prefixing a timestamp if the name is taken"""
+    target = os.path.join(folder, os.path.basename(path))
+    if os.path.exists(target):
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        target = os.path.join(folder, f"{stamp}_{os.path.basename(path)}")
+    shutil.move(path, target)
+    return target
+
+
+class IngestDaemon:
+    def __init__(self, drop_dir=INGEST_DROP_DIR, done_dir=INGEST_DONE_DIR, failed_dir=INGEST_FAILED_DIR,
+                 status_file=INGEST_STATUS_FILE, workers=INGEST_WORKERS, max_retries=INGEST_MAX_RETRIES):
+        self.drop_dir = drop_dir
+        self.done_dir = done_dir
+        self.failed_dir = failed_dir
+        self.status_file = status_file
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.executor = self._new_executor()
+        self.pool_broken = False
+        self.running = {}     # future -> path
+        self.retries = {}     # path -> times a worker died while it was importing
+        self.seen = {}        # path -> (size, mtime) at the previous check
+        self.queued = 0
+        self.started_at = datetime.now()
+        self.done = 0
+        self.failed = 0
+        self.rows = 0
+        self.inserted = 0
+        self.finished = deque()  # (time finished, rows) for the throughput window
+
+    def _new_executor(self):
+        # Forked workers must open their own connections, not share the
+        # parent's pooled ones (and their server sockets)
+        close_pool()
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts)
+
+    def _replace_executor(self):
+        """Swap a broken pool for a new one"""
+        broken = self.executor
+        self.executor = self._new_executor()
+        self.pool_broken = False
+        broken.shutdown(wait=True)
+
+    def _finish(self, future, path):
+        """Move a finished file to done or failed and count it"""
+        name = os.path.basename(path)
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            # A worker died (e.g. out of memory) and took every import on the
+            # pool with it; only the file that killed it should fail for good
+            self.pool_broken = True
+            retries = self.retries.get(path, 0)
+            if retries < self.max_retries:
+                self.retries[path] = retries + 1
+                print(f"↻ {name}: worker process died, will retry on its own "
+                      f"({retries + 1}/{self.max_retries})")
+                return
+        self.retries.pop(path, None)
+        if error is None:
+            stats = future.result()
+            move_to(path, self.done_dir)
+            self.done += 1
+            self.rows += stats['rows']
+            self.inserted += stats['inserted']
+            self.finished.append((time.time(), stats['rows']))
+            if stats['already_imported']:
+                file_name, imported_at = stats['already_imported']
+                print(f"✓ {name}: already imported as {file_name} on {imported_at:%Y-%m-%d %H:%M}, skipped")
+                return
+            print(f"✓ {name}: {stats['inserted']:,} inserted, {stats['skipped']:,} skipped "
+                  f"({stats['rows']:,} rows in {stats['seconds']:.1f}s)")
+            return
+
+        target = move_to(path, self.failed_dir)
+        if os.path.exists(progress_path(path)):
+            shutil.move(progress_path(path), progress_path(target))
+        with open(target + '.error.txt', 'w') as f:
+            f.write(''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+        self.failed += 1
+        print(f"✗ {name}: {error} (moved to {self.failed_dir})")
+
+    def check(self, wait_for_copy=True):
+        """
+        Collect finished imports, start new ones and write the status file
+        Returns how many files are queued or running
+        """
+        for future, path in list(self.running.items()):
+            if future.done():
+                del self.running[future]
+                self._finish(future, path)
+        if self.pool_broken:
+            self._replace_executor()
+
+        busy = set(self.running.values())
+        waiting = {}
+        for path in list_drops(self.drop_dir):
+            if path in busy:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            waiting[path] = (stat.st_size, stat.st_mtime)
+
+        for path, signature in list(waiting.items()):
+            if len(self.running) >= self.workers:
+                break
+            if any(running in self.retries for running in self.running.values()):
+                # A retry runs alone, so a crash can only be its own
+                break
+            if path in self.retries and self.running:
+                # Let the running imports drain, then retry this one alone
+                break
+            if wait_for_copy and self.seen.get(path) != signature:
+                # New or still growing: look again at the next check
+                continue
+            try:
+                future = self.executor.submit(ingest_file, path)
+            except BrokenProcessPool:
+                # Broke since the collection above: new pool at the next check
+                self.pool_broken = True
+                break
+            print(f"Importing {os.path.basename(path)}...")
+            self.running[future] = path
+            del waiting[path]
+
+        self.seen = waiting
+        self.queued = len(waiting)
+        self.write_status()
+        return self.queued + len(self.running)
+
+    def status(self):
+        now = time.time()
+        while self.finished and self.finished[0][0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self.finished.popleft()
+        window = min(THROUGHPUT_WINDOW_SECONDS, max(1.0, now - self.started_at.timestamp()))
+        return {
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'queue_depth': self.queued + len(self.running),
+            'queued': self.queued,
+            'running': sorted(os.path.basename(path) for path in self.running.values()),
+            'done': self.done,
+            'failed': self.failed,
+            'rows_imported': self.rows,
+            'rows_inserted': self.inserted,
+            'files_per_minute': round(len(self.finished) * 60 / window, 2),
+            'rows_per_second': round(sum(rows for _, rows in self.finished) / window, 1)
+        }
+
+    def write_status(self):
+        temp_path = self.status_file + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.status(), f, indent=2)
+        os.replace(temp_path, self.status_file)
+
+    def run(self, once=False, poll_seconds=INGEST_POLL_SECONDS):
+        """Check the drop folder until interrupted (or, with once, until it is empty)"""
+        while True:
+            pending = self.check(wait_for_copy=not once)
+            if once and not pending:
+                return
+            time.sleep(1 if once else poll_seconds)
+
+    def stop(self):
+        """Let running imports finish and file them; queued files stay in the drop folder"""
+        self.executor.shutdown(wait=True)
+        for future, path in list(self.running.items()):
+            del self.running[future]
+            self._finish(future, path)
+        self.queued = 0
+        self.write_status()
+
+
+def print_status(status_file=INGEST_STATUS_FILE):
+    try:
+        with open(status_file, 'r') as f:
+            status = json.load(f)
+    except FileNotFoundError:
+        print(f"No status yet ({status_file} not found - is the daemon running?)")
+        return
+    print(f"Updated {status['updated_at']} (running since {status['started_at']})")
+    print(f"Queue depth: {status['queue_depth']} ({status['queued']} waiting, {len(status['running'])} importing)")
+    for name in status['running']:
+        print(f"  - {name}")
+    print(f"Done: {status['done']}, failed: {status['failed']}, "
+          f"rows: {status['rows_imported']:,} ({status['rows_inserted']:,} inserted)")
+    print(f"Last {THROUGHPUT_WINDOW_SECONDS // 60} min: {status['files_per_minute']} files/min, "
+          f"{status['rows_per_second']:,} rows/s")
+
+
+def main():
+    args = sys.argv[1:]
+    if args and args[0] == 'status':
+        print_status()
+        return
+
+    workers = INGEST_WORKERS
+    if '--workers' in args:
+        i = args.index('--workers')
+        workers = int(args[i + 1])
+        del args[i:i + 2]
+    once = '--once' in args
+
+    for folder in (INGEST_DROP_DIR, INGEST_DONE_DIR, INGEST_FAILED_DIR, os.path.dirname(INGEST_STATUS_FILE)):
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    # Fail once here rather than once per file if the migration is missing
+    try:
+        with get_connection() as conn:
+            check_schema(conn)
+    except RuntimeError as e:
+        print(f"✗ {e}")
+        sys.exit(1)
+
+    daemon = IngestDaemon(workers=workers)
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+    print(f"✓ Watching {INGEST_DROP_DIR} with {daemon.workers} workers (Ctrl+C to stop)")
+    try:
+        daemon.run(once)
+    except KeyboardInterrupt:
+        print("\nStopping: waiting for running imports to finish...")
+    finally:
+        daemon.stop()
+    print(f"✓ Imported {daemon.done} files, {daemon.failed} failed")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+In-memory interval index: which units were at station X at time T?
+
+Built once from workstation_master_log, then answers in milliseconds instead
+of scanning the table:
+- which units were at a station at a moment, or during a time range
+- which units were waiting for a station (finished their previous station,
+  not started this one yet) at a moment, optionally only those coming from
+  a given station
+
+Each station has a centered interval tree over its visits (and one over its
+waiting intervals): a point or range query costs O(log n + k) for k answers.
+
+refresh() picks up rows imported since the last build (id > last seen id).
+The serial numbers they touch are reloaded into a small delta buffer that is
+checked next to the trees; once the buffer grows past REBUILD_THRESHOLD
+intervals the trees are rebuilt with it.
+
+Usage: python interval_index.py
+       then type queries, e.g.
+         FCT 2025-03-10T08:30
+         FCT 2025-03-10T08:00 2025-03-10T09:00
+         waiting FCT 2025-03-10T08:30
+         waiting FCT 2025-03-10T08:30 FLA
+         refresh
+"""
+from datetime import datetime
+from itertools import groupby
+import time
+
+from db import get_connection
+from station_history import load_station_history
+
+# Delta intervals allowed before the trees are rebuilt
+REBUILD_THRESHOLD = 50000
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 10000
+
+ALL_VISITS_QUERY = """
+    SELECT sn, workstation_name, history_station_start_time, history_station_end_time, id
+    FROM workstation_master_log
+    ORDER BY sn, history_station_start_time, id
+"""
+
+NEW_SERIALS_QUERY = """
+    SELECT DISTINCT sn, MAX(id) OVER ()
+    FROM workstation_master_log
+    WHERE id > %s
+"""
+
+
+class _Node:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over half-open [start, end) intervals
+
+    Intervals are tuples whose first two items are start and end; anything
+    after that is carried along and returned as-is.
+    """
+    __slots__ = ('intervals', '_root')
+
+    def __init__(self, intervals):
+        self.intervals = list(intervals)
+        self._root = self._build(self.intervals)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    @classmethod
+    def _build(cls, intervals):
+        if not intervals:
+            return None
+
+        # Median start: that interval always stays at this node, so every
+        # level makes progress
+        starts = sorted(interval[0] for interval in intervals)
+        center = starts[len(starts) // 2]
+
+        here, left, right = [], [], []
+        for interval in intervals:
+            if interval[1] <= center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+
+        node = _Node()
+        node.center = center
+        node.by_start = sorted(here, key=lambda interval: interval[0])
+        node.by_end = sorted(here, key=lambda interval: interval[1], reverse=True)
+        node.left = cls._build(left)
+        node.right = cls._build(right)
+        return node
+
+    def stab(self, point):
+        """Intervals with start <= point < end"""
+        found = []
+        node = self._root
+        while node:
+            if point < node.center:
+                # Everything here ends after the center, so after point too
+                for interval in node.by_start:
+                    if interval[0] > point:
+                        break
+                    found.append(interval)
+                node = node.left
+            else:
+                # Everything here starts at or before the center
+                for interval in node.by_end:
+                    if interval[1] <= point:
+                        break
+                    found.append(interval)
+                node = node.right
+        return found
+
+    def overlap(self, range_start, range_end):
+        """Intervals with start < range_end and end > range_start"""
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if range_end <= node.center:
+                for interval in node.by_start:
+                    if interval[0] >= range_end:
+                        break
+                    found.append(interval)
+                stack.append(node.left)
+            elif range_start > node.center:
+                for interval in node.by_end:
+                    if interval[1] <= range_start:
+                        break
+                    found.append(interval)
+                stack.append(node.right)
+            else:
+                # The range covers the center: every interval here overlaps
+                found.extend(node.by_start)
+                stack.append(node.left)
+                stack.append(node.right)
+        return found
+
+
+def _unit_intervals(sn, rows):
+    """
+    Turn one serial number's ordered (station, start, end) rows into
+    (kind, station, interval) entries
+
+    'busy' intervals are (start, end, sn) at the station itself; 'waiting'
+    intervals are (previous end, start, sn, previous station) for the station
+    the unit was heading to.
+    """
+    previous = None
+    for station, start, end in rows:
+        if station and start and end and end > start:
+            yield 'busy', station, (start, end, sn)
+        if previous and station and start:
+            previous_station, previous_end = previous
+            if previous_end and start > previous_end:
+                yield 'waiting', station, (previous_end, start, sn, previous_station)
+        previous = (station, end)
+
+
+class StationIntervalIndex:
+    """
+    Interval trees for every station, plus a delta buffer for fresh imports
+    """
+
+    def __init__(self, rebuild_threshold=REBUILD_THRESHOLD):
+        self.rebuild_threshold = rebuild_threshold
+        self.last_id = 0
+        self._trees = {}    # (kind, station) -> IntervalTree
+        self._stale = set()  # serial numbers whose tree intervals are outdated
+        self._delta = {}    # (kind, station) -> [interval, ...] for those serial numbers
+
+    def build(self):
+        """Load every visit and build the trees from scratch"""
+        intervals = {}
+        last_id = 0
+        with get_connection() as conn:
+            # A named cursor keeps the result set on the server
+            cur = conn.cursor(name='interval_index_visits')
+            cur.itersize = FETCH_SIZE
+            cur.execute(ALL_VISITS_QUERY)
+            for sn, rows in groupby(cur, key=lambda row: row[0]):
+                visits = []
+                for _, station, start, end, row_id in rows:
+                    visits.append((station, start, end))
+                    last_id = max(last_id, row_id)
+                for kind, station, interval in _unit_intervals(sn, visits):
+                    intervals.setdefault((kind, station), []).append(interval)
+            cur.close()
+
+        self._trees = {key: IntervalTree(values) for key, values in intervals.items()}
+        self._stale = set()
+        self._delta = {}
+        self.last_id = last_id
+
+    def refresh(self):
+        """
+        Pick up rows imported since the last build or refresh
+        Returns how many serial numbers were reloaded
+        """
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(NEW_SERIALS_QUERY, (self.last_id,))
+            rows = cur.fetchall()
+            cur.close()
+        if not rows:
+            return 0
+
+        serial_numbers = [sn for sn, _ in rows]
+        history = load_station_history(serial_numbers)
+
+        # Replace whatever the delta already had for these serial numbers
+        touched = set(serial_numbers)
+        for key in self._delta:
+            self._delta[key] = [interval for interval in self._delta[key] if interval[2] not in touched]
+        for sn in serial_numbers:
+            for kind, station, interval in _unit_intervals(sn, history.get(sn, [])):
+                self._delta.setdefault((kind, station), []).append(interval)
+        self._stale.update(touched)
+        self.last_id = rows[0][1]
+
+        if sum(len(values) for values in self._delta.values()) > self.rebuild_threshold:
+            self._rebuild()
+        return len(serial_numbers)
+
+    def _rebuild(self):
+        """Fold the delta buffer into freshly built trees"""
+        intervals = {}
+        for key, tree in self._trees.items():
+            intervals[key] = [interval for interval in tree.intervals if interval[2] not in self._stale]
+        for key, values in self._delta.items():
+            intervals.setdefault(key, []).extend(values)
+        self._trees = {key: IntervalTree(values) for key, values in intervals.items() if values}
+        self._stale = set()
+        self._delta = {}
+
+    def _query(self, key, range_start, range_end=None):
+        tree = self._trees.get(key)
+        found = []
+        if tree:
+            if range_end is None:
+                found = tree.stab(range_start)
+            else:
+                found = tree.overlap(range_start, range_end)
+            if self._stale:
+                found = [interval for interval in found if interval[2] not in self._stale]
+
+        for interval in self._delta.get(key, []):
+            if range_end is None:
+                if interval[0] <= range_start < interval[1]:
+                    found.append(interval)
+            elif interval[0] < range_end and interval[1] > range_start:
+                found.append(interval)
+        return sorted(found)
+
+    @property
+    def stations(self):
+        return sorted({station for _, station in self._trees} | {station for _, station in self._delta})
+
+    def at_station(self, station, range_start, range_end=None):
+        """
+        Units at a station at a moment (or during [range_start, range_end))
+        Returns [(start, end, sn), ...] ordered by start
+        """
+        return self._query(('busy', station), range_start, range_end)
+
+    def waiting_for(self, station, range_start, range_end=None, from_station=None):
+        """
+        Units waiting for a station at a moment (or during a range)
+        Returns [(previous end, start, sn, previous station), ...] ordered by
+        previous end, optionally only those coming from from_station
+        """
+        found = self._query(('waiting', station), range_start, range_end)
+        if from_station:
+            found = [interval for interval in found if interval[3] == from_station]
+        return found
+
+
+def main():
+    print("Building interval index from workstation_master_log...")
+    started = time.perf_counter()
+    index = StationIntervalIndex()
+    index.build()
+    print(f"✓ Indexed {len(index.stations)} stations in {time.perf_counter() - started:.1f}s")
+    print("Queries: STATION TIME [END_TIME] | waiting STATION TIME [FROM_STATION] | refresh | quit")
+
+    while True:
+        try:
+            parts = input("\n> ").split()
+        except EOFError:
+            break
+        if not parts:
+            continue
+        if parts[0] in ('quit', 'exit'):
+            break
+
+        started = time.perf_counter()
+        try:
+            if parts[0] == 'refresh':
+                print(f"✓ Reloaded {index.refresh()} serial numbers")
+                continue
+
+            if parts[0] == 'waiting':
+                station, moment = parts[1], datetime.fromisoformat(parts[2])
+                from_station = parts[3] if len(parts) > 3 else None
+                found = index.waiting_for(station, moment, from_station=from_station)
+                for previous_end, start, sn, previous_station in found:
+                    print(f"  {sn:20} left {previous_station} at {previous_end}, started {station} at {start}")
+            else:
+                station, moment = parts[0], datetime.fromisoformat(parts[1])
+                moment_end = datetime.fromisoformat(parts[2]) if len(parts) > 2 else None
+                found = index.at_station(station, moment, moment_end)
+                for start, end, sn in found:
+                    print(f"  {sn:20} {start}  ->  {end}")
+        except (IndexError, ValueError) as e:
+            print(f"✗ Could not read query: {e}")
+            continue
+
+        print(f"{len(found)} units ({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,597 @@
+"""
+Shared client for the SQL portal /serial-history endpoint
+
+Used by the web exporters (QUE_raw_timestamps.py, all_stations_time.py).
+Batches of serial numbers are sent over one pooled HTTP session, with up to
+max_in_flight requests running at once; results come back in input order.
+
+Unless a fixed batch size is given, AdaptiveBatchSizer picks the size of each
+batch from what the endpoint did with the previous ones: it keeps growing
+while serials per second improve, backs off to the best size once they stop
+improving, and halves on timeouts and 5xx responses. Its cap only drops after
+repeated timeouts / 5xx at the same sizes, so occasional errors do not pin
+it small for the rest of the run.
+
+Failed requests are retried with exponential backoff and full jitter. A batch
+that still fails is split in half, and the halves are fetched (and split)
+again, so one bad serial number or an oversized response only costs that
+slice. Serial numbers that fail on their own go to the dead-letter list
+(save_dead_letters()) instead of silently dropping out of the export.
+
+Responses are kept per serial number in an on-disk HistoryCache
+(history_cache.py); only serial numbers without a fresh cache entry are sent
+to the API.
+
+Batch responses are reduced to the workstation records, grouped per serial
+number (api_response['history_by_sn']). With ijson installed and
+stream_json on, that happens while the body is still being read, so neither
+the raw body nor the testboard records are ever held in memory.
+
+A long date range is cut into shards of shard_days (date_shards()); each
+batch is requested once per shard, the shard requests run in parallel, and
+the visits are merged and deduplicated per serial number, so quarter-long
+pulls stay under the portal's size and time limits.
+"""
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import HTTPError as TransportError, NewConnectionError
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from config import (
+    API_BASE_URL, API_MAX_IN_FLIGHT, API_TIMEOUT_SECONDS, API_CONNECT_TIMEOUT_SECONDS,
+    API_BATCH_SIZE, API_BATCH_SIZE_MIN, API_BATCH_SIZE_MAX, API_MAX_RESPONSE_BYTES,
+    API_MAX_RETRIES, API_RETRY_BASE_SECONDS, API_RETRY_MAX_SECONDS, API_CACHE_PATH,
+    API_STREAM_JSON, API_SHARD_DAYS
+)
+from history_cache import HistoryCache
+
+# Multiply the batch size by this while throughput keeps improving
+GROWTH_FACTOR = 1.5
+
+# A bigger batch must beat the best smaller one by this much to count as better
+MIN_IMPROVEMENT = 0.05
+
+# Shrink when a request takes longer than this share of the timeout
+SLOW_RESPONSE_RATIO = 0.5
+
+# Only cap the batch size after this many timeouts / 5xx at or above a size
+# that has not come back fine since; fewer are treated as bad moments
+OVERLOAD_STRIKES = 3
+
+# Retries for each half of a split batch (the whole batch already used API_MAX_RETRIES);
+# single serial numbers get API_MAX_RETRIES again
+SPLIT_RETRIES = 1
+
+# HTTP statuses worth retrying besides 5xx
+RETRY_STATUSES = {408, 429}
+
+# The only history records the exporters use
+HISTORY_SOURCE = 'workstation'
+
+# Raised while reading a streamed body: connection dropped or JSON cut short
+STREAM_ERRORS = (TransportError, ijson.JSONError) if ijson else (TransportError,)
+
+
+def is_unreachable(error: requests.exceptions.RequestException) -> bool:
+    """
+    True if the portal could not be connected to at all (refused, unknown
+    host, connect timeout): splitting or resending the batch will not help
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def group_history(records) -> Dict[str, List[Dict]]:
+    """
+    {serial_number: [workstation records in API order]}
+    """
+    history_by_sn = {}
+    for record in records:
+        if record.get('source') == HISTORY_SOURCE:
+            history_by_sn.setdefault(record['sn'], []).append(record)
+    return history_by_sn
+
+
+def date_shards(start_date: str, end_date: str, shard_days: Optional[float]) -> List[Tuple[str, str]]:
+    """
+    Cut [start_date, end_date] into consecutive ranges of shard_days, written
+    like the input (dates stay dates). Neighbouring shards share their
+    boundary whether the portal treats endDate as inclusive or not, so the
+    merged visits must be deduplicated. Ranges that are short enough, or that
+    cannot be read as ISO dates, come back as a single shard.
+    """
+    if not (start_date and end_date and shard_days):
+        return [(start_date, end_date)]
+    try:
+        start = datetime.fromisoformat(start_date)
+        end = datetime.fromisoformat(end_date)
+    except ValueError:
+        return [(start_date, end_date)]
+
+    step = timedelta(days=shard_days)
+    if end - start <= step:
+        return [(start_date, end_date)]
+
+    date_only = len(start_date) == 10 and len(end_date) == 10
+    separator = 'T' if 'T' in start_date else ' '
+
+    def format_moment(moment):
+        return moment.date().isoformat() if date_only else moment.isoformat(sep=separator)
+
+    shards = []
+    shard_start = start
+    while shard_start < end:
+        shard_end = min(shard_start + step, end)
+        shards.append((format_moment(shard_start), format_moment(shard_end)))
+        shard_start = shard_end
+    shards[0] = (start_date, shards[0][1])
+    shards[-1] = (shards[-1][0], end_date)
+    return shards
+
+
+def merge_shard_results(results: List[Tuple[List[str], Dict]]) -> Tuple[List[str], Dict]:
+    """
+    Combine the (fetched, api_response) of one batch over every date shard
+
+    Only serial numbers fetched in every shard count as fetched. Their visits
+    are concatenated in shard order with repeats (visits returned by two
+    neighbouring shards) dropped.
+    """
+    if len(results) == 1:
+        return results[0]
+
+    fetched = results[0][0]
+    for shard_fetched, _ in results[1:]:
+        shard_fetched = set(shard_fetched)
+        fetched = [sn for sn in fetched if sn in shard_fetched]
+
+    history_by_sn = {}
+    for sn in fetched:
+        seen = set()
+        records = []
+        for _, api_response in results:
+            for record in api_response['history_by_sn'].get(sn, []):
+                key = json.dumps(record, sort_keys=True)
+                if key not in seen:
+                    seen.add(key)
+                    records.append(record)
+        history_by_sn[sn] = records
+    return fetched, {"success": True, "history_by_sn": history_by_sn}
+
+
+def stream_history(raw) -> Dict:
+    """
+    Parse a /serial-history body from a file-like object with ijson,
+    grouping workstation records as they arrive
+    Returns {'success': ..., 'error': ..., 'history_by_sn': {...}}
+    """
+    api_response = {'success': False, 'history_by_sn': {}}
+    history_by_sn = api_response['history_by_sn']
+    builder = None
+    for prefix, event, value in ijson.parse(raw, use_float=True):
+        if builder is None:
+            if prefix == 'history.item' and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+            elif prefix in ('success', 'error'):
+                api_response[prefix] = value
+                continue
+            else:
+                continue
+
+        builder.event(event, value)
+        if prefix == 'history.item' and event == 'end_map':
+            record = builder.value
+            builder = None
+            if record.get('source') == HISTORY_SOURCE:
+                history_by_sn.setdefault(record['sn'], []).append(record)
+    return api_response
+
+
+class AdaptiveBatchSizer:
+    """
+    Picks the next /serial-history batch size from observed responses
+
+    Throughput is tracked per batch size (serials per second, smoothed).
+    Thread-safe: record() is called from the request threads.
+    """
+
+    def __init__(self, initial: int = API_BATCH_SIZE, minimum: int = API_BATCH_SIZE_MIN,
+                 maximum: int = API_BATCH_SIZE_MAX, timeout: float = API_TIMEOUT_SECONDS,
+                 max_response_bytes: int = API_MAX_RESPONSE_BYTES):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.size = min(max(initial, self.minimum), self.maximum)
+        self.slow_seconds = timeout * SLOW_RESPONSE_RATIO
+        self.max_response_bytes = max_response_bytes
+        self.ceiling = self.maximum  # lowered when a size turns out slower or overloads the API
+        self.largest_ok = 0          # biggest size that has come back fine
+        self.overloaded_sizes = []   # untried-before sizes that overloaded, not come back fine since
+        self.throughput = {}         # batch size -> smoothed serials per second
+        self.batches = []            # (size, seconds, response bytes, ok) per finished request
+        self._lock = threading.Lock()
+
+    def next_size(self) -> int:
+        with self._lock:
+            return self.size
+
+    def record(self, size: int, seconds: float, response_bytes: int, ok: bool, overloaded: bool = False):
+        """
+        Feed back one finished request; overloaded means a timeout or 5xx
+        """
+        with self._lock:
+            self.batches.append((size, seconds, response_bytes, ok))
+            if self.minimum == self.maximum:
+                return
+
+            if overloaded:
+                # A size that has worked before just hit a bad moment. Sizes
+                # that have never worked are only too big once they keep
+                # failing: cap below the smallest size with OVERLOAD_STRIKES
+                # failures at or above it, so random 5xx do not pin the ceiling
+                if size > self.largest_ok:
+                    self.overloaded_sizes.append(size)
+                    if len(self.overloaded_sizes) >= OVERLOAD_STRIKES:
+                        too_big = sorted(self.overloaded_sizes, reverse=True)[OVERLOAD_STRIKES - 1]
+                        self.ceiling = max(self.minimum, min(self.ceiling, too_big - 1))
+                self.size = max(self.minimum, min(self.size, size // 2))
+                return
+            if not ok:
+                return
+            self.overloaded_sizes = [s for s in self.overloaded_sizes if s > size]
+
+            # Close to the timeout or a very large payload: this size is too big
+            if seconds > self.slow_seconds or response_bytes > self.max_response_bytes:
+                self.ceiling = max(self.minimum, min(self.ceiling, size - 1))
+                self.size = max(self.minimum, min(self.size, int(size * 0.75)))
+                return
+
+            self.largest_ok = max(self.largest_ok, size)
+            rate = size / max(seconds, 1e-6)
+            previous = self.throughput.get(size)
+            self.throughput[size] = rate if previous is None else (previous + rate) / 2
+
+            # Only the answer for the current size decides the next move;
+            # batches sent before the last change are still arriving
+            if size != self.size:
+                return
+
+            best_smaller = max((r for s, r in self.throughput.items() if s < size), default=None)
+            if best_smaller is None or self.throughput[size] >= best_smaller * (1 + MIN_IMPROVEMENT):
+                self.size = min(self.ceiling, max(size + 1, int(size * GROWTH_FACTOR)))
+            else:
+                # Back to a bigger size that already did better (after a
+                # timeout / 5xx halved the size); otherwise bigger stopped
+                # paying off: settle on the best size seen so far
+                best = max((s for s in self.throughput if s <= self.ceiling), key=self.throughput.get)
+                if best > size:
+                    self.size = best
+                    return
+                self.ceiling = max(self.minimum, size - 1)
+                self.size = max(
+                    (s for s in self.throughput if s <= self.ceiling),
+                    key=self.throughput.get,
+                    default=self.minimum
+                )
+
+    def summary(self, elapsed: float, serials: int) -> Dict:
+        """
+        Batch sizes used and overall throughput for a run that fetched
+        `serials` serial numbers in `elapsed` seconds
+        """
+        with self._lock:
+            batches = list(self.batches)
+            final_size = self.size
+        return {
+            'requests': len(batches),
+            'failed_requests': sum(1 for _, _, _, ok in batches if not ok),
+            'serials': serials,
+            'elapsed_seconds': round(elapsed, 2),
+            'serials_per_second': round(serials / elapsed, 1) if elapsed > 0 else None,
+            'response_bytes': sum(response_bytes for _, _, response_bytes, _ in batches),
+            'sizes_used': dict(sorted(Counter(size for size, _, _, _ in batches).items())),
+            'final_size': final_size
+        }
+
+
+class SerialHistoryClient:
+    def __init__(self, api_base_url: str = API_BASE_URL, max_in_flight: int = API_MAX_IN_FLIGHT,
+                 timeout: float = API_TIMEOUT_SECONDS, batch_size: Optional[int] = None,
+                 max_retries: int = API_MAX_RETRIES, cache_path: Optional[str] = API_CACHE_PATH,
+                 stream_json: bool = API_STREAM_JSON, shard_days: Optional[float] = API_SHARD_DAYS):
+        self.api_base_url = api_base_url
+        self.max_in_flight = max(1, max_in_flight)
+        self.timeout = timeout
+        self.batch_size = batch_size  # None = adaptive
+        self.max_retries = max(0, max_retries)
+        self.stream_json = stream_json and ijson is not None
+        self.shard_days = shard_days  # None = one request per batch for the whole range
+        self.batch_sizer = None
+        self.fetch_summary = None
+        self.retries = 0
+        self.dead_letters = []  # (serial number, last error) that could not be fetched
+        self.unreachable_error = None  # set once a batch could not connect after its retries
+        self.cache = HistoryCache(cache_path) if cache_path else None
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+
+        # One keep-alive connection per in-flight request
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _post_serial_history(self, serial_numbers: List[str], start_date: Optional[str] = None,
+                             end_date: Optional[str] = None, stream: bool = False) -> requests.Response:
+        url = f"{self.api_base_url}/serial-history"
+
+        payload = {
+            "serialNumbers": serial_numbers
+        }
+
+        if start_date and end_date:
+            payload["startDate"] = start_date
+            payload["endDate"] = end_date
+
+        response = self.session.post(
+            url, json=payload, timeout=(API_CONNECT_TIMEOUT_SECONDS, self.timeout), stream=stream
+        )
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def get_serial_history(self, serial_numbers: List[str], start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict:
+        """
+        Get production history for serial numbers from the API
+        """
+        try:
+            return self._post_serial_history(serial_numbers, start_date, end_date).json()
+        except requests.exceptions.RequestException as e:
+            print(f"API request failed: {e}")
+            return {"success": False, "error": str(e)}
+
+    def _request_batch(self, batch: List[str], start_date: Optional[str],
+                       end_date: Optional[str]) -> Tuple[Dict, bool, bool]:
+        """
+        One timed /serial-history request, reported to the batch sizer
+        Returns ({'success', 'error', 'history_by_sn'}, worth retrying, portal unreachable)
+        """
+        started = time.perf_counter()
+        response_bytes = 0
+        overloaded = False
+        retryable = False
+        unreachable = False
+        try:
+            response = self._post_serial_history(batch, start_date, end_date, stream=self.stream_json)
+            if self.stream_json:
+                with response:
+                    response.raw.decode_content = True
+                    api_response = stream_history(response.raw)
+                    response_bytes = response.raw.tell()
+            else:
+                response_bytes = len(response.content)
+                data = response.json()
+                api_response = {
+                    'success': data.get('success'),
+                    'error': data.get('error'),
+                    'history_by_sn': group_history(data.get('history', []))
+                }
+        except requests.exceptions.RequestException as e:
+            print(f"API request failed: {e}")
+            api_response = {"success": False, "error": str(e)}
+            status = e.response.status_code if e.response is not None else None
+            overloaded = isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)) \
+                or (status is not None and status >= 500)
+            retryable = overloaded or status in RETRY_STATUSES
+            unreachable = is_unreachable(e)
+        except STREAM_ERRORS as e:
+            print(f"API response could not be read: {e}")
+            api_response = {"success": False, "error": str(e)}
+            overloaded = retryable = True
+
+        if self.batch_sizer:
+            self.batch_sizer.record(
+                len(batch),
+                time.perf_counter() - started,
+                response_bytes,
+                bool(api_response.get('success')),
+                overloaded
+            )
+        return api_response, retryable, unreachable
+
+    def _retry_delay(self, attempt: int) -> float:
+        # Full jitter: concurrent batches that failed together do not retry together
+        return random.uniform(0, min(API_RETRY_MAX_SECONDS, API_RETRY_BASE_SECONDS * 2 ** attempt))
+
+    def _fetch_batch(self, batch: List[str], start_date: Optional[str], end_date: Optional[str],
+                     max_retries: Optional[int] = None) -> Tuple[List[str], Dict]:
+        """
+        Fetch one batch, retrying transient failures and splitting the batch
+        when it keeps failing
+        Returns (serial numbers fetched, api_response with their history);
+        serial numbers that failed on their own are added to dead_letters, and
+        once the portal cannot be connected to, every batch after it is too
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
+        if self.unreachable_error:
+            return self._dead_letter(batch, self.unreachable_error)
+
+        for attempt in range(max_retries + 1):
+            api_response, retryable, unreachable = self._request_batch(batch, start_date, end_date)
+            if api_response.get('success'):
+                return batch, api_response
+            if not retryable or attempt == max_retries:
+                break
+            if len(batch) > 1 and len(batch) > self.batch_sizer.next_size() and not unreachable:
+                # The sizer has shrunk since: retry as smaller halves instead
+                break
+            with self._lock:
+                self.retries += 1
+            time.sleep(self._retry_delay(attempt))
+
+        if unreachable:
+            # Not the batch's fault: splitting would only wait out more connect timeouts
+            with self._lock:
+                if not self.unreachable_error:
+                    self.unreachable_error = f"Portal unreachable: {api_response.get('error')}"
+                    print(f"✗ Cannot connect to {self.api_base_url}, skipping the remaining batches")
+            return self._dead_letter(batch, self.unreachable_error)
+
+        if len(batch) == 1:
+            return self._dead_letter(batch, api_response.get('error', 'Unknown error'))
+
+        middle = len(batch) // 2
+        fetched, history_by_sn = [], {}
+        for half in (batch[:middle], batch[middle:]):
+            # A single serial number gets the full retries before it is dead-lettered
+            half_retries = None if len(half) == 1 else SPLIT_RETRIES
+            half_fetched, half_response = self._fetch_batch(half, start_date, end_date, half_retries)
+            fetched.extend(half_fetched)
+            history_by_sn.update(half_response['history_by_sn'])
+        return fetched, {"success": True, "history_by_sn": history_by_sn}
+
+    def _dead_letter(self, batch: List[str], error: str) -> Tuple[List[str], Dict]:
+        with self._lock:
+            self.dead_letters.extend((sn, error) for sn in batch)
+        return [], {"success": True, "history_by_sn": {}}
+
+    def fetch_history_batches(self, serial_numbers: List[str], batch_size: Optional[int] = None,
+                              start_date: Optional[str] = None, end_date: Optional[str] = None) -> Iterator[Tuple[List[str], Dict]]:
+        """
+        Yield (batch, api_response) for every batch of serial numbers, in
+        input order, while up to max_in_flight requests run concurrently;
+        api_response['history_by_sn'] holds each serial's workstation records
+
+        Failing batches are retried and split, so `batch` holds only the serial
+        numbers that were fetched; the rest end up in self.dead_letters.
+        Serial numbers found in the cache are not requested again. A date range
+        longer than shard_days is fetched shard by shard and merged.
+
+        Batch size is batch_size, else the client's batch_size, else chosen
+        per batch by an AdaptiveBatchSizer. The sizes used and the throughput
+        end up in self.fetch_summary.
+        """
+        batch_size = batch_size or self.batch_size
+        if batch_size:
+            self.batch_sizer = AdaptiveBatchSizer(batch_size, batch_size, batch_size, self.timeout)
+        else:
+            self.batch_sizer = AdaptiveBatchSizer(timeout=self.timeout)
+
+        self.retries = 0
+        self.dead_letters = []
+        self.unreachable_error = None
+        started = time.perf_counter()
+        cached = self.cache.get_many(serial_numbers, start_date, end_date) if self.cache else {}
+        shards = date_shards(start_date, end_date, self.shard_days)
+
+        position = 0
+        pending = deque()
+        in_flight = 0
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while position < len(serial_numbers) or pending:
+                # Keep max_in_flight requests going, each sized from the latest feedback.
+                # A request carries the next batch-size serial numbers missing from
+                # the cache; cached ones in between come back in the same batch
+                while position < len(serial_numbers) and in_flight < self.max_in_flight:
+                    size = self.batch_sizer.next_size()
+                    batch_start = position
+                    wanted = []
+                    while position < len(serial_numbers) and len(wanted) < size:
+                        if serial_numbers[position] not in cached:
+                            wanted.append(serial_numbers[position])
+                        position += 1
+                    futures = [
+                        executor.submit(self._fetch_batch, wanted, shard_start, shard_end)
+                        for shard_start, shard_end in shards
+                    ] if wanted else []
+                    in_flight += len(futures)
+                    pending.append((serial_numbers[batch_start:position], futures))
+
+                batch, futures = pending.popleft()
+                if not futures:
+                    yield batch, {"success": True, "history_by_sn": {sn: cached[sn] for sn in batch}}
+                    continue
+
+                fetched, api_response = merge_shard_results([future.result() for future in futures])
+                in_flight -= len(futures)
+                history_by_sn = api_response['history_by_sn']
+                if self.cache:
+                    self.cache.put_many({sn: history_by_sn.get(sn, []) for sn in fetched}, start_date, end_date)
+                if len(fetched) == len(batch):
+                    # Nothing came from the cache and nothing failed
+                    yield batch, api_response
+                    continue
+
+                fetched = set(fetched)
+                served = [sn for sn in batch if sn in cached or sn in fetched]
+                for sn in served:
+                    if sn in cached:
+                        history_by_sn[sn] = cached[sn]
+                yield served, api_response
+
+        self.fetch_summary = self.batch_sizer.summary(time.perf_counter() - started, len(serial_numbers))
+        self.fetch_summary['retries'] = self.retries
+        self.fetch_summary['dead_letters'] = len({sn for sn, _ in self.dead_letters})
+        self.fetch_summary['cache_hits'] = sum(1 for sn in serial_numbers if sn in cached)
+        self.fetch_summary['date_shards'] = len(shards)
+
+    def print_fetch_summary(self):
+        """
+        Print the batch sizes used and the throughput of the last fetch
+        """
+        summary = self.fetch_summary
+        if not summary:
+            return
+        sizes = ', '.join(f"{size}×{count}" for size, count in summary['sizes_used'].items())
+        print(f"\nAPI requests: {summary['requests']} ({summary['failed_requests']} failed, "
+              f"{summary['retries']} retries), final batch size {summary['final_size']}")
+        print(f"  Sizes used: {sizes}")
+        if summary['date_shards'] > 1:
+            print(f"  Date range fetched in {summary['date_shards']} shards")
+        if self.cache:
+            print(f"  Cache: {summary['cache_hits']} of {summary['serials']} serial numbers from {self.cache.path}")
+        print(f"  Throughput: {summary['serials_per_second']} serials/s "
+              f"({summary['serials']} serials in {summary['elapsed_seconds']}s, "
+              f"{summary['response_bytes'] / 1024 / 1024:.1f} MB)")
+        if summary['dead_letters']:
+            print(f"  ✗ {summary['dead_letters']} serial numbers could not be fetched")
+
+    def save_dead_letters(self, output_file: str) -> Optional[str]:
+        """
+        Write the serial numbers that could not be fetched next to output_file
+        (raw_timestamps.csv -> raw_timestamps_dead_letter.csv), one per line
+        with the last error, so they can be fed back in as an input file
+        Returns the path, or None if nothing failed
+        """
+        if not self.dead_letters:
+            return None
+
+        # A serial number can fail in more than one date shard
+        failed = dict(self.dead_letters)
+        path = f"{os.path.splitext(output_file)[0]}_dead_letter.csv"
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            for sn, error in failed.items():
+                writer.writerow([sn, error])
+
+        print(f"✗ {len(failed)} serial numbers could not be fetched, saved to {path}")
+        return path
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Streaming quantile sketches for gap and process-time percentiles
+
+KLLSketch keeps an approximate picture of a stream of durations in a few
+hundred numbers, however many values it has seen (Karnin, Lang & Liberty).
+Sketches built on different workers or runs can be merged, and are saved as
+JSON, so p50/p90/p99 over millions of units never needs every duration in
+memory.
+
+SketchSet is a named group of sketches, e.g. one per station or transition.
+
+Usage: python quantile_sketch.py sketches.json [more_sketches.json ...]
+       (merges the files and prints p50/p90/p99 for every name)
+"""
+import sys
+import csv
+import json
+import math
+import random
+
+# Accuracy vs size: rank error is roughly 1.7 / DEFAULT_K
+DEFAULT_K = 200
+
+# Each level holds at most 2/3 as many items as the one below it
+CAPACITY_DECAY = 2 / 3
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+class KLLSketch:
+    """
+    Mergeable streaming quantile sketch
+
+    Level h holds items that each stand for 2**h original values. When the
+    sketch is full, the lowest full level is sorted and every other item
+    (random offset) moves up a level with double the weight.
+    """
+    __slots__ = ('k', 'count', 'min', 'max', '_levels', '_size', '_limit', '_random')
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.count = 0
+        self.min = None
+        self.max = None
+        self._levels = [[]]
+        self._size = 0
+        self._limit = self._max_size()
+        self._random = random.Random()
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(math.ceil(self.k * CAPACITY_DECAY ** depth)))
+
+    def _max_size(self):
+        return sum(self._capacity(level) for level in range(len(self._levels)))
+
+    def _compress(self):
+        for level, items in enumerate(self._levels):
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append([])
+                    self._limit = self._max_size()
+                items.sort()
+                leftover = [items.pop()] if len(items) % 2 else []
+                promoted = items[self._random.randint(0, 1)::2]
+                self._levels[level + 1].extend(promoted)
+                self._levels[level] = leftover
+                self._size -= len(promoted)
+                return
+
+    def add(self, value):
+        self.count += 1
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self._levels[0].append(value)
+        self._size += 1
+        if self._size >= self._limit:
+            self._compress()
+
+    def merge(self, other):
+        """Fold another sketch into this one"""
+        if not other.count:
+            return
+        while len(self._levels) < len(other._levels):
+            self._levels.append([])
+        self._limit = self._max_size()
+        for level, items in enumerate(other._levels):
+            self._levels[level].extend(items)
+        self._size += other._size
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        while self._size >= self._limit:
+            self._compress()
+
+    def quantile(self, q):
+        """Approximate value at quantile q (0..1), or None if empty"""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+
+        weighted = sorted(
+            (value, 1 << level)
+            for level, items in enumerate(self._levels)
+            for value in items
+        )
+        total = sum(weight for _, weight in weighted)
+        target = q * total
+        seen = 0
+        for value, weight in weighted:
+            seen += weight
+            if seen >= target:
+                return value
+        return self.max
+
+    def to_dict(self):
+        return {
+            'k': self.k,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'levels': self._levels
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['k'])
+        sketch.count = data['count']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        sketch._levels = [list(items) for items in data['levels']] or [[]]
+        sketch._size = sum(len(items) for items in sketch._levels)
+        sketch._limit = sketch._max_size()
+        return sketch
+
+
+class SketchSet:
+    """
+    One KLLSketch per name (station, transition, ...)
+    """
+    __slots__ = ('k', 'sketches')
+
+    def __init__(self, k=DEFAULT_K):
+        self.k = k
+        self.sketches = {}
+
+    def add(self, name, value):
+        sketch = self.sketches.get(name)
+        if sketch is None:
+            sketch = self.sketches[name] = KLLSketch(self.k)
+        sketch.add(value)
+
+    def merge(self, other):
+        for name, sketch in other.sketches.items():
+            if name not in self.sketches:
+                self.sketches[name] = KLLSketch(self.k)
+            self.sketches[name].merge(sketch)
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({name: sketch.to_dict() for name, sketch in self.sketches.items()}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        sketch_set = cls()
+        for name, sketch in data.items():
+            sketch_set.sketches[name] = KLLSketch.from_dict(sketch)
+        return sketch_set
+
+    def percentile_rows(self, percentiles=PERCENTILES):
+        """
+        [(name, count, value at each percentile..., max)] sorted by name, in seconds
+        """
+        return [
+            (name, sketch.count, *[sketch.quantile(p) for p in percentiles], sketch.max)
+            for name, sketch in sorted(self.sketches.items())
+        ]
+
+
+def save_percentiles(sketches, csv_path, json_path, label):
+    """
+    Write p50/p90/p99/max in hours per name to csv_path, and the sketches
+    themselves to json_path so later runs or other workers can merge them
+    """
+    def hours(seconds):
+        return round(seconds / 3600, 2) if seconds is not None else 'N/A'
+
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            label,
+            'Count',
+            *[f'P{round(p * 100)} (hours)' for p in PERCENTILES],
+            'Max (hours)'
+        ])
+        for name, count, *values in sketches.percentile_rows():
+            writer.writerow([name, count, *[hours(value) for value in values]])
+
+    sketches.save(json_path)
+    print(f"✓ Percentiles saved to {csv_path} (sketches in {json_path})")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python quantile_sketch.py sketches.json [more_sketches.json ...]")
+        sys.exit(1)
+
+    merged = SketchSet()
+    for path in sys.argv[1:]:
+        merged.merge(SketchSet.load(path))
+
+    print(f"{'Name':<30} {'Count':>10} {'P50 (h)':>9} {'P90 (h)':>9} {'P99 (h)':>9} {'Max (h)':>9}")
+    for name, count, *values in merged.percentile_rows():
+        cells = ' '.join(f'{value / 3600:>9.2f}' for value in values)
+        print(f"{name:<30} {count:>10,} {cells}")
+
+if __name__ == "__main__":
+    main()
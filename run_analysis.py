@@ -2,83 +2,34 @@
 """
 Time Gap Analysis - Master Script
 
-This script runs the complete analysis workflow:
-1. Calculates time gaps between stations
-2. Exports raw timestamps
+This script runs the complete analysis workflow in one process:
+1. Loads the station history for every serial number (once)
+2. Calculates time gaps, raw timestamps, process times and all station timestamps
 3. Creates lists of missing data
 
+Each serial number's history is fetched from the database a single time and
+shared by every calculation, instead of each step re-reading numbers.csv and
+re-querying workstation_master_log.
+
 Input: numbers.csv (list of serial numbers, one per line)
 Output: Multiple CSV/JSON files with results
 
 Usage: python run_analysis.py
 """
 
-import subprocess
 import sys
 import os
+import csv
 from datetime import datetime
 
-def run_script(script_name, description):
-    """Run a Python script and report results"""
-    print("=" * 70)
-    print(f"Running: {description}")
-    print("=" * 70)
-    try:
-        result = subprocess.run([sys.executable, script_name], 
-                              capture_output=False, 
-                              text=True, 
-                              check=True)
-        print(f"✓ {description} completed successfully\n")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"✗ {description} failed with error code {e.returncode}\n")
-        return False
+from station_history import load_station_history
+from calculate_times import calculate_time_gaps, save_time_gap_results
+from export_raw_timestamps import get_raw_timestamps, save_raw_timestamps
+from calculate_process_times import calculate_process_times, save_process_times
+from export_all_station_timestamps import get_all_station_timestamps, save_all_station_timestamps
 
-def main():
-    print("\n" + "=" * 70)
-    print("TIME GAP ANALYSIS WORKFLOW")
-    print("=" * 70)
-    print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print()
-    
-    # Check if input file exists
-    if not os.path.exists('numbers.csv'):
-        print("ERROR: numbers.csv not found!")
-        print("Please create numbers.csv with one serial number per line.")
-        sys.exit(1)
-    
-    # Count serial numbers
-    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
-        sn_count = sum(1 for line in f if line.strip())
-    
-    print(f"Found {sn_count} serial numbers in numbers.csv")
-    print()
-    
-    # Step 1: Calculate time gaps
-    success = run_script('calculate_times.py', 
-                        'Step 1/2: Calculate time gaps between stations')
-    if not success:
-        print("Workflow failed at Step 1")
-        sys.exit(1)
-    
-    # Step 2: Export raw timestamps
-    success = run_script('export_raw_timestamps.py', 
-                        'Step 2/2: Export raw timestamps from database')
-    if not success:
-        print("Workflow failed at Step 2")
-        sys.exit(1)
-    
-    # Step 3: Create missing data lists
-    print("=" * 70)
-    print("Step 3/3: Creating missing data lists")
-    print("=" * 70)
-    
-    import json
-    import csv
-    
-    with open('time_gaps_errors.json', 'r') as f:
-        errors = json.load(f)
-    
+def save_missing_data_lists(errors):
+    """Write missing_data_serial_numbers.txt and missing_data_breakdown.csv"""
     # Simple text list
     with open('missing_data_serial_numbers.txt', 'w') as f:
         for err in errors:
@@ -95,7 +46,7 @@ def main():
             'Has Packing→Shipping?',
             'Missing Stations'
         ])
-        
+    
         for err in errors:
             writer.writerow([
                 err['serial_number'],
@@ -108,6 +59,74 @@ def main():
     
     print(f"✓ Created missing_data_serial_numbers.txt ({len(errors)} serials)")
     print(f"✓ Created missing_data_breakdown.csv")
+
+def main():
+    print("\n" + "=" * 70)
+    print("TIME GAP ANALYSIS WORKFLOW")
+    print("=" * 70)
+    print(f"Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print()
+    
+    # Check if input file exists
+    if not os.path.exists('numbers.csv'):
+        print("ERROR: numbers.csv not found!")
+        print("Please create numbers.csv with one serial number per line.")
+        sys.exit(1)
+    
+    # Read serial numbers from CSV (handle UTF-8 BOM)
+    serial_numbers = []
+    with open('numbers.csv', 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row:
+                serial_numbers.append(row[0].strip())
+    sn_count = len(serial_numbers)
+    
+    print(f"Found {sn_count} serial numbers in numbers.csv")
+    print()
+    
+    # Step 1: Load station history once for all serial numbers
+    print("=" * 70)
+    print("Step 1/3: Load station history from database")
+    print("=" * 70)
+    try:
+        history = load_station_history(serial_numbers)
+    except Exception as e:
+        print(f"✗ Could not load station history: {e}")
+        print("Workflow failed at Step 1")
+        sys.exit(1)
+    print(f"✓ Loaded history for {len(history)} serial numbers\n")
+    
+    # Step 2: Run every calculation on the same history
+    print("=" * 70)
+    print("Step 2/3: Calculate time gaps, raw timestamps and process times")
+    print("=" * 70)
+    time_gaps = []
+    raw_timestamps = []
+    process_times = []
+    all_station_timestamps = []
+    
+    for i, sn in enumerate(serial_numbers, 1):
+        if i % 100 == 0:
+            print(f"Processed {i}/{sn_count}...")
+    
+        rows = history.get(sn, [])
+        time_gaps.append(calculate_time_gaps(sn, rows))
+        raw_timestamps.append(get_raw_timestamps(sn, rows))
+        process_times.append(calculate_process_times(sn, rows))
+        all_station_timestamps.append(get_all_station_timestamps(sn, rows))
+    
+    errors = save_time_gap_results(time_gaps)
+    save_raw_timestamps(raw_timestamps)
+    save_process_times(process_times)
+    save_all_station_timestamps(all_station_timestamps)
+    print()
+    
+    # Step 3: Create missing data lists
+    print("=" * 70)
+    print("Step 3/3: Creating missing data lists")
+    print("=" * 70)
+    save_missing_data_lists(errors)
     print()
     
     # Final summary
@@ -121,6 +140,10 @@ def main():
     print("  3. time_gaps_results.json         - Detailed JSON results")
     print("  4. missing_data_serial_numbers.txt - Simple list of missing SNs")
     print("  5. missing_data_breakdown.csv     - Details on what's missing")
+    print("  6. process_times_summary.csv      - Time spent at each station")
+    print("  7. all_station_timestamps.csv     - Start/end time of every station")
+    print("  8. time_gap_percentiles.csv       - p50/p90/p99 of each time gap")
+    print("  9. process_time_percentiles.csv   - p50/p90/p99 of each station's process time")
     print()
     
     # Statistics
@@ -134,4 +157,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
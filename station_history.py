@@ -0,0 +1,51 @@
+"""
+Bulk loader for station history in workstation_master_log
+
+Fetches the station visits for a whole list of serial numbers in a few
+chunked `sn = ANY(...)` queries instead of one query per serial number.
+"""
+from itertools import groupby
+
+from db import get_connection, execute_prepared
+
+# How many serial numbers go into one ANY(...) query
+CHUNK_SIZE = 1000
+
+HISTORY_QUERY = """
+    SELECT sn, workstation_name, history_station_start_time, history_station_end_time
+    FROM workstation_master_log
+    WHERE sn = ANY({param})
+    ORDER BY sn, history_station_start_time, id
+"""
+
+
+def load_station_history(serial_numbers, chunk_size=CHUNK_SIZE, prepared=False):
+    """
+    Get the station visits for many serial numbers at once
+
+    Returns {serial_number: [(workstation_name, start_time, end_time), ...]}
+    with each list ordered by start time - the same rows the old per-serial
+    query returned, so it can be passed straight to the calculation functions.
+    Serial numbers with no data are not in the dictionary.
+
+    With prepared=True the query is sent as a server-side prepared statement,
+    which pays off when the same pooled connection runs many chunks.
+    """
+    # Drop duplicates but keep the input order
+    unique_serials = list(dict.fromkeys(serial_numbers))
+    history = {}
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for i in range(0, len(unique_serials), chunk_size):
+            chunk = unique_serials[i:i + chunk_size]
+            if prepared:
+                execute_prepared(cur, 'load_station_history', HISTORY_QUERY.format(param='$1'), (chunk,))
+            else:
+                cur.execute(HISTORY_QUERY.format(param='%s'), (chunk,))
+
+            for sn, rows in groupby(cur.fetchall(), key=lambda row: row[0]):
+                history[sn] = [(station, start, end) for _, station, start, end in rows]
+        cur.close()
+
+    return history
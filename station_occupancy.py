@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Station occupancy / WIP time series
+
+For every station, how many units were being worked on there and how many
+were waiting for it (finished their previous station, not started this one
+yet), over time.
+
+Every visit is an interval [start, end) at its station, and every gap
+between a unit's visit and its next visit is a waiting interval for the next
+station. PostgreSQL turns those intervals into +1/-1 events and sorts them
+(O(n log n)); a single sweep over the sorted events keeps the running count
+per station and writes time-weighted averages and maxima per bucket. Rows
+are written as soon as each bucket is complete, so nothing but the current
+counts is held in memory.
+
+Every unit busy or waiting at some point of the date range is counted, even
+if nothing about it changes inside the range. A visit with no end time is
+still open at the end of the range, and so is the wait after a unit's latest
+visit (counted under UNKNOWN_NEXT_STATION, since the next station is not
+known yet) unless that visit is SHIPPING.
+
+Output: station_occupancy.csv
+
+Usage: python station_occupancy.py START_DATE END_DATE [--bucket minute|hour]
+       python station_occupancy.py 2025-03-01 2025-04-01 --bucket hour
+"""
+import sys
+import csv
+from datetime import datetime, timedelta
+
+from db import get_connection
+from history_cache import FINAL_STATION
+
+BUCKET_SIZES = {
+    'minute': timedelta(minutes=1),
+    'hour': timedelta(hours=1)
+}
+
+# Station name for units waiting after their latest visit
+UNKNOWN_NEXT_STATION = '(next station)'
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 10000
+
+OCCUPANCY_EVENTS_QUERY = """
+    WITH units AS (
+        -- Units busy or waiting at any point of the range, including ones
+        -- that sit at a station or between stations across the whole range
+        SELECT DISTINCT sn
+        FROM (
+            SELECT
+                sn,
+                workstation_name,
+                history_station_end_time AS end_time,
+                LEAD(history_station_start_time) OVER (
+                    PARTITION BY sn ORDER BY history_station_start_time, id
+                ) AS next_start
+            FROM workstation_master_log
+            WHERE history_station_start_time < %(range_end)s
+        ) v
+        WHERE COALESCE(end_time, next_start, 'infinity') > %(range_start)s
+           OR (COALESCE(next_start, 'infinity') > %(range_start)s
+               AND NOT (next_start IS NULL AND workstation_name = %(final_station)s))
+    ),
+    visits AS (
+        SELECT
+            w.workstation_name AS station,
+            w.history_station_start_time AS start_time,
+            w.history_station_end_time AS end_time,
+            LEAD(w.workstation_name) OVER unit_order AS next_station,
+            LEAD(w.history_station_start_time) OVER unit_order AS next_start
+        FROM workstation_master_log w
+        JOIN units u ON u.sn = w.sn
+        WINDOW unit_order AS (PARTITION BY w.sn ORDER BY w.history_station_start_time, w.id)
+    ),
+    intervals AS (
+        -- Being worked on at a station; a visit with no end lasts until the
+        -- next one starts, or is still open at the end of the range
+        SELECT
+            station,
+            'busy' AS kind,
+            start_time AS interval_start,
+            COALESCE(end_time, next_start, %(range_end)s) AS interval_end
+        FROM visits
+        UNION ALL
+        -- Waiting for the next station; a unit that has not started one yet
+        -- is still waiting at the end of the range (unless it has shipped)
+        SELECT
+            COALESCE(next_station, %(unknown_station)s),
+            'waiting',
+            end_time,
+            COALESCE(next_start, %(range_end)s)
+        FROM visits
+        WHERE next_start IS NOT NULL OR station <> %(final_station)s
+    )
+    SELECT event_time, station, kind, delta
+    FROM intervals
+    CROSS JOIN LATERAL (VALUES (interval_start, 1), (interval_end, -1)) e(event_time, delta)
+    WHERE station IS NOT NULL
+      AND interval_end > interval_start
+      AND interval_start < %(range_end)s
+      AND interval_end > %(range_start)s
+    ORDER BY event_time, delta
+"""
+
+
+def occupancy_query_params(range_start, range_end):
+    return {
+        'range_start': range_start,
+        'range_end': range_end,
+        'final_station': FINAL_STATION,
+        'unknown_station': UNKNOWN_NEXT_STATION
+    }
+
+
+def iter_occupancy_events(range_start, range_end):
+    """
+    Yield (time, station, 'busy' | 'waiting', +1 | -1) in time order,
+    ends before starts at the same moment
+    """
+    with get_connection() as conn:
+        # A named cursor keeps the sorted events on the server
+        cur = conn.cursor(name='station_occupancy_events')
+        cur.itersize = FETCH_SIZE
+        cur.execute(OCCUPANCY_EVENTS_QUERY, occupancy_query_params(range_start, range_end))
+        for row in cur:
+            yield row
+        cur.close()
+
+
+def sweep_occupancy(events, range_start, range_end, bucket_size):
+    """
+    Sweep the sorted events and yield one row per bucket and station:
+    (bucket_start, station, busy_avg, busy_max, waiting_avg, waiting_max)
+
+    Averages are weighted by time; stations with nobody busy or waiting in a
+    bucket are left out.
+    """
+    counts = {}        # (station, kind) -> units there right now
+    last_change = {}   # (station, kind) -> when that count last changed
+    area = {}          # (station, kind) -> unit-seconds so far in this bucket
+    peak = {}          # (station, kind) -> highest count held so far in this bucket
+
+    bucket_start = range_start
+    bucket_end = range_start + bucket_size
+    bucket_seconds = bucket_size.total_seconds()
+
+    def hold(key, until):
+        # counts[key] units stayed from last_change[key] until `until`
+        count = counts[key]
+        if count and until > last_change[key]:
+            area[key] = area.get(key, 0) + count * (until - last_change[key]).total_seconds()
+            if count > peak.get(key, 0):
+                peak[key] = count
+        last_change[key] = until
+
+    def close_bucket():
+        for key in counts:
+            hold(key, min(bucket_end, range_end))
+
+        stations = sorted({station for (station, _), value in peak.items() if value})
+        rows = []
+        for station in stations:
+            busy, waiting = (station, 'busy'), (station, 'waiting')
+            rows.append((
+                bucket_start,
+                station,
+                round(area.get(busy, 0) / bucket_seconds, 2),
+                peak.get(busy, 0),
+                round(area.get(waiting, 0) / bucket_seconds, 2),
+                peak.get(waiting, 0)
+            ))
+
+        area.clear()
+        peak.clear()
+        return rows
+
+    for event_time, station, kind, delta in events:
+        if event_time >= range_end:
+            break
+        event_time = max(event_time, range_start)
+
+        while event_time >= bucket_end:
+            yield from close_bucket()
+            bucket_start = bucket_end
+            bucket_end = bucket_start + bucket_size
+
+        key = (station, kind)
+        if key in counts:
+            hold(key, event_time)
+        else:
+            counts[key] = 0
+        counts[key] += delta
+        last_change[key] = event_time
+
+    # Flush the rest of the range, including buckets with no events
+    while bucket_start < range_end:
+        yield from close_bucket()
+        bucket_start = bucket_end
+        bucket_end = bucket_start + bucket_size
+
+
+def main():
+    args = sys.argv[1:]
+    bucket = 'hour'
+    if '--bucket' in args:
+        i = args.index('--bucket')
+        bucket = args[i + 1]
+        del args[i:i + 2]
+
+    if len(args) != 2 or bucket not in BUCKET_SIZES:
+        print("Usage: python station_occupancy.py START_DATE END_DATE [--bucket minute|hour]")
+        sys.exit(1)
+
+    range_start = datetime.fromisoformat(args[0])
+    range_end = datetime.fromisoformat(args[1])
+    print(f"Station occupancy from {range_start} to {range_end} per {bucket}...")
+
+    events = iter_occupancy_events(range_start, range_end)
+    row_count = 0
+    with open('station_occupancy.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            'Bucket Start',
+            'Station',
+            'At Station (avg)',
+            'At Station (max)',
+            'Waiting (avg)',
+            'Waiting (max)'
+        ])
+        for row in sweep_occupancy(events, range_start, range_end, BUCKET_SIZES[bucket]):
+            writer.writerow(row)
+            row_count += 1
+
+    print(f"✓ Saved {row_count:,} rows to station_occupancy.csv")
+
+if __name__ == "__main__":
+    main()
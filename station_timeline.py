@@ -0,0 +1,111 @@
+"""
+Per-serial station timeline shared by the gap, raw timestamp and process
+time calculations
+
+Replaces the `stations = {name: [{'start': ..., 'end': ...}]}` dictionaries
+and their linear scans. Each station keeps its visits in start-time order
+next to a sorted array of start times, so "first visit of X starting after T"
+is a bisect instead of a loop. A global index of every visit answers "next
+station of any kind after T" the same way.
+"""
+from bisect import bisect_right
+
+
+class StationTimeline:
+    """
+    All station visits of one serial number
+
+    Built from (workstation_name, start_time, end_time) rows. Rows are put in
+    start-time order (missing start times last) with a stable sort, so rows
+    that already come ordered from the database keep their exact order.
+    Visits are (start, end) tuples.
+    """
+    __slots__ = ('_visits', '_starts', '_all_starts', '_all_visits')
+
+    def __init__(self, rows):
+        rows = sorted(rows, key=lambda row: (row[1] is None, row[1] if row[1] is not None else 0))
+
+        # station -> [(start, end), ...]; dict order = order stations were first seen
+        self._visits = {}
+        for station, start, end in rows:
+            if station not in self._visits:
+                self._visits[station] = []
+            self._visits[station].append((start, end))
+
+        # station -> sorted start times. Visits with no start time are at the
+        # end of each list, so index i here is also index i in _visits.
+        self._starts = {
+            station: [start for start, _ in visits if start is not None]
+            for station, visits in self._visits.items()
+        }
+
+        # Every visit with a start time, ordered by start and then by the order
+        # stations were first seen (that is how the old dict scan broke ties)
+        ranked = []
+        for rank, (station, visits) in enumerate(self._visits.items()):
+            for start, end in visits:
+                if start is not None:
+                    ranked.append((start, rank, station, end))
+        ranked.sort(key=lambda item: (item[0], item[1]))
+        self._all_starts = [item[0] for item in ranked]
+        self._all_visits = [(item[2], item[0], item[3]) for item in ranked]
+
+    def __contains__(self, station):
+        return station in self._visits
+
+    def __len__(self):
+        return sum(len(visits) for visits in self._visits.values())
+
+    @property
+    def stations(self):
+        """Station names in the order they were first seen"""
+        return list(self._visits)
+
+    def visits(self, station):
+        """Every (start, end) visit of a station, in start-time order"""
+        return self._visits.get(station, [])
+
+    def last(self, station):
+        """MOST RECENT (start, end) visit of a station, or None"""
+        visits = self._visits.get(station)
+        return visits[-1] if visits else None
+
+    def first_after(self, station, time):
+        """First (start, end) visit of a station that starts after `time`, or None"""
+        if time is None:
+            return None
+        starts = self._starts.get(station)
+        if not starts:
+            return None
+        i = bisect_right(starts, time)
+        if i == len(starts):
+            return None
+        return self._visits[station][i]
+
+    def first_after_any(self, stations, time):
+        """
+        Earliest visit of any of `stations` that starts after `time`
+
+        Returns (station, (start, end)) or None. If two stations start at the
+        same moment the one listed first in `stations` wins.
+        """
+        best = None
+        for station in stations:
+            visit = self.first_after(station, time)
+            if visit and (best is None or visit[0] < best[1][0]):
+                best = (station, visit)
+        return best
+
+    def next_after(self, time, exclude=()):
+        """
+        First visit of any station, other than `exclude`, that starts after `time`
+
+        Returns (station, (start, end)) or None.
+        """
+        if time is None:
+            return None
+        for i in range(bisect_right(self._all_starts, time), len(self._all_visits)):
+            station, start, end = self._all_visits[i]
+            if station not in exclude:
+                return station, (start, end)
+        return None
@@ -0,0 +1,21 @@
+"""
+parse_api_time never raises and always returns naive UTC
+"""
+from datetime import datetime, timezone
+
+from api_timestamps import parse_api_time
+
+
+def test_formats_agree_on_utc():
+    expected = datetime(2025, 3, 19, 16, 28)
+    assert parse_api_time('Wed, 19 Mar 2025 16:28:00 GMT') == expected
+    assert parse_api_time('2025-03-19T16:28:00') == expected
+    assert parse_api_time('2025-03-19T18:28:00+02:00') == expected
+    assert parse_api_time('Wed, 19 Mar 2025 17:28:00 +0100') == expected
+    assert parse_api_time(datetime(2025, 3, 19, 16, 28, tzinfo=timezone.utc)) == expected
+    assert parse_api_time(expected) == expected
+
+
+def test_unreadable_values_are_none():
+    for value in (None, '', 'not a time', 1742401680, 17.5):
+        assert parse_api_time(value) is None
@@ -0,0 +1,56 @@
+"""
+The web exporters and every history source run the same calculations
+"""
+import pytest
+
+from QUE_raw_timestamps import WebRawTimestampsExporter
+from all_stations_time import WebAllStationTimestampsExporter
+from api_timestamps import normalize_records
+from export_raw_timestamps import get_raw_timestamps
+from export_all_station_timestamps import get_all_station_timestamps
+from history_sources import HistorySource, ParquetSource, get_source
+
+RECORDS = [
+    {'source': 'workstation', 'workstation_name': 'UPGRADE',
+     'history_station_start_time': 'Wed, 19 Mar 2025 12:00:00 GMT',
+     'history_station_end_time': 'Wed, 19 Mar 2025 13:00:00 GMT'},
+    {'source': 'workstation', 'workstation_name': 'VI1',
+     'history_station_start_time': 'Wed, 19 Mar 2025 08:00:00 GMT',
+     'history_station_end_time': 'Wed, 19 Mar 2025 09:30:00 GMT'},
+    {'source': 'testboard', 'workstation_name': 'FCT',
+     'history_station_start_time': 'Wed, 19 Mar 2025 10:00:00 GMT'},
+    {'source': 'workstation', 'workstation_name': 'BBD',
+     'history_station_start_time': '2025-03-19T14:00:00',
+     'history_station_end_time': '2025-03-19T15:00:00'},
+]
+
+
+def test_web_exporters_use_the_database_calculations():
+    rows = normalize_records(RECORDS)
+    raw = WebRawTimestampsExporter(cache_path=None).process_raw_timestamps('SN1', RECORDS)
+    assert raw == get_raw_timestamps('SN1', rows)
+    assert raw['vi1_next_station'] == 'UPGRADE'
+    assert raw['bbd_assy_station'] == 'BBD'
+
+    stations = WebAllStationTimestampsExporter(cache_path=None).process_all_station_timestamps('SN1', RECORDS)
+    assert stations == get_all_station_timestamps('SN1', rows)
+    assert sorted(stations['stations']) == ['BBD', 'UPGRADE', 'VI1']
+
+
+def test_no_records_is_an_empty_result():
+    raw = WebRawTimestampsExporter(cache_path=None).process_raw_timestamps('SN1', [])
+    assert raw['serial_number'] == 'SN1'
+    assert raw['vi1_end'] is None
+
+
+def test_history_source_needs_load():
+    with pytest.raises(TypeError):
+        HistorySource()
+
+
+def test_parquet_source_checks_its_own_path(tmp_path):
+    missing = tmp_path / 'missing.parquet'
+    available, reason = ParquetSource(str(missing)).available()
+    assert not available
+    with pytest.raises(ValueError):
+        get_source('parquet', path=str(missing))
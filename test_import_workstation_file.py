@@ -0,0 +1,115 @@
+"""
+Reading an export in chunks, and resuming part way through one, must give
+the same rows (and row fingerprints) whatever the chunk size
+"""
+from datetime import datetime
+
+import pandas as pd
+import psycopg2
+import pytest
+from openpyxl import Workbook
+
+from db import get_connection
+from import_workstation_file_fixed import (
+    COLUMNS, STAGING_TABLE, copy_to_staging, create_staging_table, fingerprint_sql, map_rows, read_chunks
+)
+
+CSV_EXPORT = (
+    'SN,Workstation Name,History Station End Time\n'
+    '\n'
+    'A1,VI1,2025-03-01 08:00:00\n'
+    'A2,UPGRADE,2025-03-01 09:00:00\n'
+    '\n'
+    '\n'
+    'A3,"BBD\n'
+    'rework",2025-03-01 10:00:00\n'
+    'A4,FLA,2025-03-01 11:00:00\n'
+    '\n'
+    'A5,PACKING,2025-03-01 12:00:00\n'
+)
+
+
+def read_all(file_path, chunk_rows, skip_rows=0):
+    return pd.concat(read_chunks(file_path, chunk_rows, skip_rows), ignore_index=True)
+
+
+def test_csv_resume_skips_rows_not_lines(tmp_path):
+    file_path = tmp_path / 'export.csv'
+    file_path.write_text(CSV_EXPORT)
+    every_row = read_all(str(file_path), 2)
+    assert list(every_row['sn']) == ['A1', 'A2', 'A3', 'A4', 'A5']
+
+    # rows_done after each committed chunk, with chunks of 1, 2 and 3 rows
+    for rows_done in range(1, len(every_row)):
+        for chunk_rows in (1, 2, 3):
+            resumed = read_all(str(file_path), chunk_rows, rows_done)
+            pd.testing.assert_frame_equal(resumed, every_row.iloc[rows_done:].reset_index(drop=True))
+
+
+# Blank cells among whole numbers and fractions, so some chunks would read a
+# column as int and others as float
+XLSX_ROWS = [
+    ['SN', 'Workstation Name', 'History Station Start Time', 'History Station End Time', 'Hours', 'Customer PN'],
+    [1001, 'VI1', datetime(2025, 3, 1, 8), datetime(2025, 3, 1, 9), 1, ' PN-1 '],
+    [1002, 'UPGRADE', None, datetime(2025, 3, 1, 10), None, None],
+    [None, 'BBD', datetime(2025, 3, 1, 10), datetime(2025, 3, 1, 11), 1.5, ''],
+    [1004, 'FLA', '2025-03-01 11:00:00', '2025-03-01 12:00:00', 2, 'PN-4'],
+    [1005, 'PACKING', datetime(2025, 3, 1, 12), None, 0.25, None],
+]
+
+
+def write_xlsx(file_path):
+    workbook = Workbook()
+    for row in XLSX_ROWS:
+        workbook.active.append(row)
+    workbook.save(file_path)
+
+
+def mapped_chunks(file_path, chunk_rows):
+    return [map_rows(df) for df in read_chunks(file_path, chunk_rows)]
+
+
+def test_mapped_rows_do_not_depend_on_chunk_size(tmp_path):
+    file_path = str(tmp_path / 'export.xlsx')
+    write_xlsx(file_path)
+
+    one_at_a_time = pd.concat(mapped_chunks(file_path, 1), ignore_index=True)
+    all_at_once = pd.concat(mapped_chunks(file_path, 100), ignore_index=True)
+    pd.testing.assert_frame_equal(one_at_a_time, all_at_once)
+    assert list(all_at_once['sn']) == ['1001', '1002', pd.NA, '1004', '1005']
+    assert list(all_at_once['hours']) == ['1', pd.NA, '1.5', '2', '0.25']
+
+
+def fingerprints_from_database(chunks):
+    """
+    Stage each mapped chunk and fingerprint it with fingerprint_sql(), in a
+    temporary workstation_master_log that hides the real table for this session
+    """
+    fingerprints = []
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            columns = ', '.join(
+                f"{column} {'TIMESTAMP' if column.endswith('_time') else 'TEXT'}" for column in COLUMNS
+            )
+            cur.execute(f"CREATE TEMP TABLE workstation_master_log ({columns}) ON COMMIT DROP")
+            for mapped in chunks:
+                create_staging_table(cur)
+                copy_to_staging(cur, mapped)
+                cur.execute(f"SELECT {fingerprint_sql(STAGING_TABLE)} FROM {STAGING_TABLE}")
+                fingerprints.extend(row[0] for row in cur.fetchall())
+                cur.execute(f"DROP TABLE {STAGING_TABLE}")
+            cur.close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+    return fingerprints
+
+
+def test_fingerprints_do_not_depend_on_chunk_size(tmp_path):
+    file_path = str(tmp_path / 'export.xlsx')
+    write_xlsx(file_path)
+
+    one_at_a_time = fingerprints_from_database(mapped_chunks(file_path, 1))
+    two_at_a_time = fingerprints_from_database(mapped_chunks(file_path, 2))
+    assert len(one_at_a_time) == len(XLSX_ROWS) - 1
+    assert one_at_a_time == two_at_a_time
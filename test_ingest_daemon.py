@@ -0,0 +1,51 @@
+"""
+A worker that dies takes every import on the pool with it; only the file
+that killed it should end up in failed/
+"""
+import os
+import time
+
+import ingest_daemon
+from ingest_daemon import IngestDaemon
+
+
+def fake_ingest(path):
+    if 'crash' in os.path.basename(path):
+        os._exit(1)
+    time.sleep(0.5)
+    return {'rows': 1, 'inserted': 1, 'skipped': 0, 'already_imported': None, 'seconds': 0.5}
+
+
+def test_broken_pool_only_fails_the_file_that_broke_it(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest_daemon, 'ingest_file', fake_ingest)
+    folders = {name: tmp_path / name for name in ('incoming', 'done', 'failed')}
+    for folder in folders.values():
+        folder.mkdir()
+    for name in ('ok1.csv', 'crash.csv', 'ok2.csv'):
+        (folders['incoming'] / name).write_text('sn\n')
+
+    daemon = IngestDaemon(str(folders['incoming']), str(folders['done']), str(folders['failed']),
+                          str(tmp_path / 'status.json'), workers=3, max_retries=2)
+    deadline = time.time() + 60
+    try:
+        while daemon.check(wait_for_copy=False) and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        daemon.stop()
+
+    assert sorted(os.listdir(folders['done'])) == ['ok1.csv', 'ok2.csv']
+    assert sorted(os.listdir(folders['failed'])) == ['crash.csv', 'crash.csv.error.txt']
+    assert os.listdir(folders['incoming']) == []
+    assert (daemon.done, daemon.failed) == (2, 1)
+
+
+def test_workers_do_not_inherit_pooled_connections(tmp_path, monkeypatch):
+    closed = []
+    monkeypatch.setattr(ingest_daemon, 'close_pool', lambda: closed.append(True))
+    daemon = IngestDaemon(str(tmp_path), str(tmp_path), str(tmp_path), str(tmp_path / 'status.json'), workers=1)
+    try:
+        assert len(closed) == 1
+        daemon._replace_executor()
+        assert len(closed) == 2
+    finally:
+        daemon.stop()
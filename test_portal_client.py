@@ -0,0 +1,33 @@
+"""
+Occasional timeouts / 5xx must not pin the adaptive batch size small
+"""
+import random
+
+from portal_client import AdaptiveBatchSizer
+
+
+def settle(error_rate, batches=3000, seed=1):
+    rnd = random.Random(seed)
+    sizer = AdaptiveBatchSizer()
+    for _ in range(batches):
+        size = sizer.next_size()
+        seconds = 0.2 + 0.01 * size
+        if rnd.random() < error_rate:
+            sizer.record(size, seconds, 0, False, overloaded=True)
+        else:
+            sizer.record(size, seconds, size * 1000, True)
+    return sizer
+
+
+def test_random_errors_do_not_lower_the_ceiling():
+    clean = settle(0.0)
+    noisy = settle(0.02)
+    assert noisy.ceiling == clean.ceiling
+    assert noisy.size == clean.size
+
+
+def test_size_that_keeps_failing_is_capped():
+    sizer = AdaptiveBatchSizer(initial=100, minimum=1, maximum=200)
+    for size in (100, 100, 100):
+        sizer.record(size, 1.0, 0, False, overloaded=True)
+    assert sizer.ceiling == 99
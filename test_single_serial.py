@@ -2,37 +2,27 @@
 """
 Test script to check a single serial number with the export_raw_timestamps function
 """
-import psycopg2
 from datetime import datetime
-
-# Database settings
-DATABASE = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'fox_db',
-    'user': 'gpu_user',
-    'password': ''
-}
+from db import get_connection
 
 def get_raw_timestamps(serial_number):
     """
     Get the raw timestamps used in calculations for a serial number
     """
     try:
-        conn = psycopg2.connect(**DATABASE)
-        cur = conn.cursor()
-        
-        # Get all station times for this serial number
-        cur.execute("""
-            SELECT workstation_name, history_station_start_time, history_station_end_time
-            FROM workstation_master_log 
-            WHERE sn = %s
-            ORDER BY history_station_start_time;
-        """, (serial_number,))
-        
-        rows = cur.fetchall()
-        cur.close()
-        conn.close()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            
+            # Get all station times for this serial number
+            cur.execute("""
+                SELECT workstation_name, history_station_start_time, history_station_end_time
+                FROM workstation_master_log 
+                WHERE sn = %s
+                ORDER BY history_station_start_time, id;
+            """, (serial_number,))
+            
+            rows = cur.fetchall()
+            cur.close()
         
         print(f"Found {len(rows)} records for serial number {serial_number}")
         print("Raw data from database:")
@@ -0,0 +1,95 @@
+"""
+Units that sit at a station, or between stations, across the whole window
+must be counted even though none of their events fall inside it
+"""
+from datetime import datetime, timedelta
+
+import psycopg2
+import pytest
+
+from db import get_connection
+from station_occupancy import (
+    OCCUPANCY_EVENTS_QUERY, UNKNOWN_NEXT_STATION, occupancy_query_params, sweep_occupancy
+)
+
+RANGE_START = datetime(2025, 3, 1, 0, 0)
+RANGE_END = datetime(2025, 3, 1, 3, 0)
+HOUR = timedelta(hours=1)
+
+
+def by_station(rows):
+    table = {}
+    for bucket_start, station, busy_avg, busy_max, waiting_avg, waiting_max in rows:
+        table[(bucket_start.hour, station)] = (busy_avg, busy_max, waiting_avg, waiting_max)
+    return table
+
+
+def test_interval_spanning_the_window_counts_in_every_bucket():
+    # Busy at FCT from before the window until after it, plus one short visit
+    events = [
+        (RANGE_START - timedelta(days=2), 'FCT', 'busy', 1),
+        (RANGE_START + timedelta(minutes=30), 'BIT', 'busy', 1),
+        (RANGE_START + timedelta(minutes=60), 'BIT', 'busy', -1),
+        (RANGE_END + timedelta(days=1), 'FCT', 'busy', -1),
+    ]
+    table = by_station(sweep_occupancy(events, RANGE_START, RANGE_END, HOUR))
+
+    assert table[(0, 'FCT')] == (1.0, 1, 0.0, 0)
+    assert table[(1, 'FCT')] == (1.0, 1, 0.0, 0)
+    assert table[(2, 'FCT')] == (1.0, 1, 0.0, 0)
+    assert table[(0, 'BIT')] == (0.5, 1, 0.0, 0)
+    assert (1, 'BIT') not in table
+
+
+def occupancy_from_database(visits):
+    """
+    Run OCCUPANCY_EVENTS_QUERY over `visits` in a temporary
+    workstation_master_log that hides the real table for this session
+    """
+    try:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                CREATE TEMP TABLE workstation_master_log (
+                    id SERIAL,
+                    sn TEXT,
+                    workstation_name TEXT,
+                    history_station_start_time TIMESTAMP,
+                    history_station_end_time TIMESTAMP
+                ) ON COMMIT DROP
+            """)
+            cur.executemany("""
+                INSERT INTO workstation_master_log
+                    (sn, workstation_name, history_station_start_time, history_station_end_time)
+                VALUES (%s, %s, %s, %s)
+            """, visits)
+            cur.execute(OCCUPANCY_EVENTS_QUERY, occupancy_query_params(RANGE_START, RANGE_END))
+            events = cur.fetchall()
+            cur.close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not available: {e}")
+    return by_station(sweep_occupancy(events, RANGE_START, RANGE_END, HOUR))
+
+
+def test_query_counts_units_with_no_event_inside_the_window():
+    day = timedelta(days=1)
+    table = occupancy_from_database([
+        # At FCT across the whole window
+        ('busy', 'FCT', RANGE_START - day, RANGE_END + day),
+        # Still at BIT (no end time yet)
+        ('open', 'BIT', RANGE_START - day, None),
+        # Waiting for PT3 across the whole window
+        ('waiting', 'PT2', RANGE_START - 2 * day, RANGE_START - day),
+        ('waiting', 'PT3', RANGE_END + day, RANGE_END + 2 * day),
+        # Finished FI, next station not started yet
+        ('current_wait', 'FI', RANGE_START - 2 * day, RANGE_START - day),
+        # Shipped before the window: not WIP
+        ('shipped', 'SHIPPING', RANGE_START - 2 * day, RANGE_START - day),
+    ])
+
+    for hour in range(3):
+        assert table[(hour, 'FCT')] == (1.0, 1, 0.0, 0)
+        assert table[(hour, 'BIT')] == (1.0, 1, 0.0, 0)
+        assert table[(hour, 'PT3')] == (0.0, 0, 1.0, 1)
+        assert table[(hour, UNKNOWN_NEXT_STATION)] == (0.0, 0, 1.0, 1)
+    assert not any(station == 'SHIPPING' for _, station in table)
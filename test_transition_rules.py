@@ -0,0 +1,155 @@
+"""
+calculate_time_gaps() runs on the rules in transition_rules.json and
+get_raw_timestamps() on those in raw_timestamp_rules.json; these checks pin
+both to the output of the hard-coded transitions they replaced
+"""
+from datetime import datetime, timedelta
+
+from calculate_times import calculate_time_gaps
+from calculate_transitions import load_rules, calculate_transitions
+from export_raw_timestamps import get_raw_timestamps
+
+BASE = datetime(2025, 3, 1, 8, 0, 0)
+
+
+def at(hours):
+    return None if hours is None else BASE + timedelta(hours=hours)
+
+
+# (station, start hour, end hour) per serial number
+HISTORIES = {
+    'full_flow': [('VI1', 0, 1), ('Disassembly', 2, 3), ('UPGRADE', 4, 5), ('BBD', 6, 7),
+                  ('FLA', 9, 10), ('PACKING', 12, 13), ('SHIPPING', 15, 16)],
+    'rework': [('VI1', 0, 1), ('Disassembly', 2, 3), ('VI1', 4, 5), ('Disassembly', 7, 8),
+               ('UPGRADE', 9, 10), ('ASSY1', 11, 12), ('CHIFLASH', 13, 14), ('FLA', 14, 15),
+               ('PACKING', 16, 17), ('PACKING', 18, 19), ('SHIPPING', 17.5, 18), ('SHIPPING', 20, 21)],
+    'no_disassembly': [('VI1', 0, 1), ('UPGRADE', 3, 4), ('BBD', 5, 6), ('CHIFLASH', 8, 9)],
+    'no_vi1_no_packing': [('UPGRADE', 0, 1), ('ASSY1', 2, 3), ('FLA', 4, 5)],
+    'no_upgrade_no_shipping': [('VI1', 0, 1), ('BBD', 2, 3), ('FLA', 4, 5), ('PACKING', 6, 7)],
+    'fla_before_bbd': [('VI1', 0, 1), ('FLA', 2, 3), ('UPGRADE', 4, 5), ('BBD', 6, 7),
+                       ('PACKING', 8, 9), ('SHIPPING', 7, 8)],
+    'no_bbd': [('VI1', 0, 1), ('UPGRADE', 2, 3), ('SHIPPING', 5, 6)],
+    'assembley_vi1_last': [('UPGRADE', 0, 1), ('Assembley', 2, 3), ('CHIFLASH', 4, 5), ('VI1', 6, 7)],
+    'bbd_and_assy1': [('UPGRADE', 0, 1), ('ASSY1', 2, 3), ('BBD', 4, 5), ('FLA', 3.5, 4), ('FLA', 6, 7)],
+    'open_bbd_visit': [('VI1', 0, 1), ('Disassembly', 1, 2), ('UPGRADE', 3, 4), ('BBD', 5, None),
+                       ('FLA', 8, 9)],
+    'upgrade_after_bbd': [('BBD', 0, 1), ('UPGRADE', 2, 3), ('FLA', 4, 5), ('PACKING', 5, 6)],
+    'no_data': [],
+}
+
+# What the hard-coded calculate_time_gaps() returned for HISTORIES:
+# ({transition: values in the order of its old fields}, missing_stations)
+EXPECTED = {
+    'full_flow': ({'vi1_to_next': (1, 'Disassembly', 2), 'upgrade_to_bbd_or_assy1': (5, 'BBD', 6),
+                   'bbd_or_assy1_to_fla_or_chiflash': ('BBD', 7, 'FLA', 9), 'packing_to_shipping': (13, 15)}, []),
+    'rework': ({'vi1_to_next': (5, 'Disassembly', 7), 'upgrade_to_bbd_or_assy1': (10, 'ASSY1', 11),
+                'bbd_or_assy1_to_fla_or_chiflash': ('ASSY1', 12, 'CHIFLASH', 13), 'packing_to_shipping': (19, 20)}, []),
+    'no_disassembly': ({'vi1_to_next': (1, 'UPGRADE', 3), 'upgrade_to_bbd_or_assy1': (4, 'BBD', 5),
+                        'bbd_or_assy1_to_fla_or_chiflash': ('BBD', 6, 'CHIFLASH', 8)}, ['PACKING', 'SHIPPING']),
+    'no_vi1_no_packing': ({'upgrade_to_bbd_or_assy1': (1, 'ASSY1', 2),
+                           'bbd_or_assy1_to_fla_or_chiflash': ('ASSY1', 3, 'FLA', 4)}, ['VI1', 'PACKING', 'SHIPPING']),
+    'no_upgrade_no_shipping': ({'vi1_to_next': (1, 'BBD', 2),
+                                'bbd_or_assy1_to_fla_or_chiflash': ('BBD', 3, 'FLA', 4)}, ['UPGRADE', 'SHIPPING']),
+    'fla_before_bbd': ({'vi1_to_next': (1, 'FLA', 2), 'upgrade_to_bbd_or_assy1': (5, 'BBD', 6)}, ['FLA/CHIFLASH']),
+    'no_bbd': ({'vi1_to_next': (1, 'UPGRADE', 2)}, ['BBD/ASSY1', 'PACKING']),
+    'assembley_vi1_last': ({'upgrade_to_bbd_or_assy1': (1, 'Assembley', 2),
+                            'bbd_or_assy1_to_fla_or_chiflash': ('Assembley', 3, 'CHIFLASH', 4)}, ['PACKING', 'SHIPPING']),
+    'bbd_and_assy1': ({'upgrade_to_bbd_or_assy1': (1, 'BBD', 4),
+                       'bbd_or_assy1_to_fla_or_chiflash': ('BBD', 5, 'FLA', 6)}, ['VI1', 'PACKING', 'SHIPPING']),
+    'open_bbd_visit': ({'vi1_to_next': (1, 'UPGRADE', 3), 'upgrade_to_bbd_or_assy1': (4, 'BBD', 5)},
+                       ['FLA/CHIFLASH', 'PACKING', 'SHIPPING']),
+    'upgrade_after_bbd': ({'bbd_or_assy1_to_fla_or_chiflash': ('BBD', 1, 'FLA', 4)}, ['VI1', 'SHIPPING']),
+}
+
+OLD_FIELDS = {
+    'vi1_to_next': ('vi1_end', 'next_station', 'next_station_start'),
+    'upgrade_to_bbd_or_assy1': ('upgrade_end', 'next_station', 'next_station_start'),
+    'bbd_or_assy1_to_fla_or_chiflash': ('prev_station', 'prev_station_end', 'next_station', 'next_station_start'),
+    'packing_to_shipping': ('packing_end', 'shipping_start'),
+}
+
+
+def rows_for(serial_number):
+    return [(station, at(start), at(end)) for station, start, end in HISTORIES[serial_number]]
+
+
+def old_result(serial_number):
+    """
+    Rebuild the old calculate_time_gaps() result from EXPECTED
+    """
+    if serial_number not in EXPECTED:
+        return {'serial_number': serial_number, 'error': 'No data found',
+                **{name: None for name in OLD_FIELDS}}
+
+    gaps, missing_stations = EXPECTED[serial_number]
+    result = {'serial_number': serial_number}
+    for name, fields in OLD_FIELDS.items():
+        if name not in gaps:
+            result[name] = None
+            continue
+        gap = {}
+        for field, value in zip(fields, gaps[name]):
+            gap[field] = at(value).isoformat() if isinstance(value, (int, float)) else value
+        ends = [value for value in gaps[name] if isinstance(value, (int, float))]
+        seconds = (ends[1] - ends[0]) * 3600
+        gap['gap_seconds'] = float(seconds)
+        gap['gap_hours'] = round(seconds / 3600, 2)
+        gap['gap_formatted'] = str(timedelta(seconds=seconds))
+        result[name] = gap
+    result['missing_stations'] = missing_stations
+    return result
+
+
+def test_time_gaps_match_hard_coded_transitions():
+    for serial_number in HISTORIES:
+        assert calculate_time_gaps(serial_number, rows_for(serial_number)) == old_result(serial_number), serial_number
+
+
+def test_extra_rules_only_in_calculate_transitions():
+    rules = load_rules()
+    result = calculate_transitions('full_flow', rules, rows_for('full_flow'))
+    assert result['missing_stations'] == ['FCT', 'PT2']
+    assert 'fct_to_bit' not in calculate_time_gaps('full_flow', rows_for('full_flow'))
+
+
+# What the hard-coded get_raw_timestamps() returned for HISTORIES (hours for
+# times), plus histories where the Disassembly/UPGRADE starts tie and where
+# the last VI1 and PACKING visits are still open
+RAW_HISTORIES = {
+    **HISTORIES,
+    'tie_disassembly_upgrade': [('VI1', 0, 1), ('UPGRADE', 2, 3), ('Disassembly', 2, 4), ('ASSY1', 5, None),
+                                ('FLA', 6, 7)],
+    'open_vi1_and_packing': [('VI1', 0, None), ('Disassembly', 2, 3), ('PACKING', 4, None), ('SHIPPING', 5, 6)],
+}
+
+RAW_EXPECTED = {
+    'full_flow': (1, 'Disassembly', 2, 5, 'BBD', 6, 7, 'FLA', 9, 13, 15),
+    'rework': (5, 'Disassembly', 7, 10, 'ASSY1', 11, 12, 'CHIFLASH', 13, 19, 20),
+    'no_disassembly': (1, 'UPGRADE', 3, 4, 'BBD', 5, 6, 'CHIFLASH', 8, None, None),
+    'no_vi1_no_packing': (None, None, None, 1, 'ASSY1', 2, 3, 'FLA', 4, None, None),
+    'no_upgrade_no_shipping': (1, None, None, None, None, None, None, None, None, 7, None),
+    'fla_before_bbd': (1, 'UPGRADE', 4, 5, 'BBD', 6, 7, None, None, 9, None),
+    'no_bbd': (1, 'UPGRADE', 2, 3, None, None, None, None, None, None, None),
+    'assembley_vi1_last': (7, None, None, 1, 'Assembley', 2, 3, 'CHIFLASH', 4, None, None),
+    'bbd_and_assy1': (None, None, None, 1, 'ASSY1', 2, 3, 'FLA', 3.5, None, None),
+    'open_bbd_visit': (1, 'UPGRADE', 3, 4, 'BBD', 5, None, None, None, None, None),
+    'upgrade_after_bbd': (None, None, None, 3, None, None, None, None, None, 6, None),
+    'no_data': (None,) * 11,
+    'tie_disassembly_upgrade': (1, 'Disassembly', 2, 3, 'ASSY1', 5, None, None, None, None, None),
+    'open_vi1_and_packing': (None,) * 11,
+}
+
+RAW_FIELDS = ('vi1_end', 'vi1_next_station', 'vi1_next_start', 'upgrade_end', 'bbd_assy_station',
+              'bbd_assy_start', 'bbd_assy_end', 'fla_chiflash_station', 'fla_chiflash_start',
+              'packing_end', 'shipping_start')
+
+
+def test_raw_timestamps_match_hard_coded_transitions():
+    for serial_number, history in RAW_HISTORIES.items():
+        rows = [(station, at(start), at(end)) for station, start, end in history]
+        expected = {'serial_number': serial_number}
+        for field, value in zip(RAW_FIELDS, RAW_EXPECTED[serial_number]):
+            expected[field] = at(value) if isinstance(value, (int, float)) else value
+        result = get_raw_timestamps(serial_number, rows)
+        assert result == expected, serial_number
+        assert list(result) == list(expected), serial_number
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Load test for the web exporters against the mock SQL portal
+
+Starts mock_portal.py (or uses --url), then runs an exporter once per batch
+size x concurrency combination and reports, for each run:
+- throughput (serial numbers per second)
+- /serial-history latency p50 / p90 / p99
+- peak memory (max RSS of the process that ran the export)
+
+Every run happens in its own process with the response cache off, so runs do
+not share memory or cached data.
+
+Output: load_test_results.csv
+
+Usage: python load_test.py [--serials 2000] [--batch-sizes 5,10,25,50,adaptive]
+                           [--concurrency 1,4,8] [--exporter raw|all]
+                           [--url URL --serials-file numbers.csv]
+                           [mock_portal.py options: --latency, --per-serial, --error-rate, ...]
+"""
+import os
+import sys
+import io
+import csv
+import json
+import time
+import socket
+import argparse
+import resource
+import subprocess
+import contextlib
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+MOCK_OPTIONS = ['latency', 'per_serial', 'jitter', 'error_rate', 'timeout_rate', 'hang', 'max_batch', 'seed']
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run_one(scenario):
+    """
+    Run one export in this process and return its measurements
+    """
+    from QUE_raw_timestamps import WebRawTimestampsExporter
+    from all_stations_time import WebAllStationTimestampsExporter
+
+    exporter_class = WebRawTimestampsExporter if scenario['exporter'] == 'raw' else WebAllStationTimestampsExporter
+    exporter = exporter_class(
+        scenario['url'],
+        max_in_flight=scenario['concurrency'],
+        batch_size=scenario['batch_size'],
+        cache_path=None
+    )
+    output_file = os.path.join(scenario['output_dir'], f"{scenario['exporter']}_timestamps.csv")
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scenario['exporter'] == 'raw':
+            exporter.export_raw_timestamps(scenario['serial_numbers'], output_file=output_file)
+        else:
+            exporter.export_all_station_timestamps(scenario['serial_numbers'], output_file=output_file)
+    elapsed = time.perf_counter() - started
+
+    summary = exporter.fetch_summary
+    latencies = [seconds for _, seconds, _, _ in exporter.batch_sizer.batches]
+    return {
+        'serials_per_second': round(len(scenario['serial_numbers']) / elapsed, 1),
+        'elapsed_seconds': round(elapsed, 2),
+        'requests': summary['requests'],
+        'failed_requests': summary['failed_requests'],
+        'dead_letters': summary['dead_letters'],
+        'final_batch_size': summary['final_size'],
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        'latency_p90_ms': round(percentile(latencies, 0.9) * 1000, 1) if latencies else None,
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        'response_mb': round(summary['response_bytes'] / 1024 / 1024, 1),
+        # Linux reports kilobytes
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_mock(options):
+    """Start mock_portal.py in its own process; returns (process, base URL)"""
+    port = free_port()
+    command = [sys.executable, os.path.join(HERE, 'mock_portal.py'), '--port', str(port)]
+    for name in MOCK_OPTIONS:
+        value = getattr(options, name)
+        if value is not None:
+            command += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return process, f"http://127.0.0.1:{port}/api/v1/sql-portal"
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("mock_portal.py did not start")
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == '--run-one':
+        # Child process: one scenario in, one JSON line out
+        with open(sys.argv[2], 'r') as f:
+            scenario = json.load(f)
+        print(json.dumps(run_one(scenario)))
+        return
+
+    parser = argparse.ArgumentParser(description='Load test the web exporters')
+    parser.add_argument('--serials', type=int, default=2000, help='synthetic serial numbers per run')
+    parser.add_argument('--serials-file', help='CSV of serial numbers to use instead')
+    parser.add_argument('--batch-sizes', default='5,10,25,50,adaptive')
+    parser.add_argument('--concurrency', default='1,4,8')
+    parser.add_argument('--exporter', choices=['raw', 'all'], default='raw')
+    parser.add_argument('--url', help='use a running portal (or mock) instead of starting one')
+    parser.add_argument('--latency', type=float)
+    parser.add_argument('--per-serial', type=float)
+    parser.add_argument('--jitter', type=float)
+    parser.add_argument('--error-rate', type=float)
+    parser.add_argument('--timeout-rate', type=float)
+    parser.add_argument('--hang', type=float)
+    parser.add_argument('--max-batch', type=int)
+    parser.add_argument('--seed', type=int)
+    options = parser.parse_args()
+
+    if options.serials_file:
+        serial_numbers = []
+        with open(options.serials_file, 'r', encoding='utf-8-sig') as f:
+            for row in csv.reader(f):
+                if row:
+                    serial_numbers.append(row[0].strip())
+    else:
+        serial_numbers = [f"SYN{i:08d}" for i in range(options.serials)]
+
+    batch_sizes = [None if size == 'adaptive' else int(size) for size in options.batch_sizes.split(',')]
+    concurrency_levels = [int(level) for level in options.concurrency.split(',')]
+
+    mock = None
+    url = options.url
+    if not url:
+        mock, url = start_mock(options)
+        print(f"✓ Started mock portal at {url}")
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            for concurrency in concurrency_levels:
+                for batch_size in batch_sizes:
+                    scenario = {
+                        'url': url,
+                        'exporter': options.exporter,
+                        'batch_size': batch_size,
+                        'concurrency': concurrency,
+                        'serial_numbers': serial_numbers,
+                        'output_dir': output_dir
+                    }
+                    scenario_path = os.path.join(output_dir, 'scenario.json')
+                    with open(scenario_path, 'w') as f:
+                        json.dump(scenario, f)
+
+                    label = batch_size or 'adaptive'
+                    print(f"Running batch size {label}, concurrency {concurrency}...")
+                    completed = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--run-one', scenario_path],
+                        capture_output=True, text=True
+                    )
+                    if completed.returncode != 0:
+                        print(f"✗ Run failed:\n{completed.stderr}")
+                        continue
+                    result = json.loads(completed.stdout.strip().splitlines()[-1])
+                    results.append({'batch_size': label, 'concurrency': concurrency, **result})
+    finally:
+        if mock:
+            mock.terminate()
+            mock.wait()
+
+    if not results:
+        return
+
+    print(f"\n{'Batch':>8} {'Conc':>5} {'Serials/s':>10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'Reqs':>6} {'Failed':>6} {'Peak MB':>8}")
+    for r in results:
+        print(f"{str(r['batch_size']):>8} {r['concurrency']:>5} {r['serials_per_second']:>10} "
+              f"{r['latency_p50_ms']:>8} {r['latency_p90_ms']:>8} {r['latency_p99_ms']:>8} "
+              f"{r['requests']:>6} {r['failed_requests']:>6} {r['peak_rss_mb']:>8}")
+
+    with open('load_test_results.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+    print("\n✓ Results saved to load_test_results.csv")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the SQL portal API
+
+Serves /tables, /serial-lookup and /serial-history under /api/v1/sql-portal,
+answering in the same shape as the real portal (Flask-style RFC 1123
+timestamps, workstation plus testboard records), so the web exporters and
+apicall.py can run without the portal.
+
+Data comes from one of:
+- synthetic units generated from each serial number (default; the same serial
+  always gets the same history, some units have heavy FCT rework)
+- a recorded /serial-history response saved to a JSON file (--recorded)
+- workstation_master_log in the configured database (--from-db)
+
+Latency and failures can be injected to test the clients:
+  --latency S        seconds added to every request
+  --per-serial S     seconds added per serial number in the request
+  --jitter F         latency varies randomly by up to +-F (0.2 = 20%)
+  --error-rate P     share of requests answered with 500/503
+  --timeout-rate P   share of requests that hang for --hang seconds
+  --max-batch N      answer 503 for requests with more than N serial numbers
+
+Usage: python mock_portal.py [--port 5000] [options]
+       then point the exporters at it:
+       SQL_PORTAL_URL=http://127.0.0.1:5000/api/v1/sql-portal python ../QUE_raw_timestamps.py
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import zlib
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+API_PREFIX = '/api/v1/sql-portal'
+
+TABLES = ['workstation_master_log', 'testboard_master_log']
+
+# Synthetic flow: each step picks one of its stations
+SYNTHETIC_FLOW = [
+    ['VI1'],
+    ['Disassembly', 'UPGRADE'],
+    ['BBD', 'ASSY1', 'Assembley'],
+    ['FLA', 'CHIFLASH'],
+    ['FCT'],
+    ['BIT'],
+    ['PT2'],
+    ['PT3'],
+    ['FI'],
+    ['PACKING'],
+    ['SHIPPING']
+]
+
+SYNTHETIC_START = datetime(2025, 1, 1)
+
+
+def http_time(moment):
+    """Format a datetime the way Flask's jsonify does"""
+    return moment.strftime('%a, %d %b %Y %H:%M:%S GMT') if moment else None
+
+
+def parse_time(value):
+    """RFC 1123 or ISO timestamp string -> naive datetime (None if unreadable)"""
+    if not value:
+        return None
+    for parse in (lambda v: datetime.strptime(v, '%a, %d %b %Y %H:%M:%S GMT'), datetime.fromisoformat):
+        try:
+            return parse(value).replace(tzinfo=None)
+        except ValueError:
+            pass
+    return None
+
+
+def synthetic_history(sn):
+    """
+    Deterministic made-up history for one serial number:
+    [(station, start, end), ...] plus how many testboard records it has
+    """
+    rng = random.Random(zlib.crc32(sn.encode()))
+    moment = SYNTHETIC_START + timedelta(minutes=rng.randrange(100 * 24 * 60))
+    # 1 in 10 units loops through FCT_REPAIR many times
+    repairs = rng.randint(5, 20) if rng.random() < 0.1 else rng.choice([0, 0, 0, 1])
+    # Some units are still in the line
+    last_step = len(SYNTHETIC_FLOW) if rng.random() < 0.8 else rng.randrange(1, len(SYNTHETIC_FLOW))
+
+    visits = []
+    for choices in SYNTHETIC_FLOW[:last_step]:
+        station = rng.choice(choices)
+        loops = repairs if station == 'FCT' else 0
+        for loop in range(loops + 1):
+            for name in ([station, 'FCT_REPAIR'] if loop < loops else [station]):
+                start = moment + timedelta(minutes=rng.randint(5, 600))
+                end = start + timedelta(minutes=rng.randint(5, 240))
+                visits.append((name, start, end))
+                moment = end
+    return visits, rng.randint(0, 3 + 2 * repairs)
+
+
+class PortalData:
+    """
+    Station history per serial number from synthetic, recorded or database data
+    """
+
+    def __init__(self, recorded=None, from_db=False):
+        self.recorded = None
+        self.from_db = from_db
+        if recorded:
+            with open(recorded, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            records = data.get('history', []) if isinstance(data, dict) else data
+            self.recorded = {}
+            for record in records:
+                self.recorded.setdefault(record['sn'], []).append(record)
+
+    def records(self, serial_numbers):
+        """{sn: [API records, workstation and testboard]}"""
+        if self.recorded is not None:
+            return {sn: self.recorded.get(sn, []) for sn in serial_numbers}
+
+        if self.from_db:
+            from station_history import load_station_history
+            history = load_station_history(serial_numbers)
+            return {
+                sn: [self._workstation_record(sn, *visit) for visit in history.get(sn, [])]
+                for sn in serial_numbers
+            }
+
+        found = {}
+        for sn in serial_numbers:
+            visits, testboard_count = synthetic_history(sn)
+            records = [self._workstation_record(sn, *visit) for visit in visits]
+            for i in range(testboard_count if visits else 0):
+                records.append({
+                    'sn': sn,
+                    'source': 'testboard',
+                    'test_name': f'TB{i:03d}',
+                    'result': 'PASS',
+                    'log': 'x' * 200,
+                    'test_time': http_time(visits[min(i, len(visits) - 1)][1])
+                })
+            found[sn] = records
+        return found
+
+    @staticmethod
+    def _workstation_record(sn, station, start, end):
+        return {
+            'sn': sn,
+            'source': 'workstation',
+            'workstation_name': station,
+            'history_station_start_time': http_time(start),
+            'history_station_end_time': http_time(end)
+        }
+
+
+def in_range(record, range_start, range_end):
+    """Workstation visits starting in the range; testboard records by test time"""
+    moment = parse_time(record.get('history_station_start_time') or record.get('test_time'))
+    return moment is not None and range_start <= moment < range_end
+
+
+def make_handler(data, options):
+    rng = random.Random(options.seed)
+    rng_lock = threading.Lock()
+
+    def roll():
+        with rng_lock:
+            return rng.random()
+
+    class PortalHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            if options.verbose:
+                super().log_message(format, *args)
+
+        def send_json(self, status, body):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def read_json(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def inject(self, serial_count):
+            """Sleep and maybe fail like a busy portal; True if the request was answered"""
+            delay = options.latency + options.per_serial * serial_count
+            if options.jitter:
+                with rng_lock:
+                    delay *= 1 + rng.uniform(-options.jitter, options.jitter)
+            if options.timeout_rate and roll() < options.timeout_rate:
+                delay = options.hang
+            time.sleep(max(0, delay))
+
+            if options.max_batch and serial_count > options.max_batch:
+                self.send_json(503, {'success': False, 'error': f'Too many serial numbers ({serial_count})'})
+                return True
+            if options.error_rate and roll() < options.error_rate:
+                status = 503 if roll() < 0.5 else 500
+                self.send_json(status, {'success': False, 'error': 'Injected error'})
+                return True
+            return False
+
+        def do_GET(self):
+            if self.path == f'{API_PREFIX}/tables':
+                self.send_json(200, {'success': True, 'tables': TABLES})
+            else:
+                self.send_json(404, {'success': False, 'error': 'Not found'})
+
+        def do_POST(self):
+            try:
+                body = self.read_json()
+            except ValueError:
+                self.send_json(400, {'success': False, 'error': 'Invalid JSON'})
+                return
+            serial_numbers = body.get('serialNumbers') or []
+
+            if self.path == f'{API_PREFIX}/serial-history':
+                if self.inject(len(serial_numbers)):
+                    return
+                history = []
+                records = data.records(serial_numbers)
+                range_start, range_end = body.get('startDate'), body.get('endDate')
+                if range_start and range_end:
+                    # endDate is inclusive when it is a plain date
+                    range_start = datetime.fromisoformat(range_start)
+                    range_end_value = datetime.fromisoformat(range_end)
+                    if len(range_end) == 10:
+                        range_end_value += timedelta(days=1)
+                    for sn in serial_numbers:
+                        history.extend(r for r in records[sn] if in_range(r, range_start, range_end_value))
+                else:
+                    for sn in serial_numbers:
+                        history.extend(records[sn])
+                self.send_json(200, {'success': True, 'history': history})
+
+            elif self.path == f'{API_PREFIX}/serial-lookup':
+                if self.inject(len(serial_numbers)):
+                    return
+                records = [record for sns in data.records(serial_numbers).values() for record in sns]
+                response = {'success': True}
+                for source in ('workstation', 'testboard'):
+                    found = [record for record in records if record['source'] == source]
+                    response[source] = {'count': len(found), 'records': found}
+                self.send_json(200, response)
+
+            else:
+                self.send_json(404, {'success': False, 'error': 'Not found'})
+
+    return PortalHandler
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Local stand-in for the SQL portal API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--recorded', help='JSON file with a recorded /serial-history response')
+    parser.add_argument('--from-db', action='store_true', help='serve workstation_master_log from the database')
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--per-serial', type=float, default=0.002)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--timeout-rate', type=float, default=0.0)
+    parser.add_argument('--hang', type=float, default=120.0, help='seconds a "timed out" request hangs')
+    parser.add_argument('--max-batch', type=int, default=0)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    return parser
+
+
+def make_server(options):
+    data = PortalData(options.recorded, options.from_db)
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(data, options))
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    options = build_parser().parse_args()
+    server = make_server(options)
+    host, port = server.server_address[:2]
+    print(f"✓ Mock SQL portal on http://{host}:{port}{API_PREFIX}")
+    print(f"  latency {options.latency}s + {options.per_serial}s/serial, "
+          f"errors {options.error_rate:.0%}, timeouts {options.timeout_rate:.0%}")
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
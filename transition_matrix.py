@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Directly-follows transition matrix across the whole population
+
+For every serial number, takes each pair of consecutive station visits
+(A then B) and measures the gap from A's end to B's start. The gaps are
+aggregated per (A, B) pair into count, mean, p50, p90 and max - a
+station x station picture of where units actually wait across the flow.
+
+Visits are streamed from a server-side cursor and only per-pair
+accumulators are kept, so memory grows with stations², not with rows.
+Percentiles come from a KLLSketch per pair (quantile_sketch.py), so the
+matrices of separate chunks or runs can be merged.
+
+Input:  every unit in workstation_master_log, or only the serial numbers in
+        a CSV file (one per line) if one is given
+Output: transition_matrix.csv  - one row per (from, to) pair
+        transition_matrix.json - {from: {to: stats}}
+
+Usage: python transition_matrix.py [numbers.csv]
+"""
+import sys
+import csv
+import json
+from db import get_connection
+from quantile_sketch import KLLSketch
+
+# Rows fetched per round trip from the server-side cursor
+FETCH_SIZE = 10000
+
+ALL_VISITS_QUERY = """
+    SELECT sn, workstation_name, history_station_start_time, history_station_end_time
+    FROM workstation_master_log
+    ORDER BY sn, history_station_start_time, id
+"""
+
+SERIAL_VISITS_QUERY = """
+    SELECT sn, workstation_name, history_station_start_time, history_station_end_time
+    FROM workstation_master_log
+    WHERE sn = ANY(%s)
+    ORDER BY sn, history_station_start_time, id
+"""
+
+
+class GapStats:
+    """
+    Running count / mean / p50 / p90 / max of the gaps for one station pair
+    """
+    __slots__ = ('total', 'sketch')
+
+    def __init__(self):
+        self.total = 0.0
+        self.sketch = KLLSketch()
+
+    @property
+    def count(self):
+        return self.sketch.count
+
+    @property
+    def max(self):
+        return self.sketch.max
+
+    def add(self, seconds):
+        self.total += seconds
+        self.sketch.add(seconds)
+
+    def merge(self, other):
+        """Fold in the gaps of the same pair from another chunk or run"""
+        self.total += other.total
+        self.sketch.merge(other.sketch)
+
+    def summary(self):
+        def hours(seconds):
+            return round(seconds / 3600, 2) if seconds is not None else None
+
+        return {
+            'count': self.count,
+            'mean_hours': hours(self.total / self.count) if self.count else None,
+            'p50_hours': hours(self.sketch.quantile(0.5)),
+            'p90_hours': hours(self.sketch.quantile(0.9)),
+            'max_hours': hours(self.max)
+        }
+
+
+def iter_visits(serial_numbers=None):
+    """
+    Yield (sn, station, start, end) for every visit, grouped by serial number
+    and in start-time order, without loading the table into memory
+    """
+    with get_connection() as conn:
+        # A named cursor keeps the result set on the server
+        cur = conn.cursor(name='transition_matrix_visits')
+        cur.itersize = FETCH_SIZE
+        if serial_numbers is None:
+            cur.execute(ALL_VISITS_QUERY)
+        else:
+            cur.execute(SERIAL_VISITS_QUERY, (list(dict.fromkeys(serial_numbers)),))
+        for row in cur:
+            yield row
+        cur.close()
+
+
+def build_transition_matrix(visits):
+    """
+    Aggregate the gap between every pair of consecutive visits
+
+    `visits` is an iterable of (sn, station, start, end) ordered by serial
+    number and start time. Returns ({(from, to): GapStats}, rows_read).
+    Pairs where either station name or the needed time is missing are skipped.
+    """
+    matrix = {}
+    previous_sn = None
+    previous_station = None
+    previous_end = None
+    rows_read = 0
+
+    for sn, station, start, end in visits:
+        rows_read += 1
+        if rows_read % 1000000 == 0:
+            print(f"Read {rows_read:,} visits...")
+
+        if sn == previous_sn and previous_station and station and previous_end and start:
+            pair = (previous_station, station)
+            stats = matrix.get(pair)
+            if stats is None:
+                stats = matrix[pair] = GapStats()
+            stats.add((start - previous_end).total_seconds())
+
+        previous_sn = sn
+        previous_station = station
+        previous_end = end
+
+    return matrix, rows_read
+
+
+def save_transition_matrix(matrix):
+    """
+    Write transition_matrix.csv and transition_matrix.json
+    """
+    pairs = sorted(matrix)
+
+    with open('transition_matrix.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([
+            'From Station',
+            'To Station',
+            'Count',
+            'Mean (hours)',
+            'P50 (hours)',
+            'P90 (hours)',
+            'Max (hours)'
+        ])
+        for from_station, to_station in pairs:
+            stats = matrix[(from_station, to_station)].summary()
+            writer.writerow([
+                from_station,
+                to_station,
+                stats['count'],
+                stats['mean_hours'],
+                stats['p50_hours'],
+                stats['p90_hours'],
+                stats['max_hours']
+            ])
+
+    nested = {}
+    for from_station, to_station in pairs:
+        nested.setdefault(from_station, {})[to_station] = matrix[(from_station, to_station)].summary()
+    with open('transition_matrix.json', 'w') as f:
+        json.dump(nested, f, indent=2)
+
+    print(f"✓ Saved {len(pairs)} station pairs to transition_matrix.csv and transition_matrix.json")
+
+
+def main():
+    serial_numbers = None
+    if len(sys.argv) > 1:
+        # Read serial numbers from CSV (handle UTF-8 BOM)
+        serial_numbers = []
+        with open(sys.argv[1], 'r', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            for row in reader:
+                if row:
+                    serial_numbers.append(row[0].strip())
+        print(f"Building transition matrix for {len(serial_numbers)} serial numbers...")
+    else:
+        print("Building transition matrix for every unit in workstation_master_log...")
+
+    matrix, rows_read = build_transition_matrix(iter_visits(serial_numbers))
+    stations = {station for pair in matrix for station in pair}
+    print(f"✓ Read {rows_read:,} visits, {len(stations)} stations, {len(matrix)} station pairs")
+
+    save_transition_matrix(matrix)
+
+if __name__ == "__main__":
+    main()